@@ -12,7 +12,11 @@ class calendarAuth:
     def __init__(self):
         self.creds = None  # Not logged in yet
         self.credentials = 'credentials.json'
-        self.scopes = ['https://www.googleapis.com/auth/calendar.events.readonly']  
+        self.scopes = [
+            'https://www.googleapis.com/auth/calendar.events.readonly',
+            'https://www.googleapis.com/auth/calendar.calendarlist.readonly',  # Needed to aggregate several calendars
+            'https://www.googleapis.com/auth/calendar.freebusy'  # Busy-time fast path
+        ]
         self.token = 'token.json'
         self.redirect_uri = os.getenv('GOOGLE_REDIRECT_URI', 'http://127.0.0.1:8888/calendar/callback')
 
@@ -1,31 +1,198 @@
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta, timezone
+import os
+import threading
+import time
 from .auth import calendarAuth
+from observability import metrics
+from observability.log import get_logger
+import upstreams
+
+log = get_logger('calendar')
+
+# Google caps a single batch request at 50 calls
+BATCH_LIMIT = 50
+# How long a resolved 'selected'/'all' calendar list is reused before re-listing
+CALENDAR_LIST_TTL = 600
+# Partial-response mask for lean fetches: only what the busy-minute math and the extension read
+LEAN_EVENT_FIELDS = 'items(id,iCalUID,summary,start,end)'
+
+
+def _parse_event_time(value):
+    """Parse an event start/end string ('dateTime' or all-day 'date') into an aware datetime."""
+    if 'T' in value:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def _event_start(event):
+    return _parse_event_time(event['start'].get('dateTime', event['start'].get('date')))
+
 
 class calendarClient:
-    def __init__(self):
+    def __init__(self, calendar_ids=None, lean=None):
         self.auth = calendarAuth()
+        # Set to share one service across threads (fakes, benchmarks); otherwise each thread builds its own
         self.service = None
+        self._local = threading.local()
+        # Explicit list of calendar IDs, or 'selected' / 'all' to resolve them from the user's calendar list.
+        # Defaults to GOOGLE_CALENDAR_IDS (comma separated), falling back to just the primary calendar.
+        self.calendar_ids = calendar_ids or self._calendar_ids_from_env()
+        self._resolved_ids = None
+        self._resolved_at = 0
+        # Lean mode asks Google for LEAN_EVENT_FIELDS only and leaves description/location out of responses
+        if lean is None:
+            lean = os.getenv('CALENDAR_LEAN_FETCH', '0').lower() in ('1', 'true', 'yes')
+        self.lean = lean
 
     def get_service(self):
-        """Create or get Google Calendar API service."""
-        if not self.service:
-            creds = self.auth.load_credentials()
-            if not creds:
-                print("[DEBUG] No valid credentials loaded.")
-                return None
-            try:
-                self.service = build('calendar', 'v3', credentials=creds)
-                print("[DEBUG] Calendar API service built successfully.")
-            except Exception as e:
-                print(f"Failed to build service: {str(e)}")
-                return None
-        return self.service
+        """
+        Create or get the Google Calendar API service for the calling thread.
+
+        googleapiclient's httplib2 transport isn't thread-safe, and handlers fetch calendar data
+        from several threads at once, so each thread builds its own service.
+        """
+        if self.service:
+            return self.service
+
+        service = getattr(self._local, 'service', None)
+        if not service:
+            if upstreams.is_offline('calendar'):
+                service = upstreams.calendar_service(None)
+            else:
+                creds = self.auth.load_credentials()
+                if not creds:
+                    log.debug("No valid credentials loaded")
+                    return None
+                try:
+                    service = upstreams.calendar_service(creds)
+                    log.debug("Calendar API service built")
+                except Exception as e:
+                    log.error("Failed to build service: %s", e)
+                    return None
+            self._local.service = service
+        return service
 
     def is_authenticated(self):
+        if upstreams.is_offline('calendar'):
+            return True
         return self.auth.is_authenticated()
 
+    def _calendar_ids_from_env(self):
+        value = os.getenv('GOOGLE_CALENDAR_IDS', 'primary').strip()
+        if value in ('selected', 'all'):
+            return value
+        return [cid.strip() for cid in value.split(',') if cid.strip()] or ['primary']
+
+    def set_calendars(self, calendar_ids):
+        """Choose which calendars are aggregated: a list of IDs, 'selected' or 'all'."""
+        self.calendar_ids = calendar_ids or ['primary']
+        self._resolved_ids = None
+        self._resolved_at = 0
+
+    def list_calendars(self):
+        """List every calendar on the user's calendar list."""
+        try:
+            service = self.get_service()
+            if not service:
+                return {"error": "Not Authenticated"}
+
+            items = service.calendarList().list().execute().get('items', [])
+            return {
+                "status": "success",
+                "calendars": [
+                    {
+                        "id": cal['id'],
+                        "summary": cal.get('summary', ''),
+                        "primary": cal.get('primary', False),
+                        "selected": cal.get('selected', False)
+                    }
+                    for cal in items
+                ],
+                "active": self.resolve_calendar_ids(service)
+            }
+        except Exception as e:
+            return {"error": f"Failed to list calendars: {str(e)}"}
+
+    def resolve_calendar_ids(self, service):
+        """Turn self.calendar_ids into concrete IDs, listing calendars for 'selected'/'all'."""
+        if isinstance(self.calendar_ids, list):
+            return self.calendar_ids
+
+        if self._resolved_ids and time.time() - self._resolved_at < CALENDAR_LIST_TTL:
+            metrics.cache_hit('calendar_list')
+            return self._resolved_ids
+        metrics.cache_miss('calendar_list')
+
+        try:
+            items = service.calendarList().list().execute().get('items', [])
+            ids = [
+                cal['id'] for cal in items
+                if self.calendar_ids == 'all' or cal.get('selected') or cal.get('primary')
+            ]
+        except Exception as e:
+            # Tokens granted before the calendar-list scope was added can't list calendars
+            log.warning("Could not list calendars, using primary only: %s", e)
+            ids = []
+
+        self._resolved_ids = ids or ['primary']
+        self._resolved_at = time.time()
+        return self._resolved_ids
+
+    def _list_events(self, service, **params):
+        """
+        Run events().list with the same parameters against every active calendar and merge the results.
+
+        More than one calendar is fetched through the API's batch endpoint, so all calendars cost one
+        round trip. Events are de-duplicated (an invite shows up on every calendar it was sent to)
+        and returned sorted by start time.
+        """
+        calendar_ids = self.resolve_calendar_ids(service)
+        if self.lean:
+            params.setdefault('fields', LEAN_EVENT_FIELDS)
+
+        if len(calendar_ids) == 1:
+            items = service.events().list(calendarId=calendar_ids[0], **params).execute().get('items', [])
+            return self._merge_events({calendar_ids[0]: items})
+
+        results = {}
+        errors = []
+
+        def collect(request_id, response, exception):
+            calendar_id = calendar_ids[int(request_id)]
+            if exception is not None:
+                log.warning("Failed to fetch calendar %s: %s", calendar_id, exception)
+                errors.append(exception)
+                return
+            results[calendar_id] = response.get('items', [])
+
+        for offset in range(0, len(calendar_ids), BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=collect)
+            for index in range(offset, min(offset + BATCH_LIMIT, len(calendar_ids))):
+                batch.add(
+                    service.events().list(calendarId=calendar_ids[index], **params),
+                    request_id=str(index)
+                )
+            batch.execute()
+
+        if errors and not results:
+            raise errors[0]
+
+        return self._merge_events(results)
+
+    def _merge_events(self, events_by_calendar):
+        """Tag events with their calendar, drop duplicates and sort by start time."""
+        merged = {}
+        for calendar_id, items in events_by_calendar.items():
+            for event in items:
+                start = event['start'].get('dateTime', event['start'].get('date'))
+                key = (event.get('iCalUID') or event.get('id'), start)
+                if key in merged:
+                    continue
+                event['calendarId'] = calendar_id
+                merged[key] = event
+        return sorted(merged.values(), key=_event_start)
+
     def get_upcoming_events(self, max_results=10, hours_ahead=24):
         """Fetch upcoming events within the next N hours."""
         try:
@@ -37,16 +204,14 @@ class calendarClient:
             now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
             end_time = (datetime.now(timezone.utc) + timedelta(hours=hours_ahead)).isoformat().replace('+00:00', 'Z')
 
-            events_result = service.events().list(
-                calendarId='primary',
+            events = self._list_events(
+                service,
                 timeMin=now,
                 timeMax=end_time,
                 maxResults=max_results,
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
+            )[:max_results]
             return {
                 "status": "success",
                 "events": self.format_events(events),
@@ -69,15 +234,13 @@ class calendarClient:
             today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
             tomorrow = today + timedelta(days=1)
 
-            events_result = service.events().list(
-                calendarId='primary',
+            events = self._list_events(
+                service,
                 timeMin=today.isoformat().replace('+00:00', 'Z'),
                 timeMax=tomorrow.isoformat().replace('+00:00', 'Z'),
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
+            )
             return {
                 "status": "success",
                 "events": self.format_events(events),
@@ -97,15 +260,13 @@ class calendarClient:
             # ✅ FIXED: Use timezone-aware datetime
             now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
             
-            events_result = service.events().list(
-                calendarId='primary',
+            events = self._list_events(
+                service,
                 timeMin=now,
                 maxResults=1,
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
+            )
             if not events:
                 return {"status": "success", "event": None, "message": "No upcoming events"}
 
@@ -125,9 +286,6 @@ class calendarClient:
     def calculate_minutes_until(self, event_time):
         """Calculate minutes until an event starts."""
         try:
-            # --- PROOF-OF-LIFE DEBUG PRINT ---
-            print(f"[DEBUG v2] Running corrected time calculation for event: '{event_time}'")
-
             if 'T' in event_time:  # It's a specific time, e.g., '2025-11-03T10:00:00Z'
                 event_dt = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
             
@@ -143,11 +301,11 @@ class calendarClient:
             delta = event_dt - now
             minutes = int(delta.total_seconds() / 60)
             
-            print(f"[DEBUG v2] Successfully calculated. Starts in {minutes} minutes.")
+            log.debug("Event %s starts in %s minutes", event_time, minutes)
             return minutes
 
         except Exception as e:
-            print(f"[DEBUG v2] CRITICAL ERROR calculating time: {str(e)}")
+            log.error("Could not calculate minutes until %r: %s", event_time, e)
             return None
     def format_events(self, events):
         """Format multiple events."""
@@ -157,6 +315,15 @@ class calendarClient:
         """Format a single event into a consistent dictionary."""
         start = event['start'].get('dateTime', event['start'].get('date'))
         end = event['end'].get('dateTime', event['end'].get('date'))
+        if self.lean:
+            return {
+                "id": event.get('id'),
+                "summary": event.get('summary', 'No Title'),
+                "start": start,
+                "end": end,
+                "calendar_id": event.get('calendarId', 'primary'),
+                "is_all_day": 'date' in event['start']
+            }
         return {
             "id": event.get('id'),
             "summary": event.get('summary', 'No Title'),
@@ -164,9 +331,75 @@ class calendarClient:
             "start": start,
             "end": end,
             "location": event.get('location', ''),
+            "calendar_id": event.get('calendarId', 'primary'),
             "is_all_day": 'date' in event['start']
         }
     
+    def get_busy_analysis(self, date=None):
+        """
+        Busy-time metrics for a day from the free/busy query instead of the events list.
+
+        One request covers every active calendar and returns only busy intervals, so there is
+        nothing to download or parse beyond start/end pairs. Overlapping intervals across
+        calendars are merged, so double-booked time is counted once. There is no per-event
+        breakdown on this path.
+        """
+        try:
+            service = self.get_service()
+            if not service:
+                return {"error": "Not Authenticated"}
+
+            if date is None:
+                target_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            else:
+                target_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+            day_start = target_date
+            day_end = target_date + timedelta(days=1)
+
+            calendar_ids = self.resolve_calendar_ids(service)
+            result = service.freebusy().query(body={
+                "timeMin": day_start.isoformat().replace('+00:00', 'Z'),
+                "timeMax": day_end.isoformat().replace('+00:00', 'Z'),
+                "items": [{"id": cid} for cid in calendar_ids]
+            }).execute()
+
+            intervals = []
+            for calendar_id, calendar in result.get('calendars', {}).items():
+                if calendar.get('errors'):
+                    log.warning("Free/busy failed for calendar %s: %s", calendar_id, calendar['errors'])
+                    continue
+                for busy in calendar.get('busy', []):
+                    intervals.append((_parse_event_time(busy['start']), _parse_event_time(busy['end'])))
+
+            # Merge overlapping intervals so time booked on two calendars isn't counted twice
+            intervals.sort()
+            merged = []
+            for start, end in intervals:
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+
+            total_minutes = sum((end - start).total_seconds() / 60 for start, end in merged)
+            minutes_in_day = 24 * 60
+            free_time_minutes = minutes_in_day - total_minutes
+
+            return {
+                "status": "success",
+                "date": target_date.date().isoformat(),
+                "busy_intervals": [
+                    {"start": start.isoformat(), "end": end.isoformat()} for start, end in merged
+                ],
+                "total_minutes": round(total_minutes, 2),
+                "total_hours": round(total_minutes / 60, 2),
+                "busy_percentage": round(total_minutes / minutes_in_day * 100, 2),
+                "free_time_minutes": round(free_time_minutes, 2),
+                "free_time_hours": round(free_time_minutes / 60, 2)
+            }
+
+        except Exception as e:
+            return {"error": f"Failed to query free/busy: {str(e)}"}
+
     def get_day_schedule_analysis(self, date=None):  # ✅ Fixed: Use : not {
         """
         Get all events for a specific day and calculate total event time
@@ -206,15 +439,13 @@ class calendarClient:
             day_end = target_date + timedelta(days=1)
             
             # Fetch all events for this day
-            events_result = service.events().list(
-                calendarId='primary',
+            events = self._list_events(
+                service,
                 timeMin=day_start.isoformat().replace('+00:00', 'Z'),
                 timeMax=day_end.isoformat().replace('+00:00', 'Z'),
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            )
             formatted_events = self.format_events(events)
             
             # Calculate total time
@@ -253,7 +484,7 @@ class calendarClient:
                         breakdown['other'] += 1
                         
                 except Exception as e:
-                    print(f"Error calculating duration for event: {e}")
+                    log.warning("Error calculating duration for event: %s", e)
                     continue
             
             # Calculate statistics
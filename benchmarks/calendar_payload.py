@@ -0,0 +1,131 @@
+# Benchmarks calendar transfer size and parse time: full events vs lean field masks vs free/busy
+"""
+Compare the three ways GC.client can work out how busy a day is:
+
+  full      events().list with full resources (the original path)
+  lean      events().list with the LEAN_EVENT_FIELDS partial-response mask
+  freebusy  freebusy().query, busy intervals only
+
+Every response body goes through googleapiclient's JsonModel.deserialize, which is wrapped to
+count bytes and time the parse. By default the service is upstreams.fakes.FakeCalendarService,
+which serves realistic full event resources. Pass --live to measure against your real calendars (needs token.json).
+
+Run from the project root:
+    python -m benchmarks.calendar_payload --events 40 --calendars 3
+    python -m benchmarks.calendar_payload --live
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.model import JsonModel
+from GC.client import calendarClient
+from upstreams import UpstreamProfile
+from upstreams.fakes import FakeCalendarService
+
+
+class PayloadMeter:
+    """Wraps JsonModel.deserialize to record response sizes and parse times."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.parse_seconds = 0.0
+        self.responses = 0
+        self._original = None
+
+    def __enter__(self):
+        self._original = JsonModel.deserialize
+        original = self._original
+        meter = self
+
+        def deserialize(model, content):
+            start = time.perf_counter()
+            body = original(model, content)
+            meter.parse_seconds += time.perf_counter() - start
+            meter.bytes += len(content)
+            meter.responses += 1
+            return body
+
+        JsonModel.deserialize = deserialize
+        return self
+
+    def __exit__(self, *exc):
+        JsonModel.deserialize = self._original
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def measure(client, method, repeat):
+    """Call client.<method>() repeat times, returning per-call bytes, parse ms and total ms."""
+    totals, parses, sizes = [], [], []
+    result = None
+    for _ in range(repeat):
+        with PayloadMeter() as meter:
+            start = time.perf_counter()
+            result = getattr(client, method)()
+            totals.append((time.perf_counter() - start) * 1000)
+        parses.append(meter.parse_seconds * 1000)
+        sizes.append(meter.bytes)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return {
+        "bytes": statistics.median(sizes),
+        "parse_ms": statistics.median(parses),
+        "total_ms": statistics.median(totals),
+        "busy_minutes": result["total_minutes"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--live', action='store_true', help='Use the real Google Calendar API (token.json)')
+    parser.add_argument('--calendars', type=int, default=3, help='Fake calendars')
+    parser.add_argument('--events', type=int, default=30, help='Fake events per calendar per day')
+    parser.add_argument('--repeat', type=int, default=20, help='Calls per path (median is reported)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if args.live:
+        full, lean = calendarClient(lean=False), calendarClient(lean=True)
+        if not full.get_service():
+            print("❌ Not authenticated with Google Calendar")
+            sys.exit(1)
+        lean.service = full.service
+        lean.calendar_ids = full.calendar_ids
+    else:
+        calendars = [{"id": "primary", "primary": True, "selected": True}] + [
+            {"id": f"team{i}@group.calendar.google.com", "selected": True} for i in range(1, args.calendars)
+        ]
+        ids = [cal["id"] for cal in calendars]
+        service = FakeCalendarService(UpstreamProfile(), calendars=calendars, events_per_day=args.events)
+        full, lean = calendarClient(calendar_ids=ids, lean=False), calendarClient(calendar_ids=ids, lean=True)
+        full.service = lean.service = service
+
+    results = {
+        "full": measure(full, 'get_day_schedule_analysis', args.repeat),
+        "lean": measure(lean, 'get_day_schedule_analysis', args.repeat),
+        "freebusy": measure(lean, 'get_busy_analysis', args.repeat)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    baseline = results["full"]
+    print(f"\n{'path':<10}{'bytes':>12}{'vs full':>10}{'parse ms':>11}{'total ms':>11}{'busy min':>10}")
+    for name, row in results.items():
+        ratio = row["bytes"] / baseline["bytes"] if baseline["bytes"] else 0
+        print(f"{name:<10}{row['bytes']:>12,.0f}{ratio:>9.1%}{row['parse_ms']:>11.3f}"
+              f"{row['total_ms']:>11.3f}{row['busy_minutes']:>10}")
+    print("\nfreebusy merges overlapping intervals, so its busy minutes can be lower than the events paths.")
+
+
+if __name__ == '__main__':
+    main()
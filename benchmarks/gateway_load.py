@@ -0,0 +1,281 @@
+# Load test for the gateway: N simulated extension clients replaying the popup/background polling mix
+"""
+Each simulated client follows the schedule in frontend/public/background.js and
+frontend/src/App.tsx (periods are in extension seconds):
+
+  GET  /get_music_features               every 60s
+  POST /get_active_tabs                  every 60s
+  GET  /get_calendar_events              every 60s, plus the separate 300s calendar interval
+  GET  /api/activity                     every 60s
+  POST /get_procrastination_prediction   every 60s, 10s after the others
+  GET  /get_track_info                   every 2s for the first 120s (App.tsx auth polling)
+
+--time-scale compresses extension time: at 60, one extension minute passes every wall-clock
+second. Clients start at random phases, like real users. Latency is measured from each
+request's scheduled time, so queueing inside the harness shows up instead of hiding
+(no coordinated omission).
+
+By default the gateway runs in-process through Flask's test client, with UPSTREAM_MODE=fake
+unless you set it. Pass --url to load a running server instead.
+
+    python -m benchmarks.gateway_load --clients 50 --duration 30
+    python -m benchmarks.gateway_load --clients 20 --json run.json --baseline main.json
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TAB_URLS = [
+    "github.com/adriancwpin", "stackoverflow.com/questions", "docs.python.org/3", "youtube.com/watch",
+    "mail.google.com/mail", "reddit.com/r", "news.ycombinator.com", "calendar.google.com/calendar",
+]
+
+# (method, path, period seconds, first-fire offset seconds, active-until seconds or None)
+REQUEST_MIX = [
+    ('GET', '/get_music_features', 60, 0, None),
+    ('POST', '/get_active_tabs', 60, 0, None),
+    ('GET', '/get_calendar_events', 60, 0, None),
+    ('GET', '/get_calendar_events', 300, 0, None),
+    ('GET', '/api/activity', 60, 0, None),
+    ('POST', '/get_procrastination_prediction', 60, 10, None),
+    ('GET', '/get_track_info', 2, 0, 120),
+]
+
+
+def prediction_payload(rng):
+    now = datetime.now()
+    has_spotify = rng.random() < 0.7
+    return {
+        'Hour': now.hour,
+        'Minute': now.minute,
+        'Day of week': now.weekday(),
+        'Keystrokes per min': rng.randint(0, 250),
+        'Mouse moves per min': rng.randint(0, 400),
+        'Mouse clicks per min': rng.randint(0, 60),
+        'Productivity of Active Chrome Tabs': round(rng.random(), 2),
+        'Total Minutes of Events Before': rng.choice([0, 30, 60, 90]),
+        'Total Minutes of Events After': rng.choice([0, 30, 60, 120]),
+        'Total Minutes to Next Event': rng.choice([5, 30, 120, 999]),
+        'Spotify': int(has_spotify),
+        'Danceability': round(rng.random(), 2) if has_spotify else 0,
+        'Tempo': rng.randint(60, 200) if has_spotify else 0,
+        'Energy': round(rng.random(), 2) if has_spotify else 0,
+        'Minutes_Into_Day': now.hour * 60 + now.minute
+    }
+
+
+def build_payload(path, rng):
+    if path == '/get_active_tabs':
+        return {"urls": rng.sample(TAB_URLS, rng.randint(2, len(TAB_URLS)))}
+    if path == '/get_procrastination_prediction':
+        return prediction_payload(rng)
+    return None
+
+
+class InProcessTarget:
+    """Sends requests through a Flask test client, one per worker thread."""
+
+    def __init__(self):
+        os.environ.setdefault('UPSTREAM_MODE', 'fake')
+        from server import create_app
+        self.app = create_app()
+        self.local = threading.local()
+
+    def send(self, method, path, payload):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=payload)
+        response.close()
+        return response.status_code
+
+
+class HTTPTarget:
+    """Sends requests to a running gateway, one keep-alive session per worker thread."""
+
+    def __init__(self, base_url, timeout):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def send(self, method, path, payload):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        return session.request(method, self.base_url + path, json=payload, timeout=self.timeout).status_code
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.non_2xx = defaultdict(int)
+
+    def add(self, route, latency_ms, status):
+        with self.lock:
+            self.latencies[route].append(latency_ms)
+            if status is None or status >= 500:
+                self.errors[route] += 1
+            elif status >= 300:
+                self.non_2xx[route] += 1
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile: the smallest value with at least pct% of the values at or below it."""
+    if not sorted_values:
+        return 0.0
+    # pct * n first, so 95 * 100 / 100 is exactly 95 rather than 95.00000000000001
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100) - 1))
+    return sorted_values[index]
+
+
+def run(target, clients, duration, time_scale, workers, seed):
+    """Fire the request mix for `clients` simulated clients for `duration` wall seconds."""
+    rng = random.Random(seed)
+    recorder = Recorder()
+    start = time.perf_counter()
+
+    # Min-heap of (due wall time, sequence, client index, mix index, client phase)
+    schedule = []
+    sequence = 0
+    client_rngs = [random.Random(seed * 1000 + i) for i in range(clients)]
+    for client in range(clients):
+        phase = rng.uniform(0, 60)
+        for mix_index, (_, _, period, offset, _) in enumerate(REQUEST_MIX):
+            due = start + (phase + offset) / time_scale
+            heapq.heappush(schedule, (due, sequence, client, mix_index, phase))
+            sequence += 1
+
+    lock = threading.Lock()
+
+    def fire(due, client, mix_index):
+        method, path, _, _, _ = REQUEST_MIX[mix_index]
+        with lock:
+            payload = build_payload(path, client_rngs[client])
+        status = None
+        try:
+            status = target.send(method, path, payload)
+        except Exception as e:
+            print(f"❌ {method} {path}: {e}")
+        recorder.add(f"{method} {path}", (time.perf_counter() - due) * 1000, status)
+
+    end = start + duration
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while schedule:
+            due, _, client, mix_index, phase = heapq.heappop(schedule)
+            if due >= end:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, due, client, mix_index)
+
+            _, _, period, offset, until = REQUEST_MIX[mix_index]
+            next_due = due + period / time_scale
+            if until is None or (next_due - start) * time_scale - phase < until:
+                heapq.heappush(schedule, (next_due, sequence, client, mix_index, phase))
+                sequence += 1
+
+    elapsed = time.perf_counter() - start
+    return summarise(recorder, elapsed)
+
+
+def summarise(recorder, elapsed):
+    report = {"elapsed_seconds": round(elapsed, 3), "routes": {}}
+    total = errors = 0
+    for route, values in sorted(recorder.latencies.items()):
+        values.sort()
+        total += len(values)
+        errors += recorder.errors[route]
+        report["routes"][route] = {
+            "requests": len(values),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2),
+            "error_rate": round(recorder.errors[route] / len(values), 4),
+            "non_2xx": recorder.non_2xx[route]
+        }
+    report["total"] = {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        "error_rate": round(errors / total, 4) if total else 0
+    }
+    return report
+
+
+def print_report(report):
+    print(f"\n{'route':<42}{'reqs':>7}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'4xx/3xx':>8}")
+    for route, row in report["routes"].items():
+        print(f"{route:<42}{row['requests']:>7}{row['throughput_rps']:>8.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['error_rate']:>8.1%}{row['non_2xx']:>8}")
+    total = report["total"]
+    print(f"\nTotal: {total['requests']} requests in {report['elapsed_seconds']}s, "
+          f"{total['throughput_rps']} req/s, {total['error_rate']:.1%} errors")
+
+
+def compare(report, baseline, max_regression):
+    """Return the routes whose p95 grew by more than max_regression (a fraction) versus the baseline."""
+    regressions = []
+    for route, row in report["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before or before["p95_ms"] <= 0:
+            continue
+        change = row["p95_ms"] / before["p95_ms"] - 1
+        if change > max_regression or row["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append((route, before["p95_ms"], row["p95_ms"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=10, help='Simulated extension clients')
+    parser.add_argument('--duration', type=float, default=20, help='Wall-clock seconds to run')
+    parser.add_argument('--time-scale', type=float, default=60, help='Extension seconds per wall second')
+    parser.add_argument('--workers', type=int, default=0, help='Concurrent in-flight requests (default 4 per client)')
+    parser.add_argument('--url', help='Load a running gateway, e.g. http://127.0.0.1:8888')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout with --url')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--baseline', help='Earlier --json report to compare p95 and error rate against')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed p95 growth vs baseline')
+    args = parser.parse_args()
+
+    target = HTTPTarget(args.url, args.timeout) if args.url else InProcessTarget()
+    report = run(target, args.clients, args.duration, args.time_scale,
+                 args.workers or args.clients * 4, args.seed)
+    report["config"] = {"clients": args.clients, "duration": args.duration, "time_scale": args.time_scale,
+                        "target": args.url or "in-process", "upstream_mode": os.getenv('UPSTREAM_MODE', 'live')}
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for route, before, after, change in regressions:
+            print(f"❌ {route}: p95 {before:.1f}ms -> {after:.1f}ms ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+# Accuracy and speed of a candidate model against the one being served, on the same unseen rows
+"""
+Scores --candidate and --current (default: the registry's active version, else MODEL_PATH)
+and reports for each model and serving format (sklearn, flat; see predict/flat.py):
+
+  roc_auc, accuracy, precision, recall   procrastination (Focus == 0) as the positive class,
+                                         at the gateway's threshold (probability > 0.7)
+  single-row p50/p95/p99 ms              predict.py's scoring path, one row per call
+  batch p50/p99 ms, rows/s               --batch rows per predict_proba call
+  file_kb, load_ms, memory_mb            size on disk (flat: the saved arrays), load time and the
+                                         resident memory the model adds once it has scored a row,
+                                         each a cold load in a fresh process
+
+plus agreement, the share of rows both models put on the same side of the threshold.
+
+--data is a labelled CSV neither model was trained on: minutes labelled after both were
+trained, from LABELS_PATH or a backfill (history/backfill.py) joined with labels. Every
+model train_model.py ships learns from the whole training CSV, so that file is refused,
+and rows of --data that also appear in it are dropped before scoring. Labels an online
+update has already learned from (LABELS_PATH up to its .trained count) are in-sample for
+the models that took them, so leave them out of --data too.
+
+Exits with 1 when the candidate loses more than --max-auc-drop AUC or --max-accuracy-drop
+accuracy, or its single-row p50 grows by more than --max-latency-regression, so it can gate
+a publish:
+
+    python -m benchmarks.model_regression --candidate new_model.pkl --data october_labels.csv
+    python -m benchmarks.model_regression --candidate new_model.pkl --current 20261019-142501 --data october_labels.csv --formats sklearn flat --json report.json
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.metrics import accuracy_score, precision_score, recall_score, roc_auc_score
+
+import config
+from predict import flat, ingest
+from predict.features import FEATURE_COLUMNS, check_model, transform, transform_one
+from predict.online import TRAINING_DATA
+from predict.registry import ModelRegistry
+
+# routes/main.py: 'procrastinating': prediction > 0.7
+THRESHOLD = 0.7
+
+
+def percentiles(values, points=(50, 95, 99)):
+    ordered = sorted(values)
+    return {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+
+def resolve(model):
+    """A model file, or a registry version name when MODEL_REGISTRY_DIR is set."""
+    if model and os.path.exists(model):
+        return model
+    if config.MODEL_REGISTRY_DIR:
+        registry = ModelRegistry(config.MODEL_REGISTRY_DIR)
+        version = model or registry.pointer()
+        if version and os.path.exists(registry.model_path(version)):
+            return registry.model_path(version)
+    if model:
+        raise SystemExit(f"No model file or registry version {model!r}")
+    return config.MODEL_PATH
+
+
+def held_out(path):
+    """(model input, labels, rows dropped) of path, without the rows that are also training rows."""
+    if os.path.exists(TRAINING_DATA) and os.path.samefile(path, TRAINING_DATA):
+        raise SystemExit(f"{path} is the training CSV every shipped model learned from; "
+                         f"pass labelled minutes neither model was trained on")
+    columns = FEATURE_COLUMNS + [ingest.LABEL_COLUMN]
+    data = ingest.read_compact(path)[columns]
+    training = ingest.read_compact(TRAINING_DATA)[columns].drop_duplicates()
+    unseen = data.merge(training, how='left', indicator=True)['_merge'].to_numpy() == 'left_only'
+    data = data[unseen].reset_index(drop=True)
+    if data.empty or data[ingest.LABEL_COLUMN].nunique() < 2:
+        raise SystemExit(f"{path} has no unseen rows of both classes to score")
+    return transform(data), data[ingest.LABEL_COLUMN], int((~unseen).sum())
+
+
+def serving_form(model, model_format):
+    return flat.FlatForest.from_model(model) if model_format == 'flat' else model
+
+
+def load(path, model_format):
+    return flat.FlatForest.load(path) if model_format == 'flat' else check_model(joblib.load(path))
+
+
+def score_one(model, vector):
+    """predict.py's _score: one request's probability of procrastination."""
+    return float(model.predict_proba(transform_one(vector))[0][0])
+
+
+def score_batch(model, X):
+    return model.predict_proba(X)[:, 0]
+
+
+def quality(proba, y):
+    procrastinating = (y == 0).to_numpy()
+    predicted = proba > THRESHOLD
+    return {
+        "roc_auc": float(roc_auc_score(procrastinating, proba)),
+        "accuracy": float(accuracy_score(procrastinating, predicted)),
+        "precision": float(precision_score(procrastinating, predicted, zero_division=0)),
+        "recall": float(recall_score(procrastinating, predicted, zero_division=0)),
+        "flagged": float(predicted.mean())
+    }
+
+
+def latency(model, X, rows, batch):
+    vectors = X[:rows].tolist()
+    for vector in vectors[:20]:
+        score_one(model, vector)
+    single = []
+    for vector in vectors:
+        start = time.perf_counter()
+        score_one(model, vector)
+        single.append((time.perf_counter() - start) * 1000)
+
+    # At least 20 calls, cycling through the rows when there are fewer than 20 batches of them
+    batches = []
+    starts = range(0, max(1, len(X) - batch + 1), batch)
+    for call in range(max(20, len(starts))):
+        first = starts[call % len(starts)]
+        start = time.perf_counter()
+        score_batch(model, X[first:first + batch])
+        batches.append((time.perf_counter() - start) * 1000)
+    return {
+        "single_ms": {key: round(value, 3) for key, value in percentiles(single).items()},
+        "batch_ms": {key: round(value, 3) for key, value in percentiles(batches, (50, 99)).items()},
+        "batch_rows_per_s": round(min(batch, len(X)) * len(batches) / (sum(batches) / 1000)),
+    }
+
+
+def load_probe(path, model_format, vector):
+    """In a fresh process: seconds to load the model and resident bytes it adds once it has scored a row."""
+    import sklearn.ensemble, sklearn.pipeline, sklearn.preprocessing  # noqa: F401
+    from observability.memory import rss_bytes
+
+    # The model's libraries are imported before the baseline, so only the model is counted
+    before = rss_bytes()
+    start = time.perf_counter()
+    model = load(path, model_format)
+    seconds = time.perf_counter() - start
+    score_one(model, vector)
+    return seconds, rss_bytes() - before
+
+
+def load_cost(path, model_format, vector, repeats):
+    """Median load time and memory over repeats fresh processes."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for _ in range(repeats):
+        with context.Pool(1) as pool:
+            results.append(pool.apply(load_probe, (path, model_format, vector)))
+    return {
+        "load_ms": round(statistics.median(seconds for seconds, _ in results) * 1000, 1),
+        "memory_mb": round(statistics.median(size for _, size in results) / 2**20, 1)
+    }
+
+
+def file_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def measure(path, formats, X, y, args, workdir):
+    model = load(path, 'sklearn')
+    report = {"path": os.path.abspath(path), "formats": {}}
+    probabilities = {}
+    for model_format in formats:
+        serving = serving_form(model, model_format)
+        load_path = path
+        if model_format == 'flat':
+            # Saved where the benchmark can't disturb the directory predict.py maps next to the model
+            load_path = os.path.join(workdir, hashlib.sha1(path.encode()).hexdigest()[:12])
+            serving.save(load_path)
+        probabilities[model_format] = score_batch(serving, X)
+        report["formats"][model_format] = {
+            "file_kb": round(file_size(load_path) / 1024, 1),
+            **quality(probabilities[model_format], y),
+            **latency(serving, X, args.rows, args.batch),
+            **load_cost(load_path, model_format, X[0].tolist(), args.load_repeats)
+        }
+    return report, probabilities
+
+
+def compare(report, args):
+    """Candidate regressions against current, per format, as (format, what, current, candidate)."""
+    regressions = []
+    for model_format, candidate in report["models"]["candidate"]["formats"].items():
+        current = report["models"]["current"]["formats"][model_format]
+        if current["roc_auc"] - candidate["roc_auc"] > args.max_auc_drop:
+            regressions.append((model_format, "roc_auc", current["roc_auc"], candidate["roc_auc"]))
+        if current["accuracy"] - candidate["accuracy"] > args.max_accuracy_drop:
+            regressions.append((model_format, "accuracy", current["accuracy"], candidate["accuracy"]))
+        before, after = current["single_ms"]["p50"], candidate["single_ms"]["p50"]
+        if before > 0 and after / before - 1 > args.max_latency_regression:
+            regressions.append((model_format, "single_ms.p50", before, after))
+    return regressions
+
+
+def print_report(report):
+    data = report["data"]
+    print(f"{data['rows']} unseen rows from {data['path']} ({data['procrastinating']:.1%} procrastinating, "
+          f"{data['training_rows_dropped']} training rows dropped), threshold {report['threshold']}\n")
+    print(f"{'model':<10}{'format':>8}{'AUC':>8}{'acc':>8}{'prec':>7}{'recall':>8}{'p50 ms':>8}{'p99 ms':>8}"
+          f"{'rows/s':>9}{'load ms':>9}{'mem MB':>8}{'file KB':>9}")
+    for name, model in report["models"].items():
+        for model_format, row in model["formats"].items():
+            print(f"{name:<10}{model_format:>8}{row['roc_auc']:>8.4f}{row['accuracy']:>8.4f}{row['precision']:>7.3f}"
+                  f"{row['recall']:>8.3f}{row['single_ms']['p50']:>8.3f}{row['single_ms']['p99']:>8.3f}"
+                  f"{row['batch_rows_per_s']:>9}{row['load_ms']:>9}{row['memory_mb']:>8}{row['file_kb']:>9}")
+    print("\nAgreement at the threshold: " +
+          ', '.join(f"{model_format} {share:.2%}" for model_format, share in report["agreement"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidate', required=True, help='Model file or registry version')
+    parser.add_argument('--current', help='Model file or registry version (default: active version, else MODEL_PATH)')
+    parser.add_argument('--data', required=True,
+                        help='Labelled CSV (FEATURE_COLUMNS and Focus) that neither model was trained on')
+    parser.add_argument('--formats', nargs='+', choices=('sklearn', 'flat'), default=['sklearn'])
+    parser.add_argument('--rows', type=int, default=500, help='Single-row calls timed')
+    parser.add_argument('--batch', type=int, default=256, help='Rows per batched call')
+    parser.add_argument('--load-repeats', type=int, default=3, help='Fresh processes per load measurement')
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--max-auc-drop', type=float, default=0.01)
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01)
+    parser.add_argument('--max-latency-regression', type=float, default=0.25, help='Allowed single-row p50 growth')
+    args = parser.parse_args()
+
+    paths = {"current": resolve(args.current), "candidate": resolve(args.candidate)}
+    X, y, dropped = held_out(args.data)
+    report = {
+        "threshold": THRESHOLD,
+        "data": {"path": os.path.abspath(args.data), "rows": len(X), "training_rows_dropped": dropped,
+                 "procrastinating": float((y == 0).mean()),
+                 "sha1": hashlib.sha1(X.tobytes() + y.to_numpy().tobytes()).hexdigest()},
+        "host": {"cpus": os.cpu_count(), "python": platform.python_version(), "sklearn": sklearn.__version__,
+                 "numpy": np.__version__},
+        "config": {"rows": args.rows, "batch": args.batch, "load_repeats": args.load_repeats},
+        "models": {}
+    }
+    probabilities = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, path in paths.items():
+            report["models"][name], probabilities[name] = measure(path, args.formats, X, y, args, workdir)
+    report["agreement"] = {
+        model_format: float(np.mean((probabilities["current"][model_format] > THRESHOLD) ==
+                                    (probabilities["candidate"][model_format] > THRESHOLD)))
+        for model_format in args.formats
+    }
+    regressions = compare(report, args)
+    report["regressions"] = [{"format": f, "metric": m, "current": a, "candidate": b} for f, m, a, b in regressions]
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for model_format, metric, before, after in regressions:
+        print(f"❌ {model_format} {metric}: {before:.4f} -> {after:.4f}")
+    if regressions:
+        sys.exit(1)
+    print("✅ Candidate is no less accurate and no slower than the current model")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# Throughput and memory of the pre-fork prediction server across worker counts and model formats
+"""
+For each model format (sklearn, flat) and worker count, starts python -m predict.serve on a
+free port, drives POST /predict with binary feature vectors from --clients client processes
+over keep-alive connections for --duration seconds, and reports:
+
+  req/s, p50/p99 latency   does throughput scale with workers?
+  rss_mb                   summed RSS of the parent and workers: counts shared pages once per process
+  pss_mb                   summed PSS (/proc/<pid>/smaps_rollup): shared pages split between their users,
+                           so this is the physical memory the server really costs
+
+Flat workers map one copy of the model; sklearn workers each unpickle their own. Throughput
+can only scale up to the cores left over by the clients.
+
+    python -m benchmarks.predict_workers --workers 1 2 4 --duration 10
+    python -m benchmarks.predict_workers --formats flat --workers 8 --clients 8 --json workers.json
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from predict import wire
+from predict.ingest import read_compact
+from predict.features import FEATURE_COLUMNS
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'predict',
+                    'productivity_data_enhanced.csv')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} didn't start within {timeout}s")
+
+
+def server_pids(parent):
+    """The server's parent process and its forked workers."""
+    children = subprocess.run(['pgrep', '-P', str(parent)], capture_output=True, text=True).stdout.split()
+    return [parent] + [int(pid) for pid in children]
+
+
+def memory_mb(pids):
+    rss = pss = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Rss:'):
+                        rss += int(line.split()[1])
+                    elif line.startswith('Pss:'):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss / 1024, pss / 1024
+
+
+def client(port, bodies, duration, results):
+    """One keep-alive connection posting vectors back to back. Sends (count, latencies_ms)."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': wire.CONTENT_TYPE, 'Accept': wire.CONTENT_TYPE}
+    latencies = []
+    rng = random.Random(os.getpid())
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        conn.request('POST', '/predict', rng.choice(bodies), headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    results.put(latencies)
+
+
+def measure(model_format, workers, args, bodies):
+    port = free_port()
+    env = dict(os.environ, MEMORY_SAMPLE_INTERVAL='0', PREDICTION_CACHE_SIZE='0', LOG_LEVEL='WARNING')
+    server = subprocess.Popen([sys.executable, '-m', 'predict.serve', '--port', str(port), '--workers', str(workers),
+                               '--format', model_format, '--threads', str(args.threads)],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+    try:
+        wait_ready(port)
+        time.sleep(1)
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(port, bodies, args.duration, results))
+                   for _ in range(args.clients)]
+        for process in clients:
+            process.start()
+        # Sampled mid-run, once every worker has served requests
+        time.sleep(args.duration / 2)
+        rss, pss = memory_mb(server_pids(server.pid))
+        latencies = sorted(latency for _ in clients for latency in results.get())
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+
+    return {
+        "format": model_format,
+        "workers": workers,
+        "requests": len(latencies),
+        "req_per_s": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(percentile(0.50), 2) if latencies else None,
+        "p99_ms": round(percentile(0.99), 2) if latencies else None,
+        "rss_mb": round(rss, 1),
+        "pss_mb": round(pss, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--formats', nargs='+', choices=('sklearn', 'flat'), default=['sklearn', 'flat'])
+    parser.add_argument('--clients', type=int, default=4, help='Client processes, one connection each')
+    parser.add_argument('--threads', type=int, default=2, help='waitress threads per worker')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration')
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args()
+
+    rows = read_compact(DATA)[FEATURE_COLUMNS].sample(n=256, random_state=0).to_numpy(dtype=float)
+    bodies = [wire.encode_features(row) for row in rows]
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes, {args.duration:.0f}s per run\n")
+    print(f"{'format':>8}{'workers':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'rss MB':>9}{'pss MB':>9}")
+    results = []
+    for model_format in args.formats:
+        for workers in args.workers:
+            r = measure(model_format, workers, args, bodies)
+            results.append(r)
+            print(f"{r['format']:>8}{r['workers']:>9}{r['req_per_s']:>9}{r['p50_ms']:>9}{r['p99_ms']:>9}"
+                  f"{r['rss_mb']:>9}{r['pss_mb']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"cpus": os.cpu_count(), "clients": args.clients, "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
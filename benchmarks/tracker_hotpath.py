@@ -0,0 +1,226 @@
+# Micro-benchmark for the ActivityTracker hot path: input callbacks, get_stats and buffer growth
+"""
+Injects synthetic keyboard and mouse events straight into ActivityTracker's _on_key_press,
+_on_mouse_move and _on_mouse_click from several threads, like pynput's listener threads would.
+pynput is not needed. Meanwhile one thread polls get_stats() the way /api/activity does.
+
+Reports achieved events/sec, per-callback latency, lock contention, get_stats latency,
+deque sizes and process RSS, so tracker changes can be compared run to run.
+
+    python -m benchmarks.tracker_hotpath --keys 50 --moves 2000 --clicks 20 --duration 10
+    python -m benchmarks.tracker_hotpath --moves 0 --threads 4 --json tracker.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trackers.keyboard_mouse import ActivityTracker
+
+
+class ContentionLock:
+    """Drop-in for threading.Lock that counts contended acquisitions and the time spent waiting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ns = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter_ns()
+        acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            # Counters are only touched while holding the lock
+            self.acquisitions += 1
+            self.contended += 1
+            self.wait_ns += time.perf_counter_ns() - start
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux /proc, falling back to psutil)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss / 2**20
+        except ImportError:
+            return float('nan')
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return {f"p{p}": 0.0 for p in points} | {"max": 0.0}
+    ordered = sorted(values)
+    result = {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+    result["max"] = ordered[-1]
+    return result
+
+
+def inject(callback, rate, stop, durations):
+    """Call callback() at `rate` events/sec (0 = as fast as possible) until stop is set."""
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    count = 0
+    while not stop.is_set():
+        if interval:
+            delay = start + count * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter_ns()
+        callback()
+        durations.append(time.perf_counter_ns() - t0)
+        count += 1
+
+
+def poll_stats(tracker, interval, stop, latencies):
+    while not stop.is_set():
+        t0 = time.perf_counter_ns()
+        tracker.get_stats()
+        latencies.append(time.perf_counter_ns() - t0)
+        stop.wait(interval)
+
+
+def sample_memory(tracker, interval, stop, samples):
+    start = time.perf_counter()
+    while not stop.is_set():
+        samples.append({
+            "t": round(time.perf_counter() - start, 3),
+            "rss_mb": round(rss_mb(), 2),
+            "keystrokes": len(tracker.keystroke_times),
+            "mouse_moves": len(tracker.mouse_move_times),
+            "mouse_clicks": len(tracker.mouse_click_times)
+        })
+        stop.wait(interval)
+
+
+def run(keys, moves, clicks, threads, duration, poll_interval, time_window):
+    tracker = ActivityTracker()
+    tracker.time_window = time_window
+    lock = tracker.lock = ContentionLock()
+
+    streams = {
+        "key_press": (keys, lambda: tracker._on_key_press('a')),
+        "mouse_move": (moves, lambda: tracker._on_mouse_move(100, 200)),
+        "mouse_click": (clicks, lambda: tracker._on_mouse_click(100, 200, 'left', True)),
+    }
+
+    stop = threading.Event()
+    durations = {name: [] for name in streams}
+    stats_latencies = []
+    memory = []
+    workers = []
+    for name, (rate, callback) in streams.items():
+        if rate < 0:
+            continue
+        for _ in range(threads):
+            per_thread = rate / threads if rate else 0
+            # Each thread appends to its own list; merged after the run
+            thread_durations = []
+            durations[name].append(thread_durations)
+            workers.append(threading.Thread(target=inject, args=(callback, per_thread, stop, thread_durations)))
+    workers.append(threading.Thread(target=poll_stats, args=(tracker, poll_interval, stop, stats_latencies)))
+    workers.append(threading.Thread(target=sample_memory, args=(tracker, 0.5, stop, memory)))
+
+    rss_before = rss_mb()
+    # Keep anything the callbacks write (LOG_LEVEL=DEBUG key logs, say) off the terminal
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        time.sleep(duration)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+    report = {"elapsed_seconds": round(elapsed, 3), "streams": {}}
+    for name, per_thread in durations.items():
+        merged = [d for thread_durations in per_thread for d in thread_durations]
+        if not merged:
+            continue
+        report["streams"][name] = {
+            "events": len(merged),
+            "events_per_sec": round(len(merged) / elapsed, 1),
+            "callback_us": {k: round(v / 1000, 2) for k, v in percentiles(merged).items()}
+        }
+    report["lock"] = {
+        "acquisitions": lock.acquisitions,
+        "contended": lock.contended,
+        "contended_pct": round(100 * lock.contended / lock.acquisitions, 2) if lock.acquisitions else 0,
+        "total_wait_ms": round(lock.wait_ns / 1e6, 2)
+    }
+    report["get_stats_ms"] = {k: round(v / 1e6, 3) for k, v in percentiles(stats_latencies).items()}
+    report["get_stats_calls"] = len(stats_latencies)
+    report["memory"] = {
+        "rss_before_mb": round(rss_before, 2),
+        "rss_peak_mb": max(s["rss_mb"] for s in memory) if memory else None,
+        "rss_after_mb": round(rss_mb(), 2),
+        "max_buffered_events": max((s["keystrokes"] + s["mouse_moves"] + s["mouse_clicks"] for s in memory), default=0),
+        "samples": memory
+    }
+    return report
+
+
+def print_report(report):
+    print(f"\n{'stream':<14}{'events':>10}{'ev/s':>10}{'p50 us':>9}{'p95 us':>9}{'p99 us':>9}{'max us':>10}")
+    for name, row in report["streams"].items():
+        cb = row["callback_us"]
+        print(f"{name:<14}{row['events']:>10}{row['events_per_sec']:>10.0f}{cb['p50']:>9.2f}"
+              f"{cb['p95']:>9.2f}{cb['p99']:>9.2f}{cb['max']:>10.1f}")
+    lock = report["lock"]
+    print(f"\nLock: {lock['acquisitions']} acquisitions, {lock['contended']} contended "
+          f"({lock['contended_pct']}%), {lock['total_wait_ms']} ms waiting")
+    stats = report["get_stats_ms"]
+    print(f"get_stats ({report['get_stats_calls']} calls): p50 {stats['p50']} ms, p95 {stats['p95']} ms, "
+          f"p99 {stats['p99']} ms, max {stats['max']} ms")
+    memory = report["memory"]
+    print(f"RSS: {memory['rss_before_mb']} MB before, {memory['rss_peak_mb']} MB peak, "
+          f"{memory['rss_after_mb']} MB after; up to {memory['max_buffered_events']} events buffered")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=float, default=20, help='Key presses/sec in total (0 = unthrottled, -1 = off)')
+    parser.add_argument('--moves', type=float, default=500, help='Mouse moves/sec in total (0 = unthrottled, -1 = off)')
+    parser.add_argument('--clicks', type=float, default=5, help='Mouse clicks/sec in total (0 = unthrottled, -1 = off)')
+    parser.add_argument('--threads', type=int, default=1, help='Injector threads per stream')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='Seconds between get_stats() calls')
+    parser.add_argument('--time-window', type=float, default=60, help="Tracker's sliding window in seconds")
+    parser.add_argument('--json', help='Write the full report (including memory samples) to this file')
+    args = parser.parse_args()
+
+    report = run(args.keys, args.moves, args.clicks, args.threads, args.duration,
+                 args.poll_interval, args.time_window)
+    report["config"] = vars(args)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
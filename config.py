@@ -0,0 +1,102 @@
+# Shared configuration for the ProcrastiCycle services
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# Consolidated server (server.py): one process, one port, every blueprint
+HOST = os.getenv("PROCRASTICYCLE_HOST", "127.0.0.1")
+PORT = int(os.getenv("PROCRASTICYCLE_PORT", "8888"))
+# Waitress worker threads. Handlers block on Spotify/Gemini/Calendar, so this is well above waitress' default of 4
+WAITRESS_THREADS = int(os.getenv("WAITRESS_THREADS", "16"))
+
+# Where the gateway sends predictions when predict.py isn't running in the same process
+ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "http://127.0.0.1:5001/predict")
+
+# The serving model. predict/online.py rewrites it in place; predict.py reloads it when its mtime changes
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "predict", "procrastination_model.pkl"))
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))  # seconds between mtime checks
+# sklearn: unpickled estimators. flat: memory-mapped arrays shared by every process (predict/flat.py)
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "sklearn").lower()
+
+# Versioned models (predict/registry.py). When set, the ACTIVE version there is served instead of MODEL_PATH
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR")
+MODEL_REGISTRY_KEEP = int(os.getenv("MODEL_REGISTRY_KEEP", "10"))  # older versions are deleted beyond this
+MODEL_PARITY_ROWS = int(os.getenv("MODEL_PARITY_ROWS", "200"))  # training rows a new version is checked on
+# Share of those rows a new version must classify like the serving one; 0 = warm-up only
+MODEL_PARITY_MIN_AGREEMENT = float(os.getenv("MODEL_PARITY_MIN_AGREEMENT", "0.8"))
+
+# Personal models (predict/tenants.py): one registry per user id, global model as fallback
+USER_MODELS_DIR = os.getenv("USER_MODELS_DIR", os.path.join(MODEL_REGISTRY_DIR, "users") if MODEL_REGISTRY_DIR else "")
+USER_MODELS_BUDGET_MB = float(os.getenv("USER_MODELS_BUDGET_MB", "256"))  # resident personal models, LRU beyond
+
+# Prediction cache (predict/cache.py): entries kept, 0 = off
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+# Per-feature bucket widths overriding predict/cache.py's defaults, e.g. "Keystrokes per min=10,Tempo=0.1"
+PREDICTION_CACHE_QUANTA = os.getenv("PREDICTION_CACHE_QUANTA", "")
+
+# Online learning (predict/online.py): labelled minutes from POST /label
+LABELS_PATH = os.getenv("LABELS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "predict", "labelled_minutes.csv"))
+ONLINE_BATCH_SIZE = int(os.getenv("ONLINE_BATCH_SIZE", "50"))  # new labels per update
+ONLINE_TREES_PER_BATCH = int(os.getenv("ONLINE_TREES_PER_BATCH", "10"))
+ONLINE_MAX_TREES = int(os.getenv("ONLINE_MAX_TREES", "300"))  # oldest trees are dropped beyond this
+
+# History (history/store.py): what the gateway observes, in sqlite. Empty HISTORY_DB = not recorded
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.sqlite3"))
+HISTORY_RAW_DAYS = float(os.getenv("HISTORY_RAW_DAYS", "35"))  # every sample (all exports can read), then hourly rollups
+HISTORY_HOURLY_DAYS = float(os.getenv("HISTORY_HOURLY_DAYS", "90"))  # then daily rollups
+HISTORY_DAILY_DAYS = float(os.getenv("HISTORY_DAILY_DAYS", "0"))  # 0 = daily rollups are kept forever
+HISTORY_COMPACT_INTERVAL = float(os.getenv("HISTORY_COMPACT_INTERVAL", "600"))  # seconds between downsampling runs
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))  # samples waiting for the writer
+# Dashboard (history/analytics.py): predictions further apart than this end a focus streak
+ANALYTICS_STREAK_GAP = float(os.getenv("ANALYTICS_STREAK_GAP", "300"))
+
+# Concurrent upstream calls within one request (routes/fanout.py)
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "32"))
+# Per-call deadlines: a request waits for the slowest of its upstreams, at most this long
+SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", "5"))
+CALENDAR_TIMEOUT = float(os.getenv("CALENDAR_TIMEOUT", "10"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "15"))
+
+# Logging (observability/log.py): records are written by a background thread, never by the caller
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text or json
+LOG_FILE = os.getenv("LOG_FILE")  # stdout when unset
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Keystrokes are logged at DEBUG, one in this many
+KEY_PRESS_LOG_EVERY = int(os.getenv("KEY_PRESS_LOG_EVERY", "100"))
+
+# Required in X-Admin-Token for /admin endpoints and profiling headers. Unset, only requests from
+# this machine that no web page sent (no Origin header, e.g. curl) get admin access
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Origins (comma-separated regular expressions) whose pages may read API responses; never /admin
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", r"chrome-extension://.*").split(',')
+                if origin.strip()]
+
+# Request profiling (observability/profiling.py): off until asked for
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Memory introspection (observability/memory.py)
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "300"))  # seconds, 0 = no sampler
+MEMORY_HISTORY = int(os.getenv("MEMORY_HISTORY", "288"))  # samples kept: a day at the default interval
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "0"))  # 0 = tracemalloc off at start
+
+_gemini_lock = threading.Lock()
+_gemini_configured = False
+
+
+def configure_gemini():
+    """Configure the Gemini client once per process, however many modules ask for it."""
+    global _gemini_configured
+    with _gemini_lock:
+        if _gemini_configured:
+            return
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        _gemini_configured = True
+
@@ -286,28 +286,10 @@ async function fetchActiveTabs() {
         console.log(`   📈 Productivity: ${(data.average_score * 100).toFixed(0)}%`);
         console.log('');
         
-        // Save to storage
-        chrome.storage.local.get(['tab_history'], (result) => {
-          const history = result.tab_history || [];
-          
-          history.push({
-            average_score: data.average_score,
-            urls_count: data.urls_count,
-            unique_domains: urls.length,
-            total_tabs: tabs.length,
-            timestamp: Date.now(),
-            time_string: timestamp
-          });
-          
-          if (history.length > 100) {
-            history.shift();
-          }
-          
-          chrome.storage.local.set({ 
-            latest_tab_analysis: data,
-            tab_analysis_timestamp: Date.now(),
-            tab_history: history
-          });
+        // Only the latest is kept here: the server records the history (/api/history/tabs)
+        chrome.storage.local.set({
+          latest_tab_analysis: data,
+          tab_analysis_timestamp: Date.now()
         });
         
         console.log('📄 Full JSON:', data);
@@ -370,25 +352,10 @@ async function fetchMusicFeatures() {
         console.log(`   ⚡ Energy: ${data.features.energy}`);
         console.log('');
         
-        // Save to storage with history
-        chrome.storage.local.get(['music_history'], (result) => {
-          const history = result.music_history || [];
-          
-          history.push({
-            ...data,
-            timestamp: Date.now(),
-            time_string: timestamp
-          });
-          
-          if (history.length > 100) {
-            history.shift();
-          }
-          
-          chrome.storage.local.set({ 
-            latest_music_features: data,
-            music_features_timestamp: Date.now(),
-            music_history: history
-          });
+        // Only the latest is kept here: the server records the history (/api/history/music)
+        chrome.storage.local.set({
+          latest_music_features: data,
+          music_features_timestamp: Date.now()
         });
         
         console.log('📄 Full JSON:', data);
@@ -466,22 +433,9 @@ async function fetchCalendarEvents() {
 }
 
       
-      // Store in local storage
-      chrome.storage.local.get(['calendar_history'], (result) => {
-        const history = result.calendar_history || [];
-        history.push({
-          events: data.events,
-          count: data.count,
-          timestamp: Date.now(),
-          time_string: timestamp
-        });
-
-        if (history.length > 50) history.shift();
-
-        chrome.storage.local.set({
-          latest_calendar_events: data,
-          calendar_history: history
-        });
+      // Only the latest is kept here: the server records the events it returns
+      chrome.storage.local.set({
+        latest_calendar_events: data
       });
     } else {
       console.log(`⚠️ Calendar error: ${data.error || 'Unknown'}`);
@@ -495,6 +449,26 @@ async function fetchCalendarEvents() {
   }
 }
 
+// Binary feature vector understood by /get_procrastination_prediction (see predict/wire.py):
+// 'PC', schema version, kind 1, then the features as little-endian float32 in this order
+const FEATURE_COLUMNS = [
+  'Hour', 'Minute', 'Day of week', 'Keystrokes per min', 'Mouse moves per min',
+  'Mouse clicks per min', 'Productivity of Active Chrome Tabs', 'Total Minutes of Events Before',
+  'Total Minutes of Events After', 'Total Minutes to Next Event', 'Spotify', 'Danceability',
+  'Tempo', 'Energy', 'Minutes_Into_Day'
+];
+const FEATURE_SCHEMA_VERSION = 1;
+
+function encodeFeatures(features) {
+  const view = new DataView(new ArrayBuffer(4 + 4 * FEATURE_COLUMNS.length));
+  view.setUint8(0, 0x50);  // 'P'
+  view.setUint8(1, 0x43);  // 'C'
+  view.setUint8(2, FEATURE_SCHEMA_VERSION);
+  view.setUint8(3, 1);
+  FEATURE_COLUMNS.forEach((name, i) => view.setFloat32(4 + 4 * i, Number(features[name]), true));
+  return view.buffer;
+}
+
 async function makeProcrastinationPrediction() {
   const timestamp = new Date().toLocaleTimeString();
   console.log(`\n🤖 [${timestamp}] Making procrastination prediction...`);
@@ -572,9 +546,9 @@ async function makeProcrastinationPrediction() {
     const response = await fetch('http://127.0.0.1:8888/get_procrastination_prediction', {
       method: 'POST',
       headers: {
-        'Content-Type': 'application/json',
+        'Content-Type': 'application/x-procrasticycle',
       },
-      body: JSON.stringify(features)
+      body: encodeFeatures(features)
     });
     
     if (response.ok) {
@@ -590,27 +564,10 @@ async function makeProcrastinationPrediction() {
         console.log(`   🚨 Status: ${isProcrastinating ? 'PROCRASTINATING' : 'Productive'}`);
         console.log('');
         
-        // Save to storage
-        chrome.storage.local.get(['prediction_history'], (storageResult) => {
-          const history = storageResult.prediction_history || [];
-          
-          history.push({
-            prediction: prediction,
-            procrastinating: isProcrastinating,
-            features: features,
-            timestamp: Date.now(),
-            time_string: timestamp
-          });
-          
-          if (history.length > 100) {
-            history.shift();
-          }
-          
-          chrome.storage.local.set({ 
-            latest_prediction: result,
-            prediction_timestamp: Date.now(),
-            prediction_history: history
-          });
+        // Only the latest is kept here: the server records the history (/api/history/prediction)
+        chrome.storage.local.set({
+          latest_prediction: result,
+          prediction_timestamp: Date.now()
         });
         
         // Show notification if procrastinating
@@ -0,0 +1,317 @@
+# Dashboard aggregates kept current as history is written, so reading them never touches raw samples
+"""
+The history store calls Analytics.update with every batch it writes, inside the same
+transaction, so these tables are always exactly as current as the samples themselves:
+
+    analytics_hours        count and sum of every series field (metric 'series.field') per local hour
+    analytics_histogram    activity rates per day, in HISTOGRAM_BINS bins
+    analytics_streaks      focus streaks: runs of predictions under the threshold, at most
+                           ANALYTICS_STREAK_GAP seconds apart
+    analytics_open_streak  the streak still running, if any
+
+They are kept whatever the raw retention and stay small (24 rows per metric and day, some
+tens of bins and streaks a day), and a dashboard reads at most one row per day, hour and
+metric in its range however many minutes were recorded in it.
+
+rebuild() recomputes them from what the store still holds, hourly rollups and raw samples;
+days that only have daily rollups left can't be split into hours and are skipped. Streaks
+and activity histograms need the raw samples, so a rebuild loses them for every day past
+HISTORY_RAW_DAYS: only the hourly metrics come back for those. It runs by itself when the
+tables are empty but the store isn't, e.g. after upgrading:
+
+    python -m history.analytics rebuild
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from history.store import DAY, HOUR, SERIES
+from observability.log import get_logger
+
+# Activity histogram bins per field: (width, count); the last bin holds everything above
+HISTOGRAM_BINS = {
+    'keystrokes': (10, 30),
+    'mouse_moves': (50, 40),
+    'mouse_clicks': (2, 30),
+}
+
+WEEKDAYS = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+
+# Rows per transaction when rebuilding from raw samples
+REBUILD_CHUNK = 50000
+
+log = get_logger('analytics')
+
+
+class Analytics:
+    def __init__(self, store, streak_gap=300):
+        self.store = store
+        self.streak_gap = streak_gap
+        db = store._connection()
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS analytics_hours (day INTEGER NOT NULL, hour INTEGER NOT NULL, "
+                       "metric TEXT NOT NULL, n INTEGER NOT NULL, total REAL NOT NULL, "
+                       "PRIMARY KEY (day, metric, hour)) WITHOUT ROWID")
+            db.execute("CREATE TABLE IF NOT EXISTS analytics_histogram (day INTEGER NOT NULL, field TEXT NOT NULL, "
+                       "bin INTEGER NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (day, field, bin)) WITHOUT ROWID")
+            db.execute("CREATE TABLE IF NOT EXISTS analytics_streaks (start REAL PRIMARY KEY, end REAL NOT NULL, "
+                       "samples INTEGER NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS analytics_open_streak (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                       "start REAL NOT NULL, end REAL NOT NULL, samples INTEGER NOT NULL)")
+        # Subscribed before any rebuild: a batch written meanwhile is either in the rebuild or added after it
+        store.subscribe(self.update)
+        if self._empty(db):
+            self.rebuild()
+
+    @staticmethod
+    def _empty(db):
+        if db.execute("SELECT 1 FROM analytics_hours LIMIT 1").fetchone():
+            return False
+        return not any(db.execute(f"SELECT 1 FROM {series} LIMIT 1").fetchone() or
+                       db.execute(f"SELECT 1 FROM {series}_rollup WHERE resolution = {HOUR} LIMIT 1").fetchone()
+                       for series in SERIES)
+
+    @staticmethod
+    def bin(field, value):
+        width, count = HISTOGRAM_BINS[field]
+        return min(max(int(value // width), 0), count - 1)
+
+    # Maintenance
+
+    def update(self, db, rows):
+        """Add a batch of new samples ({series: rows}, as history/store.py writes them)."""
+        hours = defaultdict(lambda: [0, 0.0])
+        bins = Counter()
+        for series, values in rows.items():
+            fields = SERIES.get(series)
+            if fields is None:
+                continue
+            for row in values:
+                day = self.store.bucket(row[0], DAY)
+                hour = int((row[0] - day) // HOUR)
+                for field, value in zip(fields, row[1:]):
+                    cell = hours[(day, hour, f"{series}.{field}")]
+                    cell[0] += 1
+                    cell[1] += value
+                    if series == 'activity':
+                        bins[(day, field, self.bin(field, value))] += 1
+        db.executemany("INSERT INTO analytics_hours VALUES (?, ?, ?, ?, ?) ON CONFLICT (day, metric, hour) "
+                       "DO UPDATE SET n = n + excluded.n, total = total + excluded.total",
+                       [(day, hour, metric, n, total) for (day, hour, metric), (n, total) in hours.items()])
+        db.executemany("INSERT INTO analytics_histogram VALUES (?, ?, ?, ?) ON CONFLICT (day, field, bin) "
+                       "DO UPDATE SET n = n + excluded.n",
+                       [key + (n,) for key, n in bins.items()])
+        if rows.get('prediction'):
+            self._streaks(db, sorted((row[0], row[2]) for row in rows['prediction']))
+
+    def _streaks(self, db, samples):
+        # Read back rather than cached, so a rolled-back batch can't leave a stale streak behind
+        current = db.execute("SELECT start, end, samples FROM analytics_open_streak").fetchone()
+        current = list(current) if current else None
+        closed = []
+        for ts, procrastinating in samples:
+            if current is not None and ts < current[1]:
+                # Older than the streak: too late to place
+                continue
+            if current is not None and (procrastinating or ts - current[1] > self.streak_gap):
+                closed.append(tuple(current))
+                current = None
+            if not procrastinating:
+                if current is None:
+                    current = [ts, ts, 1]
+                else:
+                    current[1] = ts
+                    current[2] += 1
+        db.executemany("INSERT OR REPLACE INTO analytics_streaks VALUES (?, ?, ?)", closed)
+        db.execute("DELETE FROM analytics_open_streak")
+        if current is not None:
+            db.execute("INSERT INTO analytics_open_streak VALUES (0, ?, ?, ?)", current)
+
+    def rebuild(self):
+        """
+        Recompute everything from the store's hourly rollups and raw samples. Streaks and
+        histograms of days whose raw samples were compacted away are not recovered.
+        """
+        start = time.monotonic()
+        db = self.store._connection()
+        with db:
+            for table in ('analytics_hours', 'analytics_histogram', 'analytics_streaks', 'analytics_open_streak'):
+                db.execute(f"DELETE FROM {table}")
+            day = self.store._bucket_sql('bucket', DAY)
+            for series, fields in SERIES.items():
+                for field in fields:
+                    db.execute(f"INSERT INTO analytics_hours SELECT {day}, (bucket - {day}) / {HOUR}, ?, n, {field}_sum "
+                               f"FROM {series}_rollup WHERE resolution = {HOUR}", (f"{series}.{field}",))
+            for series, fields in SERIES.items():
+                cursor = db.execute(f"SELECT ts, {', '.join(fields)} FROM {series} ORDER BY ts")
+                while True:
+                    chunk = cursor.fetchmany(REBUILD_CHUNK)
+                    if not chunk:
+                        break
+                    self.update(db, {series: chunk})
+            raw_from = min((row[0] for row in (db.execute(f"SELECT min(ts) FROM {series}").fetchone()
+                                               for series in SERIES) if row[0] is not None), default=None)
+            hours_from = db.execute("SELECT min(day) FROM analytics_hours").fetchone()[0]
+        if hours_from is not None and (raw_from is None or self.store.bucket(raw_from, DAY) > hours_from):
+            log.warning("Analytics rebuilt without streaks and histograms before the oldest raw sample",
+                        extra={"fields": {"raw_from": self._date(self.store.bucket(raw_from, DAY)) if raw_from else None,
+                                          "hours_from": self._date(hours_from)}})
+        log.info("Analytics rebuilt", extra={"fields": {"ms": round((time.monotonic() - start) * 1000, 1)}})
+
+    # Queries. start and end are epoch seconds; days are local days, as in the store
+
+    def _days(self, start, end):
+        return self.store.bucket(start, DAY), end
+
+    def _date(self, day):
+        return time.strftime('%Y-%m-%d', time.gmtime(day + self.store.day_offset))
+
+    def hour_of_week(self, start, end, metric='prediction.probability'):
+        """Mean of metric per weekday (0 = Sunday, as the model's 'Day of week') and hour of day."""
+        offset = self.store.day_offset
+        rows = self.store._connection().execute(
+            f"SELECT ((day + {offset}) / {DAY} + 4) % 7 AS weekday, hour, SUM(n), SUM(total) FROM analytics_hours "
+            f"WHERE metric = ? AND day >= ? AND day < ? GROUP BY weekday, hour ORDER BY weekday, hour",
+            (metric,) + self._days(start, end)).fetchall()
+        by_hour = [[0, 0.0] for _ in range(24)]
+        by_weekday = [[0, 0.0] for _ in WEEKDAYS]
+        for weekday, hour, n, total in rows:
+            for cell in (by_hour[hour], by_weekday[weekday]):
+                cell[0] += n
+                cell[1] += total
+        return {
+            "metric": metric,
+            "cells": [{"weekday": weekday, "hour": hour, "n": n, "mean": total / n}
+                      for weekday, hour, n, total in rows],
+            "by_hour": [{"hour": hour, "n": n, "mean": total / n if n else None}
+                        for hour, (n, total) in enumerate(by_hour)],
+            "by_weekday": [{"weekday": weekday, "name": WEEKDAYS[weekday], "n": n, "mean": total / n if n else None}
+                           for weekday, (n, total) in enumerate(by_weekday)]
+        }
+
+    def streaks(self, start, end, limit=10, now=None):
+        """Longest focus streaks, streaks per day and the one running now (durations in minutes)."""
+        now = time.time() if now is None else now
+        db = self.store._connection()
+        longest = db.execute("SELECT start, end, samples FROM analytics_streaks WHERE start >= ? AND start < ? "
+                             "ORDER BY end - start DESC LIMIT ?", (start, end, limit)).fetchall()
+        day = self.store._bucket_sql('start', DAY)
+        daily = db.execute(f"SELECT {day} AS day, COUNT(*), SUM(end - start), MAX(end - start) FROM analytics_streaks "
+                           f"WHERE start >= ? AND start < ? GROUP BY day ORDER BY day", (start, end)).fetchall()
+        current = db.execute("SELECT start, end, samples FROM analytics_open_streak").fetchone()
+        if current is not None and now - current[1] > self.streak_gap:
+            current = None
+
+        def streak(row):
+            return {"start": row[0], "end": row[1], "samples": row[2], "minutes": round((row[1] - row[0]) / 60, 1)}
+
+        return {
+            "gap_seconds": self.streak_gap,
+            "current": streak(current) if current else None,
+            "longest": [streak(row) for row in longest],
+            "daily": [{"ts": day, "date": self._date(day), "streaks": count, "minutes": round(total / 60, 1),
+                       "longest_minutes": round(longest_seconds / 60, 1)}
+                      for day, count, total, longest_seconds in daily]
+        }
+
+    def activity(self, start, end):
+        """Distribution of each activity rate: bin counts, mean and bin-resolution percentiles."""
+        db = self.store._connection()
+        counts = defaultdict(Counter)
+        for field, bin_, n in db.execute("SELECT field, bin, SUM(n) FROM analytics_histogram "
+                                         "WHERE day >= ? AND day < ? GROUP BY field, bin", self._days(start, end)):
+            counts[field][bin_] = n
+        means = dict(db.execute("SELECT metric, SUM(total) / SUM(n) FROM analytics_hours "
+                                "WHERE metric LIKE 'activity.%' AND day >= ? AND day < ? GROUP BY metric",
+                                self._days(start, end)))
+        result = {}
+        for field, (width, count) in HISTOGRAM_BINS.items():
+            bins = [counts[field][i] for i in range(count)]
+            total = sum(bins)
+
+            def percentile(p):
+                if not total:
+                    return None
+                running = 0
+                for i, n in enumerate(bins):
+                    running += n
+                    if running >= p * total:
+                        return (i + 1) * width
+                return count * width
+
+            result[field] = {
+                "bin_width": width,
+                "bins": bins,
+                "n": total,
+                "mean": means.get(f"activity.{field}"),
+                "p50": percentile(0.5),
+                "p90": percentile(0.9)
+            }
+        return result
+
+    def tabs(self, start, end, window=7):
+        """Mean tab productivity per day, its trailing window-day mean, and per hour of day."""
+        db = self.store._connection()
+        days = db.execute("SELECT day, SUM(n), SUM(total) FROM analytics_hours WHERE metric = 'tabs.score' "
+                          "AND day >= ? AND day < ? GROUP BY day ORDER BY day", self._days(start, end)).fetchall()
+        points = []
+        for i, (day, n, total) in enumerate(days):
+            recent = [(m, t) for d, m, t in days[:i + 1] if d > day - window * DAY]
+            points.append({"ts": day, "date": self._date(day), "n": n, "score": total / n,
+                           f"score_{window}d": sum(t for _, t in recent) / sum(m for m, _ in recent)})
+        by_hour = db.execute("SELECT hour, SUM(n), SUM(total) FROM analytics_hours WHERE metric = 'tabs.score' "
+                             "AND day >= ? AND day < ? GROUP BY hour ORDER BY hour", self._days(start, end))
+        return {
+            "daily": points,
+            "by_hour": [{"hour": hour, "n": n, "score": total / n} for hour, n, total in by_hour],
+            "change": (points[-1][f"score_{window}d"] - points[0][f"score_{window}d"]) if len(points) > 1 else None
+        }
+
+    def dashboard(self, start, end):
+        return {
+            "start": start,
+            "end": end,
+            "procrastination": self.hour_of_week(start, end),
+            "streaks": self.streaks(start, end),
+            "activity": self.activity(start, end),
+            "tabs": self.tabs(start, end)
+        }
+
+
+def from_store(store):
+    """Analytics over store, or None without one."""
+    if store is None:
+        return None
+    return Analytics(store, streak_gap=config.ANALYTICS_STREAK_GAP)
+
+
+def main():
+    from history.store import from_config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=config.HISTORY_DB, help='History database (HISTORY_DB)')
+    parser.add_argument('--days', type=float, default=30, help='Range of the dashboard command')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='Recompute every aggregate from the store')
+    commands.add_parser('dashboard', help='Print the dashboard for the last --days days')
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error('set HISTORY_DB or pass --db')
+    config.HISTORY_DB = args.db
+    analytics = from_store(from_config())
+    if args.command == 'rebuild':
+        analytics.rebuild()
+    else:
+        end = time.time()
+        print(json.dumps(analytics.dashboard(end - args.days * DAY, end), indent=2))
+
+
+if __name__ == '__main__':
+    main()
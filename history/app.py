@@ -0,0 +1,86 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from history.analytics import from_store
+from history.export import export
+from history.store import DAY, RAW, HistoryError, from_config, timestamp
+from observability import memory
+
+bp = Blueprint('history', __name__)
+
+# Shared with the gateway handlers that record into it (routes/main.py) and the dashboard (templates/dashboard.py)
+history = from_config()
+analytics = from_store(history)
+
+if history is not None:
+    memory.register('history.queue', lambda: list(history._queue.queue))
+
+
+def _history_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if history is None:
+            return jsonify({"error": "No history: set HISTORY_DB"}), 404
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def time_range(default):
+    """(start, end) from ?start= and ?end=, epoch seconds or ISO 8601; the last default seconds without them."""
+    end = request.args.get('end')
+    end = timestamp(end) if end else time.time()
+    start = request.args.get('start')
+    return (timestamp(start) if start else end - default), end
+
+
+@bp.route('/api/history', methods=['GET'])
+@_history_required
+def get_history_status():
+    """Series, rows per tier, retention and the size of the store"""
+    return jsonify(history.status())
+
+
+@bp.route('/api/history/<series>', methods=['GET'])
+@_history_required
+def get_history(series):
+    """
+    ?start= and ?end= (epoch seconds or ISO 8601, default the last day) and
+    ?resolution=raw|hour|day (default auto: the finest that covers the range).
+    """
+    try:
+        start, end = time_range(DAY)
+        resolution = request.args.get('resolution', 'auto')
+        if resolution == 'auto':
+            resolution = history.auto_resolution(start, end)
+        points = history.query(series, start, end, resolution)
+    except HistoryError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"series": series, "resolution": resolution, "points": points})
+
+
+@bp.route('/api/history/<series>/export', methods=['GET'])
+@_history_required
+def export_history(series):
+    """
+    Raw samples streamed page by page: ?start= and ?end= (default: all raw samples kept),
+    ?columns=a,b (ts is always first) and ?format=ndjson|csv|arrow|parquet (default ndjson).
+    Nothing older than HISTORY_RAW_DAYS is exported: past that only get_history's rollups remain.
+    """
+    try:
+        start, end = time_range(history.retention[RAW])
+        columns = request.args.get('columns')
+        content_type, extension, body = export(history, series, start, end,
+                                               columns.split(',') if columns else None,
+                                               request.args.get('format', 'ndjson'))
+    except HistoryError as e:
+        return jsonify({"error": str(e)}), 400
+    filename = f"{series}-{time.strftime('%Y%m%d%H%M', time.localtime(start))}-" \
+               f"{time.strftime('%Y%m%d%H%M', time.localtime(end))}.{extension}"
+    return Response(stream_with_context(body), content_type=content_type,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
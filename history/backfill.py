@@ -0,0 +1,196 @@
+# Rebuild the model's 15 features for every minute from the recorded per-source history
+"""
+Each source is recorded on its own clock (history/store.py): activity rates, tab scores and
+music features whenever the extension polls them, calendar events whenever it fetches the
+day. backfill() lines them up on a one-minute grid with as-of joins, every minute taking
+the latest sample of each source at or before it, all in numpy:
+
+    times                      one row per minute
+    np.searchsorted(ts, times) index of the latest sample of a source, for every minute at once
+
+A sample is used for MAX_AGE[source] seconds; older minutes get the extension's defaults
+(0, tabs 0.5, no Spotify). Minutes whose raw samples have been compacted away use the
+hourly rollup's means within that hour instead. Calendar features come from counts of
+events per local day, again one searchsorted per column:
+
+    Total Minutes of Events Before/After  minutes of today's events starting before/after the minute
+    Total Minutes to Next Event           until the next event starts, 999 without one
+
+Like the extension, which is what the model sees when serving, these count EVENT_MINUTES
+per event whatever its real length (the events it gets carry no duration) and skip all-day
+events.
+
+    python -m history.backfill --days 90 -o features.csv
+    python -m history.backfill --start 2026-09-01 --observed-only -o features.parquet
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import config
+from history.store import DAY, HOUR, HistoryError
+from observability.log import get_logger
+from predict.features import FEATURE_COLUMNS
+
+# Feature columns filled from each series, and the series field each comes from
+SOURCES = {
+    'activity': {
+        'Keystrokes per min': 'keystrokes',
+        'Mouse moves per min': 'mouse_moves',
+        'Mouse clicks per min': 'mouse_clicks',
+    },
+    'tabs': {
+        'Productivity of Active Chrome Tabs': 'score',
+    },
+    'music': {
+        'Danceability': 'danceability',
+        'Tempo': 'tempo',
+        'Energy': 'energy',
+    },
+}
+# Seconds a raw sample stands for: the extension polls every minute
+MAX_AGE = {'activity': 120, 'tabs': 600, 'music': 600}
+# What the extension sends when it has nothing (background.js)
+DEFAULTS = {'Productivity of Active Chrome Tabs': 0.5, 'Total Minutes to Next Event': 999}
+
+# Minutes the extension counts per event (background.js: event.duration || 60)
+EVENT_MINUTES = 60
+
+log = get_logger('backfill')
+
+
+def load_source(store, series, fields, start, end, max_age):
+    """
+    (ts, valid_until, values) of series' samples that can cover [start, end), sorted by ts:
+    raw samples valid for max_age seconds, hourly rollup means valid to the end of their hour.
+    """
+    db = store._connection()
+    raw = db.execute(f"SELECT ts, {', '.join(fields)} FROM {series} WHERE ts >= ? AND ts < ? ORDER BY ts",
+                     (start - max_age, end)).fetchall()
+    means = ', '.join(f"{field}_sum / n" for field in fields)
+    hourly = db.execute(f"SELECT bucket, {means} FROM {series}_rollup WHERE resolution = {HOUR} "
+                        f"AND bucket >= ? AND bucket < ? ORDER BY bucket", (start - HOUR, end)).fetchall()
+    samples = np.array(raw + hourly, dtype=np.float64).reshape(-1, len(fields) + 1)
+    valid_until = samples[:, 0] + np.r_[np.full(len(raw), max_age), np.full(len(hourly), HOUR)]
+    # Stable, so a raw sample and an hour starting at the same second keep raw first
+    order = np.argsort(samples[:, 0], kind='stable')
+    return samples[order, 0], valid_until[order], samples[order, 1:]
+
+
+def asof(times, ts, valid_until, values):
+    """For every time, the latest values at or before it that are still valid, and whether there was one."""
+    index = np.searchsorted(ts, times, side='right') - 1
+    found = index >= 0
+    found[found] = times[found] < valid_until[index[found]]
+    return values[np.where(found, index, 0)] if len(values) else np.zeros((len(times), values.shape[1])), found
+
+
+def time_features(times, day_offset):
+    local = times + day_offset
+    minutes_into_day = (local % DAY) // 60
+    return {
+        'Hour': minutes_into_day // 60,
+        'Minute': minutes_into_day % 60,
+        # 0 = Sunday, like the extension's Date.getDay(); 1970-01-01 was a Thursday
+        'Day of week': (local // DAY + 4) % 7,
+        'Minutes_Into_Day': minutes_into_day,
+    }
+
+
+def calendar_features(times, starts, day_offset):
+    """Before/after/next-event minutes for every time, from the events' start times."""
+    if not starts:
+        return {
+            'Total Minutes of Events Before': np.zeros(len(times)),
+            'Total Minutes of Events After': np.zeros(len(times)),
+            'Total Minutes to Next Event': np.full(len(times), DEFAULTS['Total Minutes to Next Event'], dtype=float),
+        }
+    starts = np.sort(np.asarray(starts, dtype=np.float64))
+    # Minutes of all events starting before each index, so a range of events costs two lookups
+    cumulative = np.arange(len(starts) + 1, dtype=np.float64) * EVENT_MINUTES
+    day_start = (times + day_offset) // DAY * DAY - day_offset
+    first_today = np.searchsorted(starts, day_start, side='left')
+    first_tomorrow = np.searchsorted(starts, day_start + DAY, side='left')
+    before = np.searchsorted(starts, times, side='left')
+    not_after = np.searchsorted(starts, times, side='right')
+    upcoming = np.minimum(before, len(starts) - 1)
+    return {
+        'Total Minutes of Events Before': cumulative[before] - cumulative[first_today],
+        'Total Minutes of Events After': cumulative[first_tomorrow] - cumulative[np.maximum(not_after, first_today)],
+        'Total Minutes to Next Event': np.where(before < len(starts), (starts[upcoming] - times) // 60,
+                                                DEFAULTS['Total Minutes to Next Event']),
+    }
+
+
+def backfill(store, start, end, max_age=None):
+    """
+    FEATURE_COLUMNS for every minute in [start, end) as a float32 DataFrame indexed by the
+    minute (epoch seconds), and a boolean Series: minutes with activity, tab or music data.
+    """
+    max_age = {**MAX_AGE, **(max_age or {})}
+    begin = time.monotonic()
+    first = -(-int(start) // 60) * 60
+    times = np.arange(first, end, 60, dtype=np.float64)
+    columns = time_features(times, store.day_offset)
+    observed = np.zeros(len(times), dtype=bool)
+
+    for series, features in SOURCES.items():
+        ts, valid_until, values = load_source(store, series, list(features.values()), start, end, max_age[series])
+        matched, found = asof(times, ts, valid_until, values)
+        observed |= found
+        for i, column in enumerate(features):
+            columns[column] = np.where(found, matched[:, i], DEFAULTS.get(column, 0))
+        if series == 'music':
+            columns['Spotify'] = found.astype(np.float64)
+
+    starts = [event['start'] for event in store.events(start - DAY, end + DAY) if not event['all_day']]
+    columns.update(calendar_features(times, starts, store.day_offset))
+
+    index = pd.Index(times.astype(np.int64), name='ts')
+    frame = pd.DataFrame({column: np.asarray(columns[column], dtype=np.float32) for column in FEATURE_COLUMNS},
+                         index=index)
+    log.info("Backfilled features", extra={"fields": {"minutes": len(frame), "observed": int(observed.sum()),
+                                                      "ms": round((time.monotonic() - begin) * 1000, 1)}})
+    return frame, pd.Series(observed, index=index, name='observed')
+
+
+def main():
+    from history.store import from_config, timestamp
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=config.HISTORY_DB, help='History database (HISTORY_DB)')
+    parser.add_argument('--start', help='Epoch seconds or ISO 8601 (default: --days before --end)')
+    parser.add_argument('--end', help='Epoch seconds or ISO 8601 (default: now)')
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--observed-only', action='store_true',
+                        help='Only minutes with activity, tab or music data')
+    parser.add_argument('-o', '--output', required=True, help='.csv, or .parquet (needs pyarrow)')
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error('set HISTORY_DB or pass --db')
+    config.HISTORY_DB = args.db
+    try:
+        end = timestamp(args.end) if args.end else time.time()
+        start = timestamp(args.start) if args.start else end - args.days * DAY
+    except HistoryError as e:
+        raise SystemExit(str(e))
+
+    frame, observed = backfill(from_config(), start, end)
+    if args.observed_only:
+        frame = frame[observed]
+    if args.output.endswith('.parquet'):
+        frame.to_parquet(args.output)
+    else:
+        frame.to_csv(args.output)
+    print(f"{len(frame)} minutes written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# Streaming export of recorded history as NDJSON, CSV, Arrow or Parquet, in constant memory
+"""
+Raw samples are read EXPORT_CHUNK rows at a time by keyset pagination, WHERE (ts, rowid) >
+(last ts, last rowid), and each page is encoded and handed on before the next is read. Memory
+stays at one page whatever the range, and no read transaction is held between pages, so the
+gateway keeps recording while a long export runs.
+
+Columns are ts (epoch seconds, always first), the series' fields and, for prediction, the
+model's 15 features under their FEATURE_COLUMNS names: an export of prediction has the
+training CSV's feature columns. ?columns= / --columns picks a subset.
+
+Only raw samples are exported, so an export reaches back HISTORY_RAW_DAYS at most; older
+minutes survive only as hourly and daily rollups (GET /api/history/<series>?resolution=hour),
+which have no per-minute features to train on. Set HISTORY_RAW_DAYS to cover the longest
+range you will want to export before it is compacted away.
+
+Formats:
+
+    ndjson   one JSON object per line
+    csv      a header, then one line per sample
+    arrow    an Arrow IPC stream, one record batch per page (needs pyarrow)
+    parquet  one row group per page (needs pyarrow)
+
+    GET /api/history/prediction/export?start=2026-10-01&format=parquet
+    python -m history.export prediction --days 14 --format parquet -o predictions.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from history.store import DAY, RAW, SERIES, WITH_FEATURES, HistoryError
+from predict import wire
+from predict.features import FEATURE_COLUMNS
+
+EXPORT_CHUNK = 10000
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def available_columns(series):
+    if series not in SERIES:
+        raise HistoryError(f"Unknown series {series!r}; one of {', '.join(SERIES)}")
+    return ('ts',) + SERIES[series] + (tuple(FEATURE_COLUMNS) if series in WITH_FEATURES else ())
+
+
+def select_columns(series, columns=None):
+    """The columns to export, in table order, ts first. Raises HistoryError on unknown ones."""
+    available = available_columns(series)
+    if not columns:
+        return available
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise HistoryError(f"Unknown columns {', '.join(map(repr, unknown))} for {series}; "
+                           f"one of {', '.join(available)}")
+    return ('ts',) + tuple(column for column in available[1:] if column in columns)
+
+
+def pages(store, series, start, end, columns, chunk=EXPORT_CHUNK):
+    """Lists of row tuples (in columns order) of series in [start, end), chunk rows at a time."""
+    fields = [column for column in columns[1:] if column in SERIES[series]]
+    features = [FEATURE_COLUMNS.index(column) for column in columns if column in FEATURE_COLUMNS]
+    select = ', '.join(['rowid', 'ts'] + fields + (['features'] if features else []))
+    db = store._connection()
+    last = (start, -1)
+    while True:
+        rows = db.execute(f"SELECT {select} FROM {series} WHERE (ts, rowid) > (?, ?) AND ts < ? "
+                          f"ORDER BY ts, rowid LIMIT ?", (*last, end, chunk)).fetchall()
+        if not rows:
+            return
+        last = (rows[-1][1], rows[-1][0])
+        if features:
+            page = []
+            for row in rows:
+                vector = wire.decode_features(row[-1]) if row[-1] is not None else (None,) * len(FEATURE_COLUMNS)
+                page.append(row[1:-1] + tuple(vector[i] for i in features))
+            yield page
+        else:
+            yield [row[1:] for row in rows]
+        if len(rows) < chunk:
+            return
+
+
+def ndjson(columns, pages):
+    for page in pages:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in page).encode()
+
+
+def csv_lines(columns, pages):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Sink:
+    """Write-only file for pyarrow's writers, emptied after every page."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise HistoryError("Arrow and Parquet exports need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def arrow_batches(columns, pages, parquet=False):
+    pa = _pyarrow()
+    schema = pa.schema([(column, pa.float64()) for column in columns])
+    sink = _Sink()
+    stream = pa.PythonFile(sink, mode='w')
+    writer = pa.parquet.ParquetWriter(stream, schema) if parquet else pa.ipc.new_stream(stream, schema)
+    try:
+        for page in pages:
+            batch = pa.record_batch([pa.array(values, type=pa.float64()) for values in zip(*page)], schema=schema)
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(store, series, start, end, columns=None, fmt='ndjson', chunk=EXPORT_CHUNK):
+    """(content type, file extension, iterator of bytes) for series between start and end."""
+    if fmt not in FORMATS:
+        raise HistoryError(f"Unknown format {fmt!r}; one of {', '.join(FORMATS)}")
+    columns = select_columns(series, columns)
+    if fmt in ('arrow', 'parquet'):
+        _pyarrow()
+    rows = pages(store, series, start, end, columns, chunk)
+    if fmt == 'ndjson':
+        body = ndjson(columns, rows)
+    elif fmt == 'csv':
+        body = csv_lines(columns, rows)
+    else:
+        body = arrow_batches(columns, rows, parquet=fmt == 'parquet')
+    content_type, extension = FORMATS[fmt]
+    return content_type, extension, body
+
+
+def main():
+    from history.store import from_config, timestamp
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('series', choices=tuple(SERIES))
+    parser.add_argument('--db', default=config.HISTORY_DB, help='History database (HISTORY_DB)')
+    parser.add_argument('--start', help='Epoch seconds or ISO 8601 (default: --days before --end)')
+    parser.add_argument('--end', help='Epoch seconds or ISO 8601 (default: now)')
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--columns', help='Comma-separated; ts is always included')
+    parser.add_argument('--format', choices=tuple(FORMATS), default='ndjson')
+    parser.add_argument('--chunk', type=int, default=EXPORT_CHUNK, help='Rows per page')
+    parser.add_argument('-o', '--output', help='File to write (default: stdout)')
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error('set HISTORY_DB or pass --db')
+    config.HISTORY_DB = args.db
+    try:
+        end = timestamp(args.end) if args.end else time.time()
+        start = timestamp(args.start) if args.start else end - args.days * DAY
+        columns = args.columns.split(',') if args.columns else None
+        store = from_config()
+        if start < time.time() - store.retention[RAW]:
+            print(f"Raw samples are kept for HISTORY_RAW_DAYS={config.HISTORY_RAW_DAYS:g} days; "
+                  "the export starts at the oldest one left", file=sys.stderr)
+        _, _, body = export(store, args.series, start, end, columns, args.format, args.chunk)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for data in body:
+                out.write(data)
+        finally:
+            if args.output:
+                out.close()
+    except HistoryError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+# Append-only time series of what the gateway observes, downsampled to hourly and daily rollups as it ages
+"""
+Series and their fields (SERIES), one sqlite table each:
+
+    prediction  probability, procrastinating (+ the 15 features as a wire vector, predict/wire.py)
+    activity    keystrokes, mouse_moves, mouse_clicks (per minute)
+    tabs        score, urls
+    music       danceability, tempo, energy
+
+plus calendar_events, the calendar events seen, one row per event id.
+
+Handlers call record(). The sample is queued and one writer thread inserts whatever has
+queued up in a single transaction, so a request never waits on sqlite; a full queue drops
+the sample and counts it (procrasticycle_history_samples_dropped_total).
+
+Retention per tier (config.py):
+
+    raw     HISTORY_RAW_DAYS      every sample
+    hour    HISTORY_HOURLY_DAYS   count, sum, min and max of each field per hour
+    day     HISTORY_DAILY_DAYS    the same per local day, 0 = kept forever
+
+Every HISTORY_COMPACT_INTERVAL seconds the writer folds raw samples past their retention
+into their hours, and hours into their days, in the transaction that deletes them. Rollups
+only ever add up, so a bucket folded into twice (a late sample, a partial hour) stays right.
+query() at hour or day resolution reads the rollups and aggregates whatever finer data is
+still in range, so a series reads the same before and after compaction.
+
+    python -m history.store status
+    python -m history.store compact
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from observability import metrics
+from observability.log import get_logger
+from predict import wire
+
+SERIES = {
+    'prediction': ('probability', 'procrastinating'),
+    'activity': ('keystrokes', 'mouse_moves', 'mouse_clicks'),
+    'tabs': ('score', 'urls'),
+    'music': ('danceability', 'tempo', 'energy'),
+}
+# Series that also keep the feature vector of each sample (raw tier only)
+WITH_FEATURES = ('prediction',)
+
+RAW, HOUR, DAY = 0, 3600, 86400
+RESOLUTIONS = {'raw': RAW, 'hour': HOUR, 'day': DAY}
+
+# Samples written per transaction at most
+WRITE_BATCH = 1000
+
+log = get_logger('history')
+
+recorded = metrics.counter('history_samples_total', 'Samples written to the history store.', ('series',))
+dropped = metrics.counter('history_samples_dropped_total', 'Samples dropped because the history queue was full.',
+                          ('series',))
+
+
+class HistoryError(ValueError):
+    pass
+
+
+def timestamp(value):
+    """Epoch seconds from a number, a numeric string or an ISO 8601 time (naive = local time)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HistoryError(f"Not a time: {value!r}")
+    return moment.timestamp()
+
+
+class HistoryStore:
+    def __init__(self, path, raw_days=35, hourly_days=90, daily_days=0, compact_interval=600, queue_size=10000):
+        self.path = path
+        self.retention = {RAW: raw_days * DAY, HOUR: hourly_days * DAY, DAY: daily_days * DAY}
+        self.compact_interval = compact_interval
+        # Daily buckets start at local midnight, at the UTC offset the store was opened with
+        self.day_offset = time.localtime().tm_gmtoff
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._observers = []
+        self._create()
+
+    # Schema and SQL
+
+    def _connection(self):
+        """This thread's connection: sqlite connections can't be shared between threads."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def _create(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = self._connection()
+        # Readers (history queries) don't block the writer, nor it them
+        db.execute('PRAGMA journal_mode=WAL')
+        with db:
+            for series, fields in SERIES.items():
+                columns = ''.join(f", {field} REAL NOT NULL" for field in fields)
+                if series in WITH_FEATURES:
+                    columns += ", features BLOB"
+                rollup = ''.join(f", {field}_sum REAL, {field}_min REAL, {field}_max REAL" for field in fields)
+                db.execute(f"CREATE TABLE IF NOT EXISTS {series} (ts REAL NOT NULL{columns})")
+                db.execute(f"CREATE INDEX IF NOT EXISTS {series}_ts ON {series} (ts)")
+                db.execute(f"CREATE TABLE IF NOT EXISTS {series}_rollup (resolution INTEGER NOT NULL, "
+                           f"bucket INTEGER NOT NULL, n INTEGER NOT NULL{rollup}, "
+                           f"PRIMARY KEY (resolution, bucket)) WITHOUT ROWID")
+            db.execute("CREATE TABLE IF NOT EXISTS calendar_events (id TEXT PRIMARY KEY, start REAL NOT NULL, "
+                       "end REAL NOT NULL, all_day INTEGER NOT NULL, seen REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS calendar_events_start ON calendar_events (start)")
+
+    def bucket(self, ts, resolution):
+        """Start of the hour or local day ts falls in."""
+        offset = self.day_offset if resolution == DAY else 0
+        return int((ts + offset) // resolution) * resolution - offset
+
+    def _bucket_sql(self, column, resolution):
+        offset = self.day_offset if resolution == DAY else 0
+        return f"(CAST(({column} + {offset}) / {resolution} AS INTEGER) * {resolution} - {offset})"
+
+    @staticmethod
+    def _columns(fields):
+        return ', '.join(f"{field}_sum, {field}_min, {field}_max" for field in fields)
+
+    @staticmethod
+    def _aggregate_raw(fields):
+        return ', '.join(f"SUM({field}), MIN({field}), MAX({field})" for field in fields)
+
+    @staticmethod
+    def _aggregate_rollup(fields):
+        return ', '.join(f"SUM({field}_sum), MIN({field}_min), MAX({field}_max)" for field in fields)
+
+    def _fold_sql(self, series, resolution, source):
+        """INSERT ... SELECT adding source rows before :cutoff into resolution buckets."""
+        fields = SERIES[series]
+        merge = ', '.join(f"{field}_sum = {field}_sum + excluded.{field}_sum, "
+                          f"{field}_min = min({field}_min, excluded.{field}_min), "
+                          f"{field}_max = max({field}_max, excluded.{field}_max)" for field in fields)
+        if source == RAW:
+            select = (f"SELECT {resolution}, {self._bucket_sql('ts', resolution)}, COUNT(*), "
+                      f"{self._aggregate_raw(fields)} FROM {series} WHERE ts < :cutoff GROUP BY 2")
+        else:
+            select = (f"SELECT {resolution}, {self._bucket_sql('bucket', resolution)}, SUM(n), "
+                      f"{self._aggregate_rollup(fields)} FROM {series}_rollup "
+                      f"WHERE resolution = {source} AND bucket < :cutoff GROUP BY 2")
+        return (f"INSERT INTO {series}_rollup (resolution, bucket, n, {self._columns(fields)}) {select} "
+                f"ON CONFLICT (resolution, bucket) DO UPDATE SET n = n + excluded.n, {merge}")
+
+    # Writing
+
+    def subscribe(self, observer):
+        """
+        Call observer(db, rows) with each batch written, inside its transaction: rows maps a
+        series to its new rows, in table column order. For aggregates kept up to date as
+        samples arrive (history/analytics.py). An observer that raises has its changes rolled
+        back and is logged; the samples are written regardless.
+        """
+        self._observers.append(observer)
+
+    def record(self, series, ts=None, features=None, **fields):
+        """
+        Queue one sample of series with SERIES[series] as keyword arguments, at ts (epoch
+        seconds, default now). Returns False if a field is missing or not a number, or the
+        queue is full; the sample is then not recorded.
+        """
+        try:
+            row = (time.time() if ts is None else float(ts),) + tuple(float(fields[name]) for name in SERIES[series])
+        except (KeyError, TypeError, ValueError):
+            log.debug("Not recording %s sample %r", series, fields)
+            return False
+        if series in WITH_FEATURES:
+            row += (wire.encode_features(features) if features is not None else None,)
+        return self._put(series, row)
+
+    def record_events(self, events, seen=None):
+        """Queue calendar events (as GC/client.py formats them: id, start, end, is_all_day)."""
+        seen = time.time() if seen is None else seen
+        rows = []
+        for event in events or ():
+            try:
+                rows.append((event['id'], timestamp(event['start']), timestamp(event['end']),
+                             int(bool(event.get('is_all_day'))), seen))
+            except (KeyError, TypeError, HistoryError):
+                log.debug("Not recording calendar event %r", event)
+        return bool(rows) and self._put('calendar_events', rows)
+
+    def _put(self, series, row):
+        self._start()
+        try:
+            self._queue.put_nowait((series, row))
+        except queue.Full:
+            dropped.inc(series)
+            return False
+        return True
+
+    def flush(self, timeout=10):
+        """Wait until everything queued so far is written."""
+        self._start()
+        done = threading.Event()
+        self._queue.put(('flush', done), timeout=timeout)
+        return done.wait(timeout)
+
+    def _start(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        next_compaction = time.monotonic() + self.compact_interval if self.compact_interval > 0 else float('inf')
+        while True:
+            try:
+                batch = [self._queue.get(timeout=min(60.0, max(0.0, next_compaction - time.monotonic())))]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+                if time.monotonic() >= next_compaction:
+                    self.compact()
+                    next_compaction = time.monotonic() + self.compact_interval
+            except Exception as e:
+                log.error("History write failed, %s samples lost: %s", len(batch), e)
+
+    def _write(self, batch):
+        rows = defaultdict(list)
+        waiting = []
+        for series, row in batch:
+            if series == 'flush':
+                waiting.append(row)
+            elif series == 'calendar_events':
+                rows[series].extend(row)
+            else:
+                rows[series].append(row)
+        try:
+            if rows:
+                db = self._connection()
+                with db:
+                    for series, values in rows.items():
+                        if series == 'calendar_events':
+                            db.executemany("INSERT OR REPLACE INTO calendar_events VALUES (?, ?, ?, ?, ?)", values)
+                        else:
+                            db.executemany(f"INSERT INTO {series} VALUES ({', '.join('?' * len(values[0]))})",
+                                           values)
+                    for observer in self._observers:
+                        # Each in its own savepoint: an observer that fails loses only its own
+                        # changes, never the samples
+                        db.execute("SAVEPOINT observer")
+                        try:
+                            observer(db, rows)
+                        except Exception as e:
+                            db.execute("ROLLBACK TO observer")
+                            log.exception("History observer %s failed, samples kept: %s",
+                                          getattr(observer, '__qualname__', observer), e)
+                        db.execute("RELEASE observer")
+                for series, values in rows.items():
+                    recorded.inc(series, amount=len(values))
+        finally:
+            for done in waiting:
+                done.set()
+
+    def compact(self, now=None):
+        """Fold every tier's data past its retention into the next tier. Returns {series: raw rows folded}."""
+        now = time.time() if now is None else now
+        raw_cutoff = self.bucket(now - self.retention[RAW], HOUR)
+        hour_cutoff = self.bucket(now - self.retention[HOUR], DAY)
+        folded = {}
+        start = time.monotonic()
+        db = self._connection()
+        with db:
+            for series in SERIES:
+                db.execute(self._fold_sql(series, HOUR, RAW), {"cutoff": raw_cutoff})
+                folded[series] = db.execute(f"DELETE FROM {series} WHERE ts < ?", (raw_cutoff,)).rowcount
+                db.execute(self._fold_sql(series, DAY, HOUR), {"cutoff": hour_cutoff})
+                db.execute(f"DELETE FROM {series}_rollup WHERE resolution = ? AND bucket < ?", (HOUR, hour_cutoff))
+                if self.retention[DAY]:
+                    db.execute(f"DELETE FROM {series}_rollup WHERE resolution = ? AND bucket < ?",
+                               (DAY, now - self.retention[DAY]))
+            db.execute("DELETE FROM calendar_events WHERE end < ?", (raw_cutoff,))
+        log.info("History compacted", extra={"fields": {"folded": sum(folded.values()),
+                                                         "ms": round((time.monotonic() - start) * 1000, 1)}})
+        return folded
+
+    # Reading
+
+    def auto_resolution(self, start, end, now=None):
+        """The finest resolution that still has data at start and returns a few thousand points at most."""
+        now = time.time() if now is None else now
+        span = end - start
+        if span <= 2 * DAY and start >= now - self.retention[RAW]:
+            return 'raw'
+        if span <= 62 * DAY and start >= self.bucket(now - self.retention[HOUR], DAY):
+            return 'hour'
+        return 'day'
+
+    def query(self, series, start=None, end=None, resolution='auto'):
+        """
+        series between start and end (epoch seconds, default the last day). Raw resolution
+        returns the samples, hour and day one point per bucket: n, and mean, min and max of
+        each field as <field>, <field>_min, <field>_max.
+        """
+        if series not in SERIES:
+            raise HistoryError(f"Unknown series {series!r}; one of {', '.join(SERIES)}")
+        end = time.time() if end is None else end
+        start = end - DAY if start is None else start
+        if resolution == 'auto':
+            resolution = self.auto_resolution(start, end)
+        if resolution not in RESOLUTIONS:
+            raise HistoryError(f"Unknown resolution {resolution!r}; one of auto, {', '.join(RESOLUTIONS)}")
+
+        fields = SERIES[series]
+        db = self._connection()
+        step = RESOLUTIONS[resolution]
+        if step == RAW:
+            rows = db.execute(f"SELECT ts, {', '.join(fields)} FROM {series} WHERE ts >= ? AND ts < ? ORDER BY ts",
+                              (start, end))
+            return [dict(zip(('ts',) + fields, row)) for row in rows]
+
+        first = self.bucket(start, step)
+        parts = [f"SELECT bucket, n, {self._columns(fields)} FROM {series}_rollup "
+                 f"WHERE resolution = {step} AND bucket >= :first AND bucket < :end"]
+        if step == DAY:
+            parts.append(f"SELECT {self._bucket_sql('bucket', DAY)}, SUM(n), {self._aggregate_rollup(fields)} "
+                         f"FROM {series}_rollup WHERE resolution = {HOUR} AND bucket >= :first AND bucket < :end "
+                         f"GROUP BY 1")
+        parts.append(f"SELECT {self._bucket_sql('ts', step)}, COUNT(*), {self._aggregate_raw(fields)} "
+                     f"FROM {series} WHERE ts >= :first AND ts < :end GROUP BY 1")
+        # Buckets still split between tiers are summed here
+        rows = db.execute(f"SELECT bucket, SUM(n), {self._aggregate_rollup(fields)} "
+                          f"FROM ({' UNION ALL '.join(parts)}) GROUP BY bucket ORDER BY bucket",
+                          {"first": first, "end": end})
+        points = []
+        for bucket, n, *values in rows:
+            point = {"ts": bucket, "n": n}
+            for i, field in enumerate(fields):
+                total, low, high = values[3 * i:3 * i + 3]
+                point[field] = total / n
+                point[f"{field}_min"] = low
+                point[f"{field}_max"] = high
+            points.append(point)
+        return points
+
+    def events(self, start, end):
+        """Calendar events overlapping [start, end), by start."""
+        rows = self._connection().execute(
+            "SELECT id, start, end, all_day FROM calendar_events WHERE start < ? AND end > ? ORDER BY start",
+            (end, start))
+        return [{"id": id_, "start": s, "end": e, "all_day": bool(all_day)} for id_, s, e, all_day in rows]
+
+    def status(self):
+        db = self._connection()
+        series = {}
+        for name in SERIES:
+            count, oldest, newest = db.execute(f"SELECT COUNT(*), MIN(ts), MAX(ts) FROM {name}").fetchone()
+            rollups = dict(db.execute(f"SELECT resolution, COUNT(*) FROM {name}_rollup GROUP BY resolution"))
+            series[name] = {"raw": count, "oldest": oldest, "newest": newest,
+                            "hour": rollups.get(HOUR, 0), "day": rollups.get(DAY, 0)}
+        size = sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path))
+        return {
+            "path": self.path,
+            "bytes": size,
+            "queued": self._queue.qsize(),
+            "retention_days": {name: self.retention[step] / DAY for name, step in RESOLUTIONS.items()},
+            "series": series,
+            "calendar_events": db.execute("SELECT COUNT(*) FROM calendar_events").fetchone()[0]
+        }
+
+
+def from_config():
+    """The gateway's store, or None when HISTORY_DB is empty."""
+    if not config.HISTORY_DB:
+        return None
+    return HistoryStore(config.HISTORY_DB, raw_days=config.HISTORY_RAW_DAYS, hourly_days=config.HISTORY_HOURLY_DAYS,
+                        daily_days=config.HISTORY_DAILY_DAYS, compact_interval=config.HISTORY_COMPACT_INTERVAL,
+                        queue_size=config.HISTORY_QUEUE_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=config.HISTORY_DB, help='History database (HISTORY_DB)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='Rows per series and tier')
+    commands.add_parser('compact', help='Downsample everything past its retention now')
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error('set HISTORY_DB or pass --db')
+    config.HISTORY_DB = args.db
+    store = from_config()
+    if args.command == 'compact':
+        print(json.dumps(store.compact(), indent=2))
+    else:
+        print(json.dumps(store.status(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# Access check for /admin endpoints and admin-only request headers, and which origins may call the API
+import hmac
+from functools import wraps
+
+from flask import jsonify, request
+from flask_cors import CORS
+
+import config
+
+LOOPBACK = ('127.0.0.1', '::1')
+
+# Everything but /admin/...: admin responses are never readable cross-origin
+CORS_PATHS = r'^/(?!admin/).*'
+
+
+def is_admin():
+    """
+    True if the current request may use admin features. Without ADMIN_TOKEN, only requests from
+    this machine without an Origin header may: a browser adds one to every cross-origin POST and
+    fetch, so a web page (or the extension) can't trigger admin actions through the user's browser.
+    """
+    if not config.ADMIN_TOKEN:
+        return request.remote_addr in LOOPBACK and 'Origin' not in request.headers
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), config.ADMIN_TOKEN)
+
+
+def admin_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not is_admin():
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def init_cors(app):
+    """Let CORS_ORIGINS (the Chrome extension by default) read the API, except /admin."""
+    CORS(app, resources={CORS_PATHS: {"origins": config.CORS_ORIGINS}})
@@ -0,0 +1,162 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Blueprint, Response, jsonify, request
+
+from observability import log, memory, metrics
+from observability.admin import admin_required
+from observability.profiling import profiler
+from trackers import tracker
+
+bp = Blueprint('observability', __name__)
+
+
+def _tracker_totals():
+    with tracker.lock:
+        return dict(tracker.event_totals)
+
+
+def _tracker_rates():
+    stats = tracker.get_stats()
+    return {
+        "key_press": stats["keystrokes_per_minute"],
+        "mouse_move": stats["mouse_moves_per_minute"],
+        "mouse_click": stats["mouse_clicks_per_minute"]
+    }
+
+
+# Read from the tracker at scrape time, so the input hooks pay nothing extra
+metrics.counter('tracker_events_total', 'Keyboard and mouse events seen by the activity tracker.', ('kind',),
+                function=_tracker_totals)
+metrics.gauge('tracker_events_per_minute', "Events in the tracker's sliding window.", ('kind',),
+              function=_tracker_rates)
+metrics.gauge('tracker_running', '1 while the activity tracker is listening for input.',
+              function=lambda: {(): int(tracker.running)})
+metrics.gauge('process_resident_memory_bytes', 'Resident set size.', function=lambda: {(): memory.rss_bytes() or 0})
+# From the periodic memory sample, so scrapes never walk object graphs
+metrics.gauge('memory_subsystem_bytes', 'Approximate bytes held per subsystem at the last memory sample.',
+              ('subsystem',),
+              function=lambda: {name: size for name, size in ((memory.latest() or {}).get('subsystems') or {}).items()
+                                if size is not None})
+metrics.counter('log_records_dropped_total', 'Log records dropped because the logging queue was full.',
+                function=lambda: {(): log.dropped()})
+
+
+def _tracker_buffers():
+    # Sized arithmetically: walking ~100k timestamps on every sample would cost more than it tells
+    with tracker.lock:
+        buffers = (tracker.keystroke_times, tracker.mouse_move_times, tracker.mouse_click_times)
+        items = sum(len(buffer) for buffer in buffers)
+        size = sum(sys.getsizeof(buffer) for buffer in buffers)
+    return {"bytes": size + items * sys.getsizeof(0.0), "items": items}
+
+
+memory.register('tracker.buffers', _tracker_buffers)
+memory.register('observability.profiler', lambda: profiler.sampler._stacks)
+memory.register('observability.metrics', lambda: [metric._values for metric in metrics.REGISTRY._metrics.values()])
+
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of every metric in the process"""
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@bp.route('/admin/profiling', methods=['GET'])
+@admin_required
+def get_profiling():
+    """Profiler settings and what has been collected so far"""
+    return jsonify(profiler.status())
+
+
+@bp.route('/admin/profiling', methods=['POST'])
+@admin_required
+def set_profiling():
+    """
+    Expects JSON with any of sample_rate (0-1, share of requests to sample),
+    duration (seconds, then sampling switches off) and include_threads (bool).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        profiler.configure(sample_rate=data.get('sample_rate'), duration=data.get('duration'),
+                           include_threads=data.get('include_threads'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid profiling settings: {e}"}), 400
+    return jsonify(profiler.status())
+
+
+@bp.route('/admin/profiling', methods=['DELETE'])
+@admin_required
+def reset_profiling():
+    """Drop collected stacks and cProfile stats"""
+    profiler.reset()
+    return jsonify(profiler.status())
+
+
+@bp.route('/admin/profiling/stacks', methods=['GET'])
+@admin_required
+def get_profile_stacks():
+    """Collapsed stacks for ?route=, or for every route with the route as the root frame"""
+    return Response(profiler.sampler.collapsed(request.args.get('route')), content_type='text/plain; charset=utf-8')
+
+
+@bp.route('/admin/profiling/cprofile', methods=['GET'])
+@admin_required
+def get_cprofile():
+    """Merged cProfile stats for ?route=, sorted by ?sort= (default cumulative), top ?limit= rows"""
+    route = request.args.get('route')
+    try:
+        report = profiler.cprofile_report(route, request.args.get('sort', 'cumulative'),
+                                          int(request.args.get('limit', 40)))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid sort or limit: {e}"}), 400
+    if report is None:
+        return jsonify({"error": f"No cProfile data for route {route!r}"}), 404
+    return Response(report, content_type='text/plain; charset=utf-8')
+
+
+@bp.route('/admin/memory', methods=['GET'])
+@admin_required
+def get_memory():
+    """
+    RSS, bytes per subsystem, gc counts and, with tracemalloc on, the top ?limit= allocation
+    sites (?diff=1 compares against the baseline)
+    """
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    diff = request.args.get('diff', '').lower() in ('1', 'true', 'yes')
+    return jsonify(memory.report(limit=limit, diff=diff))
+
+
+@bp.route('/admin/memory/history', methods=['GET'])
+@admin_required
+def get_memory_history():
+    """Periodic samples and growth per hour since the oldest one kept"""
+    return jsonify(memory.history())
+
+
+@bp.route('/admin/memory/tracemalloc', methods=['POST'])
+@admin_required
+def set_tracemalloc():
+    """Expects JSON with enable (bool) and optionally frames (traceback depth)"""
+    data = request.get_json(silent=True) or {}
+    if data.get('enable'):
+        try:
+            memory.start_tracemalloc(int(data['frames']) if data.get('frames') else None)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid frames: {e}"}), 400
+    else:
+        memory.stop_tracemalloc()
+    return jsonify(memory.report(limit=0)["tracemalloc"])
+
+
+@bp.route('/admin/memory/baseline', methods=['POST'])
+@admin_required
+def take_memory_baseline():
+    """Snapshot allocations now, for GET /admin/memory?diff=1"""
+    if not memory.take_baseline():
+        return jsonify({"error": "tracemalloc is not running"}), 409
+    return jsonify({"success": True})
@@ -0,0 +1,162 @@
+# Structured logging: callers enqueue records, one background thread formats and writes them
+"""
+Every module logs through get_logger(name), a child of the 'procrasticycle' logger. A record
+costs the caller a level check, a getMessage() and a non-blocking queue put; formatting and the
+write to stdout/LOG_FILE happen on a QueueListener thread. If the queue is full the record is
+dropped and counted (procrasticycle_log_records_dropped_total) instead of stalling the caller.
+
+Settings (config.py): LOG_LEVEL, LOG_FORMAT (text or json), LOG_FILE, LOG_QUEUE_SIZE.
+
+Structured fields go in extra={"fields": {...}}; they become JSON keys or key=value pairs.
+Guard anything expensive to build with log.isEnabledFor(logging.DEBUG), and pass sample_every
+to get_logger for per-event logs such as keystrokes.
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+import config
+
+ROOT = 'procrasticycle'
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if getattr(record, 'sampled_every', None):
+            entry["sampled_every"] = record.sampled_every
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the calling thread: a full queue drops the record."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only what can't wait: bind the message and render any traceback while it still exists.
+        # Formatting proper happens on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampleFilter(logging.Filter):
+    """Passes one record in every `every`, for events too frequent to log one by one."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._count = itertools.count()
+
+    def filter(self, record):
+        if next(self._count) % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+
+def configure():
+    """Install the queue handler and start the listener thread, once per process."""
+    global _handler, _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        if config.LOG_FILE:
+            output = logging.FileHandler(config.LOG_FILE, encoding='utf-8')
+        else:
+            output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JSONFormatter() if config.LOG_FORMAT == 'json' else TextFormatter())
+
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+        root = logging.getLogger(ROOT)
+        root.setLevel(config.LOG_LEVEL)
+        root.addHandler(_handler)
+        # Our records go to our handler only, not to whatever the root logger has
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+
+
+def shutdown():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            logging.getLogger(ROOT).removeHandler(_handler)
+
+
+def _after_fork():
+    """The listener thread doesn't survive fork(): a child that inherited logging gets its own."""
+    global _lock, _handler, _listener
+    _lock = threading.Lock()
+    if _listener is not None:
+        logging.getLogger(ROOT).removeHandler(_handler)
+        _handler = _listener = None
+        configure()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def dropped():
+    """Records dropped because the queue was full."""
+    return _handler.dropped if _handler is not None else 0
+
+
+def get_logger(name, sample_every=None):
+    """A 'procrasticycle.<name>' logger. With sample_every=N, only one record in N gets through."""
+    configure()
+    logger = logging.getLogger(f"{ROOT}.{name}")
+    if sample_every and sample_every > 1 and not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter(sample_every))
+    return logger
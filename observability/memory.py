@@ -0,0 +1,242 @@
+# Memory accounting per subsystem, tracemalloc allocation sites and a periodic growth sampler
+"""
+Modules register what they hold with register(name, function). function() returns either
+the objects to measure (sized with deep_size) or a ready-made {"bytes": ..., "items": ...}
+for things too big to walk on every sample, such as the tracker's deques.
+
+tracemalloc is off by default: it slows allocation-heavy code and uses memory of its own.
+Turn it on at start with MEMORY_TRACEMALLOC_FRAMES=N, or at runtime through
+POST /admin/memory/tracemalloc. While on, reports include the top allocation sites, and
+a baseline snapshot can be taken to diff against later. Report cost grows with the number of
+live traced allocations, so start tracing at runtime, after imports, rather than at boot when you can.
+
+With MEMORY_SAMPLE_INTERVAL > 0, a background thread samples RSS, per-subsystem sizes and
+tracemalloc totals into a ring buffer, so growth over a multi-day session is visible.
+"""
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import config
+
+# Stop walking an object graph after this many objects and report the size as a lower bound
+DEEP_SIZE_LIMIT = 200000
+
+_lock = threading.Lock()
+_subsystems = {}
+_history = deque(maxlen=config.MEMORY_HISTORY)
+_baseline = None
+_sampler = None
+
+
+def register(name, function):
+    """Account function()'s result under name. Later registrations replace earlier ones."""
+    with _lock:
+        _subsystems[name] = function
+
+
+def deep_size(obj, limit=DEEP_SIZE_LIMIT):
+    """
+    Bytes reachable from obj: containers, instance __dict__/__slots__ and numpy buffers.
+    Shared objects are counted once. Returns (bytes, objects_seen, truncated).
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        if len(seen) >= limit:
+            return total, len(seen), True
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, type(sys), type(deep_size))):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+
+        nbytes = getattr(current, 'nbytes', None)
+        if isinstance(nbytes, int) and hasattr(current, 'base'):
+            # numpy arrays: count the buffer once, on the array that owns it
+            if current.base is None:
+                total += nbytes
+            continue
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif not isinstance(current, (str, bytes, bytearray, int, float, bool)):
+            if hasattr(current, '__dict__'):
+                stack.append(vars(current))
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total, len(seen), False
+
+
+def measure(name, function):
+    try:
+        result = function()
+    except Exception as e:
+        return {"error": str(e)}
+    if isinstance(result, dict) and 'bytes' in result:
+        return result
+    size, objects, truncated = deep_size(result)
+    entry = {"bytes": size, "objects": objects}
+    if truncated:
+        entry["truncated"] = True
+    return entry
+
+
+def subsystem_sizes():
+    with _lock:
+        subsystems = dict(_subsystems)
+    return {name: measure(name, function) for name, function in sorted(subsystems.items())}
+
+
+def rss_bytes():
+    """Resident set size (Linux /proc, falling back to psutil), or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss
+        except ImportError:
+            return None
+
+
+def start_tracemalloc(frames=None):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames or config.MEMORY_TRACEMALLOC_FRAMES or 1)
+
+
+def stop_tracemalloc():
+    global _baseline
+    _baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _snapshot():
+    # No filter_traces(): it walks every trace in Python and costs more than the snapshot itself
+    return tracemalloc.take_snapshot()
+
+
+def take_baseline():
+    """Snapshot to diff later reports against. Returns False if tracemalloc is off."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        return False
+    _baseline = _snapshot()
+    return True
+
+
+def top_allocations(limit=20, key_type='lineno', diff=False):
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = _snapshot()
+    if diff and _baseline is not None:
+        stats = snapshot.compare_to(_baseline, key_type)
+        return [{
+            "site": str(stat.traceback),
+            "bytes": stat.size,
+            "bytes_diff": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff
+        } for stat in stats[:limit]]
+    return [{
+        "site": str(stat.traceback),
+        "bytes": stat.size,
+        "count": stat.count
+    } for stat in snapshot.statistics(key_type)[:limit]]
+
+
+def report(limit=20, diff=False):
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        "timestamp": time.time(),
+        "rss_bytes": rss_bytes(),
+        "subsystems": subsystem_sizes(),
+        "gc": {"counts": gc.get_count(), "objects": len(gc.get_objects())},
+        "tracemalloc": {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "has_baseline": _baseline is not None,
+            "top": top_allocations(limit, diff=diff)
+        }
+    }
+
+
+def sample():
+    """One entry for the history ring buffer: RSS, tracemalloc totals and bytes per subsystem."""
+    entry = {
+        "timestamp": time.time(),
+        "rss_bytes": rss_bytes(),
+        "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        "subsystems": {name: size.get("bytes") for name, size in subsystem_sizes().items()}
+    }
+    with _lock:
+        _history.append(entry)
+    return entry
+
+
+def history():
+    with _lock:
+        entries = list(_history)
+    return {"interval_seconds": config.MEMORY_SAMPLE_INTERVAL, "samples": entries, "growth": growth(entries)}
+
+
+def growth(entries):
+    """Bytes gained per hour by RSS and each subsystem between the first and last samples."""
+    if len(entries) < 2:
+        return None
+    first, last = entries[0], entries[-1]
+    hours = (last["timestamp"] - first["timestamp"]) / 3600
+    if hours <= 0:
+        return None
+
+    def rate(before, after):
+        return round((after - before) / hours) if before is not None and after is not None else None
+
+    return {
+        "hours": round(hours, 3),
+        "rss_bytes_per_hour": rate(first["rss_bytes"], last["rss_bytes"]),
+        "subsystems_bytes_per_hour": {
+            name: rate(first["subsystems"].get(name), size) for name, size in last["subsystems"].items()
+        }
+    }
+
+
+def latest():
+    with _lock:
+        return _history[-1] if _history else None
+
+
+def _run_sampler(interval):
+    while True:
+        try:
+            sample()
+        except Exception as e:
+            from observability.log import get_logger
+            get_logger('memory').error("Memory sample failed: %s", e)
+        time.sleep(interval)
+
+
+def init_app(app):
+    """Start tracemalloc and the periodic sampler if configured. Safe to call more than once."""
+    global _sampler
+    if config.MEMORY_TRACEMALLOC_FRAMES:
+        start_tracemalloc()
+    with _lock:
+        if _sampler is None and config.MEMORY_SAMPLE_INTERVAL > 0:
+            _sampler = threading.Thread(target=_run_sampler, args=(config.MEMORY_SAMPLE_INTERVAL,),
+                                        name='memory-sampler', daemon=True)
+            _sampler.start()
+    return app
@@ -0,0 +1,248 @@
+# In-process metrics with a Prometheus text exposition (GET /metrics)
+"""
+Counters, gauges and histograms kept in plain dicts keyed by label values. Recording is a
+dict lookup, a bisect and an increment under a per-metric lock; formatting only happens
+when /metrics is scraped.
+
+What gets recorded:
+
+  procrasticycle_http_request_duration_seconds   every Flask request, per route template (init_app)
+  procrasticycle_upstream_request_duration_seconds / _requests_total
+                                                  every Spotify, Calendar, Gemini and ML call (upstreams)
+  procrasticycle_cache_requests_total            hits and misses per named cache (cache_hit/cache_miss)
+  procrasticycle_tracker_*                       activity tracker totals and rates, read at scrape time
+"""
+import bisect
+import logging
+import threading
+import time
+
+# Seconds. Upstream calls range from sub-millisecond fakes to multi-second Gemini prompts
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = 'procrasticycle_'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base for counters and gauges. Values are either recorded as they happen or, with function,
+    read at scrape time: function() returns {labels: value}, which keeps hot paths untouched.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def refresh(self):
+        try:
+            values = self.function()
+        except Exception as e:
+            logging.getLogger('procrasticycle.metrics').error("Metric %s failed: %s", self.name, e)
+            values = {}
+        with self._lock:
+            self._values = {labels if isinstance(labels, tuple) else (labels,): value
+                            for labels, value in values.items()}
+
+    def collect(self):
+        if self.function is not None:
+            self.refresh()
+        with self._lock:
+            values = dict(self._values)
+        lines = self.header()
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        with self._lock:
+            values = {labels: list(series) for labels, series in self._values.items()}
+        lines = self.header()
+        bounds = self.buckets + (float('inf'),)
+        for labels, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_text} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=(), function=None):
+    return REGISTRY.register(Counter(name, documentation, labelnames, function))
+
+
+def gauge(name, documentation, labelnames=(), function=None):
+    return REGISTRY.register(Gauge(name, documentation, labelnames, function))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+request_duration = histogram('http_request_duration_seconds', 'Flask request latency by route template.',
+                             ('route', 'method', 'status'))
+upstream_duration = histogram('upstream_request_duration_seconds', 'Upstream call latency.',
+                              ('upstream', 'operation'))
+upstream_requests = counter('upstream_requests_total', 'Upstream calls by outcome (ok or error).',
+                            ('upstream', 'operation', 'outcome'))
+cache_requests = counter('cache_requests_total', 'Cache lookups by result (hit or miss).', ('cache', 'result'))
+
+
+def _cache_hit_ratios():
+    with cache_requests._lock:
+        counts = dict(cache_requests._values)
+    ratios = {}
+    for cache in {cache for cache, _ in counts}:
+        hits = counts.get((cache, 'hit'), 0)
+        ratios[(cache,)] = hits / (hits + counts.get((cache, 'miss'), 0))
+    return ratios
+
+
+cache_hit_ratio = gauge('cache_hit_ratio', 'Share of cache lookups that hit, since start.', ('cache',),
+                        function=_cache_hit_ratios)
+
+
+def cache_hit(cache):
+    cache_requests.inc(cache, 'hit')
+
+
+def cache_miss(cache):
+    cache_requests.inc(cache, 'miss')
+
+
+def record_upstream(upstream, operation, seconds, ok):
+    upstream_duration.observe(upstream, operation, value=seconds)
+    upstream_requests.inc(upstream, operation, 'ok' if ok else 'error')
+
+
+class upstream_call:
+    """
+    Times one upstream call and records it as an error if it raises:
+
+        with metrics.upstream_call('calendar', 'events.list'):
+            ...
+
+    Set call.ok = False inside the block to count a call that returned an error response.
+    """
+
+    __slots__ = ('upstream', 'operation', 'start', 'ok')
+
+    def __init__(self, upstream, operation):
+        self.upstream = upstream
+        self.operation = operation
+        self.ok = True
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_upstream(self.upstream, self.operation, time.perf_counter() - self.start,
+                        self.ok and exc_type is None)
+        return False
+
+
+def init_app(app):
+    """Record the latency of every request the app serves, labelled by route template rather than URL."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            request_duration.observe(route, request.method, str(response.status_code),
+                                     value=time.perf_counter() - start)
+        return response
+
+    return app
@@ -0,0 +1,242 @@
+# On-demand request profiling: a stack sampler and per-request cProfile, aggregated per route
+"""
+A request is profiled when it carries an X-Profile header (admin only, see observability.admin),
+or when random sampling is switched on through POST /admin/profiling:
+
+  X-Profile: sample    a background thread reads the request thread's stack every
+                       PROFILE_SAMPLE_INTERVAL_MS via sys._current_frames(). Stacks are kept
+                       per route in collapsed format (flamegraph.pl, speedscope, inferno).
+  X-Profile: cprofile  deterministic cProfile of the request, merged into per-route pstats.
+                       Only one request is cProfiled at a time (Python 3.12+ allows one
+                       profiler per process); others are served unprofiled.
+
+With include_threads, the sampler also records every other thread (pynput listeners, fan-out
+workers, the log writer) while a profiled request runs, under "thread:<name>", to show what
+competes for the GIL.
+
+When nothing is being profiled, the cost per request is one header lookup and one comparison;
+the sampler thread sleeps on an Event.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import config
+
+MAX_DEPTH = 128
+MODES = ('sample', 'cprofile')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Root-first 'a;b;c' stack for a frame, as flame graph tools expect."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads while at least one is registered."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.include_threads = False
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._active = {}
+        self._stacks = defaultdict(Counter)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def begin(self, route):
+        with self._lock:
+            self._active[threading.get_ident()] = route
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def end(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                active = dict(self._active)
+            self._sample(active, own)
+            time.sleep(self.interval)
+
+    def _sample(self, active, own):
+        frames = sys._current_frames()
+        names = {thread.ident: thread.name for thread in threading.enumerate()} if self.include_threads else {}
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            if ident in active:
+                stacks.append((active[ident], collapse(frame)))
+            elif self.include_threads:
+                stacks.append((f"thread:{names.get(ident, ident)}", collapse(frame)))
+        del frames
+        with self._lock:
+            self.samples += 1
+            for route, stack in stacks:
+                self._stacks[route][stack] += 1
+
+    def routes(self):
+        with self._lock:
+            return {route: sum(stacks.values()) for route, stacks in self._stacks.items()}
+
+    def collapsed(self, route=None):
+        """Collapsed stacks, one 'frames count' line each. Without route, every route becomes the root frame."""
+        with self._lock:
+            selected = {r: dict(s) for r, s in self._stacks.items() if route is None or r == route}
+        lines = []
+        for name, stacks in sorted(selected.items()):
+            for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                lines.append(f"{stack} {count}" if route else f"{name};{stack} {count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+
+class RequestProfiler:
+    def __init__(self, sample_interval):
+        self.sampler = StackSampler(sample_interval)
+        self.sample_rate = 0.0
+        self.sample_until = 0.0
+        self._cprofile_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._profiled = Counter()
+
+    def configure(self, sample_rate=None, duration=None, include_threads=None):
+        """Randomly profile sample_rate of all requests for the next `duration` seconds."""
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+            self.sample_until = time.time() + float(duration) if duration else float('inf')
+        if include_threads is not None:
+            self.sampler.include_threads = bool(include_threads)
+
+    def choose_mode(self, header, admin):
+        if header:
+            return header if header in MODES and admin else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            if time.time() < self.sample_until:
+                return 'sample'
+            self.sample_rate = 0.0
+        return None
+
+    def begin(self, mode, route):
+        self._profiled[route] += 1
+        if mode == 'sample':
+            self.sampler.begin(route)
+            return 'sample', None
+        if not self._cprofile_lock.acquire(blocking=False):
+            return None, None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) already owns the hook
+            self._cprofile_lock.release()
+            return None, None
+        return 'cprofile', profile
+
+    def end(self, mode, profile, route):
+        if mode == 'sample':
+            self.sampler.end()
+            return
+        profile.disable()
+        self._cprofile_lock.release()
+        with self._stats_lock:
+            if route in self._stats:
+                self._stats[route].add(profile)
+            else:
+                self._stats[route] = pstats.Stats(profile)
+
+    def cprofile_report(self, route, sort='cumulative', limit=40):
+        with self._stats_lock:
+            stats = self._stats.get(route)
+            if stats is None:
+                return None
+            output = io.StringIO()
+            stats.stream = output
+            stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def status(self):
+        with self._stats_lock:
+            cprofiled = sorted(self._stats)
+        return {
+            "sample_rate": self.sample_rate,
+            "sample_until": self.sample_until if self.sample_rate and self.sample_until != float('inf') else None,
+            "include_threads": self.sampler.include_threads,
+            "sample_interval_ms": self.sampler.interval * 1000,
+            "samples": self.sampler.samples,
+            "sampled_routes": self.sampler.routes(),
+            "cprofiled_routes": cprofiled,
+            "profiled_requests": dict(self._profiled)
+        }
+
+    def reset(self):
+        self.sampler.reset()
+        with self._stats_lock:
+            self._stats.clear()
+        self._profiled.clear()
+
+
+profiler = RequestProfiler(config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+profiler.configure(sample_rate=config.PROFILE_SAMPLE_RATE)
+
+
+def init_app(app):
+    """Profile requests that ask for it (X-Profile) or are picked by random sampling."""
+    from flask import g, request
+
+    from observability.admin import is_admin
+
+    @app.before_request
+    def _start_profile():
+        header = request.headers.get('X-Profile')
+        if not header and not profiler.sample_rate:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if route.startswith('/admin/'):
+            return
+        mode = profiler.choose_mode(header, is_admin() if header else False)
+        if mode is None:
+            return
+        mode, profile = profiler.begin(mode, route)
+        if mode is not None:
+            g._profile = (mode, profile, route)
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        active = g.pop('_profile', None)
+        if active is not None:
+            profiler.end(*active)
+
+    return app
@@ -0,0 +1,115 @@
+# Bounded LRU of predictions keyed on quantized feature vectors
+"""
+Consecutive minutes often differ only in noise: a few keystrokes more, the same tab score,
+the same track, calendar minutes that move in steps of five. Each feature is snapped to a
+bucket of width QUANTA[feature] (0 keeps it exact), and the snapped vector is both the
+cache key and what the model scores on a miss. A prediction therefore depends only on
+the bucket, never on which request happened to fill the cache first.
+
+Buckets are centred on multiples of the width (round), except for the clock features in
+FLOOR, which start at one (floor): rounding would snap Minute 58 to 60 and Minutes_Into_Day
+1438 to 1440, values the clock never shows and the model never saw.
+
+The cache belongs to one model object: when the serving model is swapped (mtime reload,
+registry activation, online update) the first lookup against the new one empties it.
+
+Hits and misses are counted as cache "prediction" in /metrics, which also exports the
+hit ratio.
+"""
+import threading
+from collections import OrderedDict
+
+import config
+from observability import metrics
+from predict.features import FEATURE_COLUMNS
+
+# Bucket widths. Training data moves in 5-minute steps and Gemini scores have two decimals
+DEFAULT_QUANTA = {
+    'Hour': 0,
+    'Minute': 5,
+    'Day of week': 0,
+    'Keystrokes per min': 5,
+    'Mouse moves per min': 5,
+    'Mouse clicks per min': 2,
+    'Productivity of Active Chrome Tabs': 0.02,
+    'Total Minutes of Events Before': 5,
+    'Total Minutes of Events After': 5,
+    'Total Minutes to Next Event': 5,
+    'Spotify': 0,
+    'Danceability': 0.01,
+    'Tempo': 0.01,
+    'Energy': 0.01,
+    'Minutes_Into_Day': 5,
+}
+
+
+# Bounded clock features, bucketed downwards so the snapped value stays a real time
+FLOOR = ('Minute', 'Minutes_Into_Day')
+
+
+def parse_quanta(text):
+    """'Feature=width,...' (PREDICTION_CACHE_QUANTA) as a dict. Raises ValueError on unknown features."""
+    quanta = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, width = item.rpartition('=')
+        name = name.strip()
+        if name not in DEFAULT_QUANTA:
+            raise ValueError(f"Unknown feature {name!r} in PREDICTION_CACHE_QUANTA")
+        quanta[name] = float(width)
+    return quanta
+
+
+class PredictionCache:
+    def __init__(self, size, quanta=None, name='prediction'):
+        self.size = size
+        self.name = name
+        self.quanta = tuple(float({**DEFAULT_QUANTA, **(quanta or {})}[column]) for column in FEATURE_COLUMNS)
+        self.floor = tuple(column in FLOOR for column in FEATURE_COLUMNS)
+        self._entries = OrderedDict()
+        self._model = None
+        self._lock = threading.Lock()
+
+    def quantize(self, vector):
+        """(key, snapped vector): bucket indices, and the bucket values the model scores."""
+        key = tuple((int(value // width) if floor else round(value / width)) if width else value
+                    for value, width, floor in zip(vector, self.quanta, self.floor))
+        snapped = tuple(index * width if width else index for index, width in zip(key, self.quanta))
+        return key, snapped
+
+    def predict(self, model, vector, compute):
+        """compute(model, snapped_vector) for vector's bucket, from the cache when it has been seen."""
+        key, snapped = self.quantize(vector)
+        with self._lock:
+            if self._model is not model:
+                self._entries.clear()
+                self._model = model
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is not None:
+            metrics.cache_hit(self.name)
+            return value
+
+        metrics.cache_miss(self.name)
+        # Scored outside the lock: two threads missing on one bucket both compute the same answer
+        value = compute(model, snapped)
+        with self._lock:
+            if self._model is model:
+                self._entries[key] = value
+                if len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def from_config():
+    """The configured cache, or None when PREDICTION_CACHE_SIZE is 0."""
+    if config.PREDICTION_CACHE_SIZE <= 0:
+        return None
+    return PredictionCache(config.PREDICTION_CACHE_SIZE, parse_quanta(config.PREDICTION_CACHE_QUANTA))
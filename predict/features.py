@@ -0,0 +1,139 @@
+# The model's input schema, shared by the gateway, the prediction service and training
+"""
+FEATURE_COLUMNS is the order the model was trained on and the order of every feature
+vector on the wire (predict/wire.py). Changing it means retraining and bumping
+SCHEMA_VERSION, so old clients are rejected instead of silently misread.
+
+Requests are validated by from_mapping(): one C-level itemgetter pulls all 15 values
+out of the JSON object, then a single pass checks types and finiteness. The first
+problem raises FeatureError, before anything else is done with the request.
+
+Validated values become model input here and nowhere else, so training, the gateway and
+the prediction service clean them identically: float64 in FEATURE_COLUMNS order, with -1
+music features (how the collected data marks Spotify off) as 0, and Tempo on the training
+data's 0-1 scale. float64 because that is
+what the pipeline's StandardScaler was fitted and scales in; sklearn's trees take the
+scaled values as float32 themselves.
+
+Tempo is a fraction in the training data (0.5 to 0.8 for music that was playing), but
+Gemini estimates it in BPM (60 to 200, spotify/auth.py). Any Tempo above 1 is taken as
+BPM and divided by TEMPO_MAX_BPM, capped at 1, so 200 BPM is 0.8, the top of the
+training range.
+
+    transform(frame)       training data and batches, vectorised over every row
+    transform_one(vector)  one request, in numpy without pandas
+"""
+import math
+from operator import itemgetter
+
+import numpy as np
+
+SCHEMA_VERSION = 1
+
+FEATURE_COLUMNS = [
+    'Hour',
+    'Minute',
+    'Day of week',
+    'Keystrokes per min',
+    'Mouse moves per min',
+    'Mouse clicks per min',
+    'Productivity of Active Chrome Tabs',
+    'Total Minutes of Events Before',
+    'Total Minutes of Events After',
+    'Total Minutes to Next Event',
+    'Spotify',
+    'Danceability',
+    'Tempo',
+    'Energy',
+    'Minutes_Into_Day'
+]
+
+MUSIC_COLUMNS = ['Danceability', 'Tempo', 'Energy']
+# Music features of minutes without Spotify in the collected data; the model sees 0
+MISSING_MUSIC = -1
+_MUSIC = [FEATURE_COLUMNS.index(column) for column in MUSIC_COLUMNS]
+# BPM that Tempo 1.0 stands for
+TEMPO_MAX_BPM = 250
+_TEMPO = FEATURE_COLUMNS.index('Tempo')
+
+# JSON numbers arrive as int or float; the extension sends Spotify as true/false
+_NUMERIC = (int, float, bool)
+_values = itemgetter(*FEATURE_COLUMNS)
+
+
+class FeatureError(ValueError):
+    """A request whose features can't be scored. The message is safe to return to the client."""
+
+
+def from_mapping(data):
+    """Feature vector (tuple of floats in FEATURE_COLUMNS order) from a JSON object."""
+    if not isinstance(data, dict):
+        raise FeatureError("Expected a JSON object of features")
+    try:
+        values = _values(data)
+    except KeyError:
+        missing = [column for column in FEATURE_COLUMNS if column not in data]
+        raise FeatureError(f"Missing fields: {', '.join(missing)}") from None
+    for column, value in zip(FEATURE_COLUMNS, values):
+        if not isinstance(value, _NUMERIC) or not math.isfinite(value):
+            raise FeatureError(f"{column} must be a finite number, got {value!r}")
+    return tuple(map(float, values))
+
+
+def check(vector):
+    """Validate a decoded vector (from the binary format). Returns it as a tuple."""
+    if len(vector) != len(FEATURE_COLUMNS):
+        raise FeatureError(f"Expected {len(FEATURE_COLUMNS)} features, got {len(vector)}")
+    for column, value in zip(FEATURE_COLUMNS, vector):
+        if not math.isfinite(value):
+            raise FeatureError(f"{column} must be a finite number, got {value!r}")
+    return tuple(vector)
+
+
+def to_mapping(vector):
+    return dict(zip(FEATURE_COLUMNS, vector))
+
+
+def transform(rows):
+    """
+    Model input for a batch, as a C-ordered float64 array: from a DataFrame with
+    FEATURE_COLUMNS (other columns are ignored), or rows already in FEATURE_COLUMNS order.
+    """
+    if hasattr(rows, 'columns'):
+        rows = rows[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    X = np.array(rows, dtype=np.float64, order='C', ndmin=2)
+    music = X[:, _MUSIC]
+    X[:, _MUSIC] = np.where(music == MISSING_MUSIC, 0, music)
+    tempo = X[:, _TEMPO]
+    X[:, _TEMPO] = np.where(tempo > 1, np.minimum(tempo / TEMPO_MAX_BPM, 1), tempo)
+    return X
+
+
+def transform_one(vector):
+    """Model input for one vector: a (1, 15) float64 array, cleaned like transform()."""
+    row = np.array(vector, dtype=np.float64, ndmin=2)
+    values = row[0]
+    for i in _MUSIC:
+        if values[i] == MISSING_MUSIC:
+            values[i] = 0
+    if values[_TEMPO] > 1:
+        values[_TEMPO] = min(values[_TEMPO] / TEMPO_MAX_BPM, 1.0)
+    return row
+
+
+def check_model(model):
+    """
+    Ready a fitted sklearn model (a Pipeline or bare estimator) for transform()'s arrays, and
+    return it. A model fitted on a DataFrame keeps the column names and compares them on every
+    call, warning about arrays; they are checked against FEATURE_COLUMNS once here instead, and
+    dropped. Raises ValueError for a model trained on other columns.
+    """
+    steps = [step for _, step in model.steps] if hasattr(model, 'steps') else [model]
+    for step in steps:
+        names = getattr(step, 'feature_names_in_', None)
+        if names is None:
+            continue
+        if list(names) != FEATURE_COLUMNS:
+            raise ValueError(f"Model was trained on columns {list(names)}, not FEATURE_COLUMNS")
+        del step.feature_names_in_
+    return model
@@ -0,0 +1,134 @@
+# The forest as flat numpy arrays, memory-mapped so every worker process shares one copy
+"""
+An unpickled RandomForest is 100 Tree objects, each with its own malloc'd node array, in
+every process that loads it. FlatForest keeps the same model as five arrays over all trees
+(feature, threshold, left, right, leaf probability) plus the scaler's mean and scale. The
+arrays are stored as .npy files and opened with mmap_mode='r', so every process serving the
+model maps the same page-cache pages: N workers, one physical copy.
+
+predict_proba walks all trees at once, one numpy step per tree level, and matches
+sklearn's output to float rounding. It reads the same float32-cast, scaled inputs that
+sklearn's trees compare against their thresholds.
+
+The arrays for a model file are built on first use next to it, in
+<model>.flat-<mtime_ns>/, and rebuilt when the model file changes.
+"""
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'proba', 'roots', 'mean', 'scale')
+
+
+class FlatForest:
+    def __init__(self, arrays, n_features, max_depth, classes):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_features = n_features
+        self.max_depth = max_depth
+        self.classes_ = np.asarray(classes)
+
+    @classmethod
+    def from_model(cls, model):
+        """Flatten a fitted Pipeline(StandardScaler, RandomForestClassifier) or bare forest."""
+        steps = [step for _, step in model.steps] if hasattr(model, 'steps') else [model]
+        forest = steps[-1]
+        scaler = steps[0] if len(steps) > 1 else None
+        if len(steps) > 2 or (scaler is not None and not hasattr(scaler, 'scale_')):
+            raise ValueError("Only a StandardScaler followed by a forest can be flattened")
+
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            # Leaves point at themselves, so a walk that has arrived stays put
+            own = np.arange(tree.node_count) + offset
+            lefts.append(np.where(leaf, own, tree.children_left + offset))
+            rights.append(np.where(leaf, own, tree.children_right + offset))
+            value = tree.value[:, 0, :]
+            probas.append(value / value.sum(axis=1, keepdims=True))
+            offset += tree.node_count
+
+        n_features = forest.n_features_in_
+        arrays = {
+            'feature': np.concatenate(features).astype(np.int32),
+            'threshold': np.concatenate(thresholds).astype(np.float64),
+            'left': np.concatenate(lefts).astype(np.int32),
+            'right': np.concatenate(rights).astype(np.int32),
+            'proba': np.concatenate(probas).astype(np.float64),
+            'roots': np.asarray(roots, dtype=np.int32),
+            'mean': (scaler.mean_ if scaler is not None else np.zeros(n_features)).astype(np.float64),
+            'scale': (scaler.scale_ if scaler is not None else np.ones(n_features)).astype(np.float64),
+        }
+        max_depth = max(estimator.tree_.max_depth for estimator in forest.estimators_)
+        return cls(arrays, n_features, max_depth, forest.classes_)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({"n_features": self.n_features, "max_depth": self.max_depth,
+                       "classes": self.classes_.tolist()}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS}
+        return cls(arrays, meta["n_features"], meta["max_depth"], meta["classes"])
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        # Same as the pipeline: scale in float64, then the trees compare float32 values
+        X = ((X - self.mean) / self.scale).astype(np.float32)
+
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.proba[node].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def flat_dir(model_path):
+    return f"{model_path}.flat-{os.stat(model_path).st_mtime_ns}"
+
+
+def load_or_build(model_path):
+    """The flat, memory-mapped form of model_path, converting it first if it changed since."""
+    directory = flat_dir(model_path)
+    if not os.path.exists(os.path.join(directory, 'meta.json')):
+        import joblib
+        tmp = f"{directory}.tmp.{os.getpid()}"
+        FlatForest.from_model(joblib.load(model_path)).save(tmp)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            # Another worker finished the same conversion first
+            shutil.rmtree(tmp, ignore_errors=True)
+        for stale in glob.glob(f"{glob.escape(model_path)}.flat-*"):
+            if stale != directory and '.tmp.' not in stale:
+                shutil.rmtree(stale, ignore_errors=True)
+    return FlatForest.load(directory)
@@ -0,0 +1,216 @@
+# Out-of-core ingestion of minute-level training data: chunked reads with compact dtypes
+"""
+pd.read_csv with default dtypes holds every column as int64/float64. Read in chunks with
+DTYPES instead, a row of 15 features plus the label takes 47 bytes instead of 128, and
+only one chunk is ever parsed at a time.
+
+Each chunk becomes model input through predict/features.py's transform(), the same
+cleaning the gateway and the prediction service apply, and then goes to one of:
+
+  matrix   a compact on-disk matrix: features.f32 (rows x 15 float32) and labels.i8,
+           opened later with load_matrix() as read-only numpy memmaps
+  train    incremental training: a StandardScaler fit over every chunk first, then a
+           RandomForest that grows --trees-per-chunk warm-started trees on each chunk
+
+    python -m predict.ingest data/*.csv --matrix data/matrix
+    python -m predict.ingest data/*.csv --train model.pkl --chunksize 200000
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from predict.features import FEATURE_COLUMNS, transform
+
+LABEL_COLUMN = 'Focus'
+
+# Smallest types that hold every value the collectors produce. Calendar minutes have no upper
+# bound and are fractional when backfilled, so they are float32 like the rates
+DTYPES = {
+    'Hour': np.int8,
+    'Minute': np.int8,
+    'Day of week': np.int8,
+    'Keystrokes per min': np.float32,
+    'Mouse moves per min': np.float32,
+    'Mouse clicks per min': np.float32,
+    'Productivity of Active Chrome Tabs': np.float32,
+    'Total Minutes of Events Before': np.float32,
+    'Total Minutes of Events After': np.float32,
+    'Total Minutes to Next Event': np.float32,
+    'Spotify': np.int8,
+    'Danceability': np.float32,
+    'Tempo': np.float32,
+    'Energy': np.float32,
+    'Minutes_Into_Day': np.int16,
+    LABEL_COLUMN: np.int8,
+}
+
+# Valid values of the integer columns. They are parsed as float32 and checked before being
+# narrowed, because read_csv would wrap an out-of-range value into the small type silently.
+# The training data writes the hour after midnight of a late session as hour 24
+RANGES = {
+    'Hour': (0, 24),
+    'Minute': (0, 59),
+    'Day of week': (0, 6),
+    'Spotify': (0, 1),
+    'Minutes_Into_Day': (0, 24 * 60 + 59),
+    LABEL_COLUMN: (0, 1),
+}
+
+DEFAULT_CHUNKSIZE = 100000
+
+
+def iter_chunks(paths, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield DataFrame chunks with compact dtypes from one or more CSVs, as recorded."""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    for path in paths:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [column for column in FEATURE_COLUMNS + [LABEL_COLUMN] if column in header]
+        dtypes = {column: np.float32 if column in RANGES else DTYPES[column] for column in usecols}
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+            yield narrow(chunk, path)
+
+
+def narrow(chunk, path):
+    """Check chunk's integer columns against RANGES and convert them to DTYPES. Raises ValueError naming the line."""
+    for column, (low, high) in RANGES.items():
+        if column not in chunk:
+            continue
+        values = chunk[column]
+        bad = values.isna() | (values < low) | (values > high) | (values % 1 != 0)
+        if bad.any():
+            # The index runs on across chunks; +2 for the header and counting lines from 1
+            line = bad.idxmax() + 2
+            raise ValueError(f"{path}, line {line}: {column} must be a whole number from {low} to {high}, "
+                             f"got {values[bad].iloc[0]}")
+        chunk[column] = values.astype(DTYPES[column])
+    return chunk
+
+
+def split(chunk):
+    """(model input stored as a C-ordered float32 array, labels as int8 or None) for one chunk."""
+    X = transform(chunk).astype(np.float32)
+    y = chunk[LABEL_COLUMN].to_numpy(dtype=np.int8) if LABEL_COLUMN in chunk else None
+    return X, y
+
+
+def count_rows(paths):
+    """Data rows across the CSVs, counted without parsing them."""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    rows = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            rows += max(0, sum(1 for _ in f) - 1)
+    return rows
+
+
+def read_compact(paths, chunksize=DEFAULT_CHUNKSIZE):
+    """Whole dataset as one DataFrame with compact dtypes, for data that fits once shrunk."""
+    chunks = list(iter_chunks(paths, chunksize))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=FEATURE_COLUMNS)
+
+
+def write_matrix(paths, out_dir, chunksize=DEFAULT_CHUNKSIZE):
+    """Stream the CSVs into out_dir/features.f32 and labels.i8 plus meta.json. Returns the row count."""
+    os.makedirs(out_dir, exist_ok=True)
+    rows = 0
+    has_labels = None
+    features_path = os.path.join(out_dir, 'features.f32')
+    labels_path = os.path.join(out_dir, 'labels.i8')
+    with open(features_path + '.tmp', 'wb') as features, open(labels_path + '.tmp', 'wb') as labels:
+        for chunk in iter_chunks(paths, chunksize):
+            X, y = split(chunk)
+            features.write(X.tobytes())
+            if has_labels is None:
+                has_labels = y is not None
+            if has_labels:
+                labels.write(y.tobytes())
+            rows += len(X)
+
+    os.replace(features_path + '.tmp', features_path)
+    if has_labels:
+        os.replace(labels_path + '.tmp', labels_path)
+    else:
+        os.remove(labels_path + '.tmp')
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({"rows": rows, "columns": FEATURE_COLUMNS, "dtype": "float32",
+                   "labels": LABEL_COLUMN if has_labels else None}, f, indent=2)
+    return rows
+
+
+def load_matrix(out_dir):
+    """(X, y) memmaps over a write_matrix() directory. y is None if the data had no labels."""
+    with open(os.path.join(out_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    shape = (meta["rows"], len(meta["columns"]))
+    X = np.memmap(os.path.join(out_dir, 'features.f32'), dtype=np.float32, mode='r', shape=shape)
+    y = None
+    if meta.get("labels"):
+        y = np.memmap(os.path.join(out_dir, 'labels.i8'), dtype=np.int8, mode='r', shape=(meta["rows"],))
+    return X, y
+
+
+def train_incremental(paths, chunksize=DEFAULT_CHUNKSIZE, trees_per_chunk=10, params=None, random_state=42):
+    """
+    Train the usual scaler + forest pipeline one chunk at a time: pass one fits the scaler
+    with partial_fit, pass two grows trees_per_chunk trees on each scaled chunk.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    # The scaler sees every row before any tree does, so all trees share one scaling
+    scaler = StandardScaler()
+    for chunk in iter_chunks(paths, chunksize):
+        scaler.partial_fit(transform(chunk))
+
+    params = params or {'max_depth': 10, 'min_samples_split': 5}
+    forest = RandomForestClassifier(n_estimators=0, warm_start=True, random_state=random_state, **params)
+    for chunk in iter_chunks(paths, chunksize):
+        y = chunk[LABEL_COLUMN] if LABEL_COLUMN in chunk else None
+        if y is None or y.nunique() < 2:
+            # A forest can't be grown on a chunk that has no labels or only one class
+            continue
+        forest.set_params(n_estimators=forest.n_estimators + trees_per_chunk)
+        forest.fit(scaler.transform(transform(chunk)), y)
+    if not hasattr(forest, 'estimators_'):
+        raise ValueError("No chunk had labels for both classes")
+    forest.set_params(warm_start=False)
+
+    # Already fitted: the pipeline only chains them for predict_proba
+    return Pipeline([('scaler', scaler), ('model', forest)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Training CSVs')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='Rows parsed at a time')
+    parser.add_argument('--matrix', help='Write a compact on-disk matrix to this directory')
+    parser.add_argument('--train', help='Train incrementally and save the model here')
+    parser.add_argument('--trees-per-chunk', type=int, default=10)
+    args = parser.parse_args()
+
+    if not args.matrix and not args.train:
+        parser.error('pass --matrix and/or --train')
+
+    if args.matrix:
+        rows = write_matrix(args.paths, args.matrix, args.chunksize)
+        size = os.path.getsize(os.path.join(args.matrix, 'features.f32'))
+        print(f"Wrote {rows} rows ({size / 2**20:.1f} MB of features) to {args.matrix}")
+
+    if args.train:
+        import joblib
+        model = train_incremental(args.paths, args.chunksize, args.trees_per_chunk)
+        joblib.dump(model, args.train)
+        print(f"Saved {args.train} ({len(model.steps[-1][1].estimators_)} trees)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+# Incremental model updates from labelled minutes, without a full retrain
+"""
+Labelled minutes (the 15 features plus Focus, 0 or 1) arrive through POST /label and are
+appended to LABELS_PATH. Every ONLINE_BATCH_SIZE labels, a background update:
+
+  1. takes the new labels plus an equal-sized replay sample of the training CSV, so one
+     skewed batch can't drag the model away from what it already knows and both classes
+     are present,
+  2. scales them with the pipeline's existing StandardScaler (refitting it would shift
+     the inputs of every tree already grown),
+  3. grows ONLINE_TREES_PER_BATCH new trees on that batch with warm_start, dropping the
+     oldest trees beyond ONLINE_MAX_TREES so recent behaviour gradually outweighs old,
+  4. writes the model to MODEL_PATH atomically (or publishes it as the active version when
+     MODEL_REGISTRY_DIR is set) and swaps it into the serving process.
+
+Other processes serving the same MODEL_PATH (python predict/predict.py) reload it when its
+mtime changes. Processes sharing LABELS_PATH (predict.serve's workers, cron) coordinate
+through it: labels are appended under a file lock, pending labels are counted from the
+file, and one update at a time runs, under LABELS_PATH + '.lock', starting from whatever
+the last one (in any process) recorded in LABELS_PATH + '.trained'.
+
+A batch update can also be run from cron:
+
+    python -m predict.online            # train on labels not yet used
+    python -m predict.online --all      # train on every label in LABELS_PATH
+"""
+import argparse
+import copy
+import csv
+import os
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no pre-fork workers there, so nothing to coordinate with
+    fcntl = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import config
+from observability.log import get_logger
+from predict.features import check_model, transform
+
+TRAINING_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'productivity_data_enhanced.csv')
+LABEL_COLUMN = 'Focus'
+
+log = get_logger('online')
+
+
+def lock_file(f, blocking=True):
+    """Lock f exclusively against other processes until it is closed. False if blocking is off and it's taken."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+def append_label(path, row, feature_columns):
+    """Append one labelled minute to the labels CSV, writing the header for a new file."""
+    columns = feature_columns + [LABEL_COLUMN]
+    with open(path, 'a', newline='') as f:
+        lock_file(f)
+        writer = csv.writer(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            writer.writerow(columns)
+        writer.writerow([row[column] for column in columns])
+
+
+def warm_start_update(model, X, y, trees, max_trees, random_state=None):
+    """
+    A copy of model with `trees` more trees grown on (X, y), X from features.transform().
+    model is a Pipeline of a fitted StandardScaler and RandomForestClassifier, or a bare forest.
+    """
+    model = check_model(copy.deepcopy(model))
+    if hasattr(model, 'steps'):
+        scaler = model.steps[0][1] if len(model.steps) > 1 else None
+        forest = model.steps[-1][1]
+    else:
+        scaler, forest = None, model
+    X = scaler.transform(X) if scaler is not None else X
+
+    grown = len(forest.estimators_)
+    forest.set_params(warm_start=True, n_estimators=grown + trees)
+    if random_state is not None:
+        # A fresh seed per update, so the new trees differ from the last batch's
+        forest.set_params(random_state=random_state)
+    forest.fit(X, y)
+
+    if len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+        forest.set_params(n_estimators=max_trees)
+    forest.set_params(warm_start=False)
+    return model
+
+
+def save_model(model, path):
+    """Write the model next to path and rename it into place, so readers never see half a file."""
+    tmp = f"{path}.tmp.{os.getpid()}"
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)
+
+
+class OnlineLearner:
+    """
+    Tracks which stored labels the model has already learned from in LABELS_PATH + '.trained',
+    so labels sent before a restart, or by another process, still get used. Both the marker
+    and the label count are read from disk whenever they're needed, never kept per process.
+    """
+
+    def __init__(self, get_model, set_model, feature_columns, model_path=None, labels_path=None, publish=None):
+        self.get_model = get_model
+        self.set_model = set_model
+        self.feature_columns = feature_columns
+        self.model_path = model_path
+        # Stores updated models instead of model_path and returns the file, e.g. ModelRegistry.adopt_file
+        self.publish = publish
+        self.labels_path = labels_path or config.LABELS_PATH
+        self.marker_path = f"{self.labels_path}.trained"
+        self.lock_path = f"{self.labels_path}.lock"
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        # (bytes of labels_path counted, newlines in them): only what was appended since is read
+        self._counted = (0, 0)
+        self._replay = None
+
+    def _read_marker(self):
+        try:
+            with open(self.marker_path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_marker(self, rows):
+        tmp = f"{self.marker_path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(str(rows))
+        os.replace(tmp, self.marker_path)
+
+    def stored(self):
+        """Labels in labels_path, whichever process wrote them."""
+        try:
+            size = os.path.getsize(self.labels_path)
+        except OSError:
+            return 0
+        with self._lock:
+            offset, lines = self._counted
+            if size < offset:
+                # Replaced or truncated: count again from the start
+                offset, lines = 0, 0
+            if size > offset:
+                with open(self.labels_path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(size - offset)
+                offset, lines = offset + len(data), lines + data.count(b'\n')
+            self._counted = (offset, lines)
+        return max(0, lines - 1)
+
+    def pending(self):
+        return max(0, self.stored() - self._read_marker())
+
+    def add(self, row):
+        """Store one labelled minute and start an update once a batch has built up. Returns labels pending."""
+        append_label(self.labels_path, row, self.feature_columns)
+        pending = self.pending()
+        if pending >= config.ONLINE_BATCH_SIZE:
+            self.update_in_background()
+        return pending
+
+    def update_in_background(self):
+        if self._update_lock.locked():
+            return False
+        threading.Thread(target=self.update, name='online-update', daemon=True).start()
+        return True
+
+    def replay_sample(self, size, seed):
+        if self._replay is None:
+            self._replay = pd.read_csv(TRAINING_DATA)
+        return self._replay.sample(n=min(size, len(self._replay)), random_state=seed)
+
+    def update(self, use_all=False):
+        """Grow the model on the labels it hasn't seen (every stored label with use_all). Returns the outcome."""
+        if not self._update_lock.acquire(blocking=False):
+            return {"status": "busy"}
+        lock = None
+        try:
+            # One update across processes: the marker read below must be the last update's
+            lock = open(self.lock_path, 'a')
+            if not lock_file(lock, blocking=False):
+                return {"status": "busy"}
+            if not os.path.exists(self.labels_path):
+                return {"status": "skipped", "reason": "no labels yet"}
+            trained = self._read_marker()
+            with open(self.labels_path, 'rb') as f:
+                # Waits out an append in progress, so the last row is whole
+                lock_file(f)
+                labels = pd.read_csv(f)
+            rows = len(labels)
+            if not use_all:
+                labels = labels.iloc[min(trained, rows):]
+            if labels.empty:
+                return {"status": "skipped", "reason": "no new labels"}
+
+            seed = int(np.random.SeedSequence().generate_state(1)[0] >> 1)
+            batch = pd.concat([labels, self.replay_sample(len(labels), seed)], ignore_index=True)
+            y = batch[LABEL_COLUMN].astype(int)
+            if y.nunique() < 2:
+                return {"status": "skipped", "reason": "batch has a single class"}
+
+            model = warm_start_update(self.get_model(), transform(batch), y,
+                                      config.ONLINE_TREES_PER_BATCH, config.ONLINE_MAX_TREES, seed)
+            path = None
+            if self.publish:
+                path = self.publish(model, {"source": "online", "labels": len(labels)})
+            elif self.model_path:
+                save_model(model, self.model_path)
+                path = self.model_path
+            self.set_model(model, path)
+
+            self._write_marker(rows)
+            self.updates += 1
+            trees = len(model.steps[-1][1].estimators_) if hasattr(model, 'steps') else len(model.estimators_)
+            log.info("Model updated", extra={"fields": {"labels": len(labels), "trees": trees}})
+            return {"status": "updated", "labels": len(labels), "trees": trees}
+        except Exception as e:
+            log.exception("Online update failed: %s", e)
+            return {"status": "error", "error": str(e)}
+        finally:
+            if lock is not None:
+                lock.close()
+            self._update_lock.release()
+
+    def status(self):
+        return {
+            "pending_labels": self.pending(),
+            "batch_size": config.ONLINE_BATCH_SIZE,
+            "updates": self.updates,
+            "updating": self._update_lock.locked()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--all', action='store_true', help='Train on every stored label, not just new ones')
+    parser.add_argument('--labels', default=config.LABELS_PATH, help='Labelled minutes CSV')
+    args = parser.parse_args()
+
+    from predict import predict
+
+    learner = OnlineLearner(predict.training_model, predict.set_model, predict.FEATURE_COLUMNS,
+                            model_path=predict.MODEL_PATH, labels_path=args.labels,
+                            publish=predict.registry.adopt_file if predict.registry else None)
+    print(learner.update(use_all=args.all))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,268 @@
-from flask import Flask, request, jsonify
+import sys
+import os
+# Run directly (python predict/predict.py) this directory would shadow the predict package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Blueprint, Flask, Response, request, jsonify
 import joblib
-import pandas as pd
+import threading
+import time
+from functools import wraps
 
-app = Flask(__name__)
+import config
+from observability import memory
+from observability.admin import admin_required
+from observability.log import get_logger
+from predict import flat, wire
+from predict.cache import from_config as prediction_cache_from_config
+from predict.features import FEATURE_COLUMNS, FeatureError, check_model, from_mapping, to_mapping, transform_one
+from predict.online import LABEL_COLUMN, OnlineLearner
+from predict.registry import ModelRegistry, RegistryError
+from predict.tenants import from_config as user_models_from_config
+
+MODEL_PATH = config.MODEL_PATH
+
+bp = Blueprint('predict', __name__)
+log = get_logger('predict')
+
+def _load(path):
+    """A model file as served: sklearn estimators, or shared memory-mapped arrays with MODEL_FORMAT=flat"""
+    if config.MODEL_FORMAT == 'flat':
+        return flat.load_or_build(path)
+    return check_model(joblib.load(path))
+
+def _serving(new_model, path=None):
+    """
+    new_model as served. With MODEL_FORMAT=flat and the file it came from (path), the arrays
+    are mapped from next to that file like _load's, so every worker still shares one copy.
+    """
+    if isinstance(new_model, flat.FlatForest):
+        return new_model
+    if config.MODEL_FORMAT == 'flat':
+        return flat.load_or_build(path) if path else flat.FlatForest.from_model(new_model)
+    return check_model(new_model)
+
+# Load trained model: the registry's active version if there is a registry, else MODEL_PATH
+registry = ModelRegistry(config.MODEL_REGISTRY_DIR) if config.MODEL_REGISTRY_DIR else None
+model = _serving(registry.start(MODEL_PATH), registry.model_path(registry.active)) if registry else _load(MODEL_PATH)
+_model_mtime = os.stat(MODEL_PATH).st_mtime_ns
+_checked_at = time.monotonic()
+_reload_lock = threading.Lock()
+
+
+def model_size():
+    """Bytes in the forest's node and value arrays, which is nearly all of a fitted RandomForest."""
+    if isinstance(model, flat.FlatForest):
+        return {"bytes": model.nbytes, "items": model.n_trees}
+    estimator = model.steps[-1][1] if hasattr(model, 'steps') else model
+    trees = getattr(estimator, 'estimators_', None)
+    if not trees or not hasattr(trees[0], 'tree_'):
+        return memory.measure('model', lambda: model)
+    size = 0
+    for tree in trees:
+        state = tree.tree_.__getstate__()
+        size += state['nodes'].nbytes + state['values'].nbytes
+    return {"bytes": size, "items": len(trees)}
+
+memory.register('model', model_size)
+
+def set_model(new_model, path=None):
+    """
+    Serve new_model from now on. Requests already holding the old one finish with it. path is
+    the file new_model was loaded from or saved to, if any.
+    """
+    global model, _model_mtime
+    with _reload_lock:
+        model = _serving(new_model, path)
+        try:
+            _model_mtime = os.stat(MODEL_PATH).st_mtime_ns
+        except OSError:
+            pass
+
+def get_model():
+    """
+    The serving model, reloaded from MODEL_PATH if another process has replaced the file.
+    With a registry, a new ACTIVE version is loaded and checked in the background instead.
+    """
+    global model, _model_mtime, _checked_at
+    if time.monotonic() - _checked_at < config.MODEL_RELOAD_INTERVAL:
+        return model
+    if registry is not None:
+        _checked_at = time.monotonic()
+        registry.poll()
+        return model
+    # One thread checks; the rest keep serving the current model meanwhile
+    if not _reload_lock.acquire(blocking=False):
+        return model
+    try:
+        _checked_at = time.monotonic()
+        mtime = os.stat(MODEL_PATH).st_mtime_ns
+        if mtime != _model_mtime:
+            model = _load(MODEL_PATH)
+            _model_mtime = mtime
+            log.info("Reloaded model from %s", MODEL_PATH)
+    except Exception as e:
+        log.error("Model reload failed, keeping the current model: %s", e)
+    finally:
+        _reload_lock.release()
+    return model
+
+if registry is not None:
+    # The registry swaps through set_model; it compares against the model as served, without polling
+    registry.set_model = set_model
+    registry.get_model = lambda: model
+
+def training_model():
+    """The sklearn model behind the served one, for online updates: flat arrays can't grow trees."""
+    current = get_model()
+    if not isinstance(current, flat.FlatForest):
+        return current
+    return check_model(joblib.load(registry.model_path(registry.active) if registry else MODEL_PATH))
+
+def _score(current, vector):
+    # The float64 row training uses, for either model format
+    return float(current.predict_proba(transform_one(vector))[0][0])
 
-# Load trained model
-model = joblib.load('procrastination_model.pkl')
-
-# Define the expected features (must match training order)
-FEATURE_COLUMNS = [
-    'Hour',
-    'Minute',
-    'Day of week',
-    'Keystrokes per min',
-    'Mouse moves per min',
-    'Mouse clicks per min',
-    'Productivity of Active Chrome Tabs',
-    'Total Minutes of Events Before',
-    'Total Minutes of Events After',
-    'Total Minutes to Next Event',
-    'Spotify',
-    'Danceability',
-    'Tempo',
-    'Energy',
-    'Minutes_Into_Day'
-]
-
-@app.route('/predict', methods=['POST'])
+# Repeated (quantized) feature vectors skip the forest entirely
+prediction_cache = prediction_cache_from_config()
+if prediction_cache is not None:
+    memory.register('predict.cache', lambda: prediction_cache._entries)
+
+# Personal models by X-User-Id, with the global model for everyone else
+user_models = user_models_from_config()
+if user_models is not None:
+    memory.register('predict.user_models', user_models.size)
+
+def predict_vector(vector, user=None):
+    """
+    Procrastination probability for one validated feature vector, from user's own model if
+    they have one. Used in-process by the gateway in server.py.
+    """
+    current = get_model()
+    if user and user_models is not None:
+        user_models.share_global(current)
+        entry = user_models.get(user)
+        if entry is not None:
+            if entry.cache is None:
+                return _score(entry.model, vector)
+            return entry.cache.predict(entry.model, vector, _score)
+    if prediction_cache is None:
+        return _score(current, vector)
+    return prediction_cache.predict(current, vector, _score)
+
+def predict_proba(data):
+    """Procrastination probability for one feature dict. Raises FeatureError if it is incomplete."""
+    return predict_vector(from_mapping(data))
+
+@bp.route('/predict', methods=['POST'])
 def predict():
-    # Parse JSON body directly (root-level features)
-    data = request.get_json()
+    """Root-level JSON features, or a binary feature vector (predict/wire.py)"""
+    try:
+        vector = wire.read_features(request)
+    except FeatureError as e:
+        return jsonify({"error": str(e)}), 400
+
+    prediction = predict_vector(vector, request.headers.get('X-User-Id'))
+    if wire.wants_binary(request):
+        return Response(wire.encode_prediction(prediction), content_type=wire.CONTENT_TYPE)
+    return jsonify({"prediction": prediction})
+
+learner = OnlineLearner(training_model, set_model, FEATURE_COLUMNS, model_path=MODEL_PATH,
+                        publish=registry.adopt_file if registry else None)
+
+@bp.route('/label', methods=['POST'])
+def label():
+    """
+    Expects the same root-level features as /predict plus Focus: 1 if the minute was
+    focused, 0 if it was procrastinated. Labels are stored and learned from in batches.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        vector = from_mapping(data)
+    except FeatureError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if data.get(LABEL_COLUMN) not in (0, 1):
+        return jsonify({"success": False, "error": "Focus must be 0 or 1"}), 400
 
-    # Create a single-row DataFrame
-    df = pd.DataFrame([data])[FEATURE_COLUMNS]
+    row = to_mapping(vector)
+    row[LABEL_COLUMN] = int(data[LABEL_COLUMN])
+    pending = learner.add(row)
+    return jsonify({"success": True, "pending_labels": pending, "batch_size": config.ONLINE_BATCH_SIZE})
 
-    # Predict using the model
-    proba = model.predict_proba(df)[0][0]
+@bp.route('/label', methods=['GET'])
+def label_status():
+    return jsonify(learner.status())
 
-    # Return a single integer prediction
-    return jsonify({"prediction": float(proba)})
+@bp.route('/label/update', methods=['POST'])
+@admin_required
+def label_update():
+    """Learn from pending labels now instead of waiting for a full batch (?all=1 for every stored label)"""
+    use_all = request.args.get('all', '').lower() in ('1', 'true', 'yes')
+    result = learner.update(use_all=use_all)
+    return jsonify(result), 409 if result["status"] == "busy" else 200
+
+def _registry_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if registry is None:
+            return jsonify({"error": "No model registry: set MODEL_REGISTRY_DIR"}), 404
+        return view(*args, **kwargs)
+    return wrapped
+
+@bp.route('/admin/models/users', methods=['GET'])
+@admin_required
+def get_user_models():
+    """Resident personal models and the memory they use"""
+    if user_models is None:
+        return jsonify({"error": "No personal models: set USER_MODELS_DIR"}), 404
+    return jsonify(user_models.status())
+
+@bp.route('/admin/models', methods=['GET'])
+@admin_required
+@_registry_required
+def get_models():
+    """Versions, the one being served and the outcome of the last activation"""
+    return jsonify(registry.status())
+
+@bp.route('/admin/models/<version>/activate', methods=['POST'])
+@admin_required
+@_registry_required
+def activate_model(version):
+    """
+    Load and check version in the background, then serve it (202). ?force=1 serves it even
+    if it disagrees with the current model; ?wait=1 answers with the outcome instead.
+    """
+    force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+    wait = request.args.get('wait', '').lower() in ('1', 'true', 'yes')
+    try:
+        result = registry.activate(version, force=force, wait=wait)
+    except RegistryError as e:
+        return jsonify({"error": str(e)}), 404
+    if result is False:
+        return jsonify({"error": "Another activation is running", **registry.status()["state"]}), 409
+    if wait:
+        return jsonify(result), 200 if result.get("outcome") == "activated" else 422
+    return jsonify(registry.status()["state"]), 202
+
+@bp.route('/admin/models/rollback', methods=['POST'])
+@admin_required
+@_registry_required
+def rollback_model():
+    """Serve the previously active version again (?wait=1 to answer once it is serving)"""
+    wait = request.args.get('wait', '').lower() in ('1', 'true', 'yes')
+    try:
+        result = registry.rollback(wait=wait)
+    except RegistryError as e:
+        return jsonify({"error": str(e)}), 409
+    if result is False:
+        return jsonify({"error": "Another activation is running", **registry.status()["state"]}), 409
+    if wait:
+        return jsonify(result), 200 if result.get("outcome") == "rolled_back" else 422
+    return jsonify(registry.status()["state"]), 202
+
+# Standalone prediction service. server.py serves this blueprint in the same process as the gateway.
+app = Flask(__name__)
+app.register_blueprint(bp)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=False)  # Changed to 5001
@@ -0,0 +1,392 @@
+# Versioned models with background loading, checks before serving and rollback
+"""
+Layout of MODEL_REGISTRY_DIR:
+
+    20261019-142501/model.pkl     one directory per version, never modified once written
+    20261019-142501/meta.json     where the version came from and when
+    ACTIVE                        the version every process should serve
+    HISTORY                       versions made active, oldest first; rollback pops the last
+
+A new version is served without a restart:
+
+  1. it is published (python -m predict.registry publish model.pkl --activate, an online
+     learning update, or POST /admin/models/<version>/activate),
+  2. each serving process notices ACTIVE change within MODEL_RELOAD_INTERVAL and loads the
+     version on a background thread, while requests keep using the current model,
+  3. a warm-up runs predict_proba on MODEL_PARITY_ROWS training rows, once as a batch and
+     row by row, and the new version must classify at least MODEL_PARITY_MIN_AGREEMENT of
+     them like the current one,
+  4. only then is the model swapped in, by replacing one reference. A version that fails is
+     never served by the process that checked it, which keeps serving its current version
+     and doesn't try the failed one again until ACTIVE changes. ACTIVE itself is left to
+     whoever set it: a process only points it (and extends HISTORY) after a successful swap.
+
+    python -m predict.registry list
+    python -m predict.registry publish procrastination_model.pkl --activate
+    python -m predict.registry rollback
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib
+import numpy as np
+
+import config
+from observability import metrics
+from observability.log import get_logger
+from predict.features import check_model, transform
+
+MODEL_FILE = 'model.pkl'
+META_FILE = 'meta.json'
+
+log = get_logger('registry')
+
+activations = metrics.counter('model_activations_total',
+                              'Model version changes by outcome (activated, rejected, failed, rolled_back).',
+                              ('outcome',))
+
+
+class RegistryError(Exception):
+    pass
+
+
+class ModelRegistry:
+    """
+    One per serving process. set_model and get_model are predict.py's: the registry decides
+    when to swap, predict.py owns the reference every request reads.
+    """
+
+    def __init__(self, root, set_model=None, get_model=None, keep=None):
+        self.root = root
+        self.set_model = set_model
+        self.get_model = get_model
+        self.keep = keep or config.MODEL_REGISTRY_KEEP
+        self.active = None
+        self.state = {"status": "idle"}
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._reference = None
+        # Last version that failed its checks here, so poll() doesn't load it again and again
+        self._rejected = None
+        os.makedirs(root, exist_ok=True)
+
+    # Versions and pointers on disk
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def versions(self):
+        # Not '.<version>.tmp': a publish still being written, which prune() mustn't delete
+        return sorted(name for name in os.listdir(self.root)
+                      if not name.startswith('.') and os.path.isfile(self._path(name, MODEL_FILE)))
+
+    def meta(self, version):
+        try:
+            with open(self._path(version, META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, name, text):
+        tmp = self._path(f"{name}.tmp.{os.getpid()}")
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, self._path(name))
+
+    def pointer(self):
+        try:
+            with open(self._path('ACTIVE')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def history(self):
+        try:
+            with open(self._path('HISTORY')) as f:
+                return [line.strip() for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def point(self, version):
+        """Make version the one every process serves, remembering it for rollback."""
+        if version not in self.versions():
+            raise RegistryError(f"Unknown model version {version!r}")
+        history = self.history()
+        if not history or history[-1] != version:
+            history.append(version)
+        self._write('HISTORY', '\n'.join(history) + '\n')
+        self._write('ACTIVE', version + '\n')
+
+    def _before(self, current):
+        history = self.history()
+        while history and history[-1] == current:
+            history.pop()
+        if not history:
+            raise RegistryError("No earlier version to roll back to")
+        return history
+
+    def previous(self, current):
+        """The version HISTORY had active before current, without changing anything."""
+        return self._before(current)[-1]
+
+    def unwind(self, current):
+        """Drop current from the end of HISTORY and return the version before it."""
+        history = self._before(current)
+        self._write('HISTORY', '\n'.join(history) + '\n')
+        return history[-1]
+
+    def publish(self, model, meta=None):
+        """Store a model (a fitted estimator or a path to a .pkl) as a new version. Returns the version."""
+        version = time.strftime('%Y%m%d-%H%M%S')
+        suffix = 1
+        while os.path.exists(self._path(version)):
+            suffix += 1
+            version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+        # Written under a temporary name, so no reader ever sees a version without its model
+        tmp = self._path(f".{version}.tmp")
+        os.makedirs(tmp)
+        if isinstance(model, (str, os.PathLike)):
+            shutil.copyfile(model, os.path.join(tmp, MODEL_FILE))
+            meta = {"source": os.path.abspath(model), **(meta or {})}
+        else:
+            joblib.dump(model, os.path.join(tmp, MODEL_FILE))
+        with open(os.path.join(tmp, META_FILE), 'w') as f:
+            json.dump({"created": time.time(), **(meta or {})}, f, indent=2)
+        os.rename(tmp, self._path(version))
+        log.info("Published model version %s", version)
+        return version
+
+    def model_path(self, version):
+        return self._path(version, MODEL_FILE)
+
+    def load(self, version):
+        return check_model(joblib.load(self.model_path(version)))
+
+    def prune(self):
+        """Delete the oldest versions beyond keep, except any still in HISTORY's recent past or serving."""
+        versions = self.versions()
+        protected = set(self.history()[-self.keep:]) | {self.active, self.pointer()}
+        for version in versions[:-self.keep]:
+            if version not in protected:
+                shutil.rmtree(self._path(version), ignore_errors=True)
+
+    # Checks
+
+    def reference_rows(self):
+        """A fixed sample of training rows every version is checked on, as model input."""
+        if self._reference is None:
+            from predict import ingest
+            from predict.online import TRAINING_DATA
+            data = ingest.read_compact(TRAINING_DATA)
+            sample = data.sample(n=min(config.MODEL_PARITY_ROWS, len(data)), random_state=0)
+            self._reference = transform(sample)
+        return self._reference
+
+    def check(self, candidate, current=None):
+        """Warm candidate up and compare it with current. Returns (ok, report)."""
+        rows = self.reference_rows()
+        report = {"rows": len(rows)}
+
+        start = time.perf_counter()
+        proba = candidate.predict_proba(rows)
+        report["batch_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if proba.shape != (len(rows), 2) or not np.isfinite(proba).all() or proba.min() < 0 or proba.max() > 1:
+            return False, {**report, "reason": f"invalid probabilities, shape {proba.shape}"}
+
+        # The serving path is one row at a time: run it so the first real request isn't the slow one
+        timings = []
+        for i in range(min(20, len(rows))):
+            start = time.perf_counter()
+            candidate.predict_proba(rows[i:i + 1])
+            timings.append(time.perf_counter() - start)
+        report["row_ms"] = round(float(np.median(timings)) * 1000, 3)
+
+        if current is None:
+            return True, report
+        baseline = current.predict_proba(rows)
+        report["agreement"] = round(float((proba.argmax(axis=1) == baseline.argmax(axis=1)).mean()), 4)
+        report["mean_abs_diff"] = round(float(np.abs(proba[:, 1] - baseline[:, 1]).mean()), 4)
+        if report["agreement"] < config.MODEL_PARITY_MIN_AGREEMENT:
+            return False, {**report, "reason": f"agreement below {config.MODEL_PARITY_MIN_AGREEMENT}"}
+        return True, report
+
+    # Serving
+
+    def start(self, fallback_path):
+        """
+        Model to serve at startup: the ACTIVE version, or fallback_path published as the first
+        version if the registry is empty.
+        """
+        version = self.pointer()
+        if version is None or version not in self.versions():
+            version = self.publish(fallback_path, {"note": "initial version"})
+            self.point(version)
+        model = self.load(version)
+        self.active = version
+        return model
+
+    def activate(self, version, force=False, wait=False, rollback=False):
+        """
+        Load, check and swap in version on a background thread (on this one with wait).
+        Returns False if another activation is running, else True, or the result with wait.
+        """
+        if version not in self.versions():
+            raise RegistryError(f"Unknown model version {version!r}")
+        if not self._busy.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.state = {"status": "loading", "version": version, "started": time.time()}
+        if wait:
+            return self._activate(version, force, rollback)
+        threading.Thread(target=self._activate, args=(version, force, rollback),
+                         name='model-activate', daemon=True).start()
+        return True
+
+    def _activate(self, version, force, rollback):
+        try:
+            candidate = self.load(version)
+            current = self.get_model() if self.get_model else None
+            ok, report = self.check(candidate, current)
+            if not ok and not force:
+                return self._reject(version, "rejected", report)
+
+            self.set_model(candidate, self.model_path(version))
+            with self._lock:
+                previous, self.active = self.active, version
+                self._rejected = None
+                self.state = {"status": "idle", "version": version, "previous": previous,
+                              "outcome": "rolled_back" if rollback else "activated", "report": report}
+            if rollback and previous and self.history()[-1:] == [previous]:
+                # HISTORY only forgets the version rolled back from once its predecessor is serving
+                try:
+                    self.unwind(previous)
+                except RegistryError:
+                    pass
+            if self.pointer() != version:
+                self.point(version)
+            self.prune()
+            activations.inc(self.state["outcome"])
+            log.info("Serving model version %s", version, extra={"fields": {"previous": previous, **report}})
+            return dict(self.state)
+        except Exception as e:
+            log.exception("Loading model version %s failed: %s", version, e)
+            return self._reject(version, "failed", {"reason": str(e)})
+        finally:
+            self._busy.release()
+
+    def _reject(self, version, outcome, report):
+        # ACTIVE and HISTORY are left alone: this process never pointed them at a version it
+        # hadn't swapped in, so whoever did (another server, the CLI) may well be serving it
+        with self._lock:
+            self.state = {"status": "idle", "version": version, "outcome": outcome, "report": report}
+            self._rejected = version
+            active = self.active
+        activations.inc(outcome)
+        log.error("Model version %s %s, still serving %s", version, outcome, active,
+                  extra={"fields": report})
+        return dict(self.state)
+
+    def rollback(self, wait=False):
+        """Serve the version that was active before the current one."""
+        if self._busy.locked():
+            return False
+        previous = self.previous(self.active)
+        # The previous version already served: only the warm-up matters, not agreement with the bad one
+        return self.activate(previous, force=True, wait=wait, rollback=True)
+
+    def adopt(self, model, meta=None):
+        """Publish a model this process has already swapped in (an online update) as the active version."""
+        version = self.publish(model, meta)
+        with self._lock:
+            self.active = version
+        self.point(version)
+        self.prune()
+        return version
+
+    def adopt_file(self, model, meta=None):
+        """adopt(), returning the stored model file instead of the version."""
+        return self.model_path(self.adopt(model, meta))
+
+    def _rolled_back_to(self, version):
+        """
+        True if ACTIVE moved back to version, one served before the current one: HISTORY has
+        it before the current version, or no longer has the current version at all (another
+        process rolled back from it).
+        """
+        history = self.history()
+        if version not in history:
+            return False
+        if self.active not in history:
+            return True
+        return history.index(version) < len(history) - 1 - history[::-1].index(self.active)
+
+    def poll(self):
+        """Start activating ACTIVE if another process has changed it. Cheap enough for every reload check."""
+        version = self.pointer()
+        if version and version not in (self.active, self._rejected) and not self._busy.locked():
+            # A rollback only needs the warm-up: the model still serving here is the one that
+            # was rolled back from, and a bad model is exactly the one that disagrees
+            rollback = self._rolled_back_to(version)
+            try:
+                self.activate(version, force=rollback, rollback=rollback)
+            except RegistryError as e:
+                log.error("ACTIVE names a missing version: %s", e)
+
+    def status(self):
+        with self._lock:
+            state = dict(self.state)
+        return {
+            "active": self.active,
+            "pointer": self.pointer(),
+            "state": state,
+            "history": self.history()[-self.keep:],
+            "versions": [{"version": version, **self.meta(version)} for version in self.versions()]
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default=config.MODEL_REGISTRY_DIR, help='Registry directory (MODEL_REGISTRY_DIR)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='Versions and the active one')
+    publish = commands.add_parser('publish', help='Add a model file as a new version')
+    publish.add_argument('path')
+    publish.add_argument('--activate', action='store_true', help='Point ACTIVE at it; servers pick it up')
+    activate = commands.add_parser('activate', help='Point ACTIVE at an existing version')
+    activate.add_argument('version')
+    commands.add_parser('rollback', help='Point ACTIVE at the previous version')
+    args = parser.parse_args()
+
+    if not args.root:
+        parser.error('set MODEL_REGISTRY_DIR or pass --root')
+    registry = ModelRegistry(args.root)
+    try:
+        if args.command == 'list':
+            active = registry.pointer()
+            for version in registry.versions():
+                print(f"{'*' if version == active else ' '} {version}  {json.dumps(registry.meta(version))}")
+        elif args.command == 'publish':
+            version = registry.publish(args.path)
+            if args.activate:
+                registry.point(version)
+            print(version)
+        elif args.command == 'activate':
+            registry.point(args.version)
+        elif args.command == 'rollback':
+            previous = registry.unwind(registry.pointer())
+            registry.point(previous)
+            print(previous)
+    except RegistryError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == '__main__':
+    main()
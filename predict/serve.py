@@ -0,0 +1,109 @@
+# Pre-fork prediction server: one listening socket, N worker processes, one copy of the model
+"""
+The model is loaded once, in the parent, before any worker is forked:
+
+  - MODEL_FORMAT defaults to flat here, so the forest is a handful of memory-mapped .npy
+    files (predict/flat.py). Every worker maps the same page-cache pages, and a reload after
+    the model file changes maps the new files rather than copying them per worker.
+  - gc.freeze() moves everything loaded so far out of the collector's reach, so collections
+    in the workers don't write to (and so copy) the parent's pages.
+
+Each worker runs waitress on the inherited socket; the kernel spreads connections across
+them, so throughput scales with cores while resident memory stays close to one process.
+The parent restarts workers that die and stops them all on SIGINT/SIGTERM.
+
+    python -m predict.serve --workers 4 --port 5001
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_worker(app, sock, threads):
+    from waitress import serve
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    serve(app, sockets=[sock], threads=threads, _quiet=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=4, help='waitress threads per worker')
+    parser.add_argument('--format', choices=('flat', 'sklearn'), help='MODEL_FORMAT (default: flat)')
+    args = parser.parse_args()
+
+    # Before config is imported, so predict.py loads the model in this format
+    os.environ['MODEL_FORMAT'] = args.format or os.environ.get('MODEL_FORMAT', 'flat')
+    from predict.predict import app, log
+    # Each worker's own queue backs up briefly whenever the kernel hands it several connections
+    logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+
+    if not hasattr(os, 'fork') or args.workers <= 1:
+        from waitress import serve
+        log.info("Serving predictions on %s:%s in one process", args.host, args.port)
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+        return
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.set_inheritable(True)
+
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, args.threads)
+            finally:
+                os._exit(0)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(args.workers):
+        spawn(index)
+    log.info("Serving predictions on %s:%s with %s workers", args.host, args.port, args.workers,
+             extra={"fields": {"format": os.environ['MODEL_FORMAT'], "workers": sorted(workers)}})
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = workers.pop(pid, None)
+        if index is not None and not stopping:
+            log.error("Worker %s exited with status %s, restarting it", pid, status)
+            # Don't spin if workers die on startup
+            time.sleep(1)
+            spawn(index)
+
+
+if __name__ == '__main__':
+    main()
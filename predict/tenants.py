@@ -0,0 +1,274 @@
+# Per-user models: lazily loaded, kept in an LRU under a memory budget, global model as fallback
+"""
+A user's model lives in its own registry under USER_MODELS_DIR/<user id>/ (same layout as
+predict/registry.py, so python -m predict.registry --root USER_MODELS_DIR/<user> publish
+... --activate deploys one). Requests name the user in X-User-Id. Users without a model,
+or whose model fails to load, are served by the global model.
+
+Resident user models are capped by USER_MODELS_BUDGET_MB, least recently used first out.
+
+Personal models are usually grown from the global one (online warm-start), so most of their
+trees are identical to the global model's or to each other's. joblib's mmap_mode doesn't help
+here: sklearn copies each tree's node array out of the pickle when it unpickles it. Instead,
+every loaded tree is fingerprinted and replaced by an identical tree already in memory.
+Each distinct tree counts against the budget once, for as long as any resident user model
+holds it (a reference count per tree), and not at all while the global model holds it too:
+evicting a model frees only the trees no other resident model still uses.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import joblib
+
+import config
+from observability import metrics
+from observability.log import get_logger
+from predict.cache import PredictionCache, parse_quanta
+from predict.features import check_model
+
+# Starting with a letter or digit, so '.' and '..' aren't user ids
+USER_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+log = get_logger('tenants')
+
+
+def forest_of(model):
+    return model.steps[-1][1] if hasattr(model, 'steps') else model
+
+
+def tree_bytes(estimator):
+    state = estimator.tree_.__getstate__()
+    return state['nodes'].nbytes + state['values'].nbytes
+
+
+class TreePool:
+    """Fitted trees by content, so identical trees in different models are one object."""
+
+    def __init__(self):
+        self._trees = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(estimator):
+        state = estimator.tree_.__getstate__()
+        digest = hashlib.blake2b(digest_size=16)
+        nodes = state['nodes']
+        # Field by field: the struct's padding bytes are uninitialised and differ between copies
+        for name in nodes.dtype.names:
+            digest.update(nodes[name].tobytes())
+        digest.update(state['values'].tobytes())
+        return digest.digest()
+
+    def intern(self, model):
+        """Swap model's trees for pooled identical ones. Returns {fingerprint: bytes} of its distinct trees."""
+        forest = forest_of(model)
+        trees = getattr(forest, 'estimators_', None)
+        if not trees or not hasattr(trees[0], 'tree_'):
+            return {}
+        sizes = {}
+        with self._lock:
+            for i, estimator in enumerate(trees):
+                key = self.fingerprint(estimator)
+                pooled = self._trees.get(key)
+                if pooled is None:
+                    self._trees[key] = estimator
+                elif pooled is not estimator:
+                    trees[i] = pooled
+                if key not in sizes:
+                    sizes[key] = tree_bytes(trees[i])
+        return sizes
+
+    def __len__(self):
+        return len(self._trees)
+
+
+class UserModel:
+    __slots__ = ('model', 'version', 'trees', 'cache', 'checked_at')
+
+    def __init__(self, model, version, trees, cache):
+        self.model = model
+        self.version = version
+        # {fingerprint: bytes} of the model's distinct trees
+        self.trees = trees
+        self.cache = cache
+        self.checked_at = time.monotonic()
+
+
+class UserModels:
+    def __init__(self, root, budget_bytes, cache_size=256):
+        self.root = root
+        self.budget = budget_bytes
+        self.cache_size = cache_size
+        self.pool = TreePool()
+        self.loads = 0
+        self.evictions = 0
+        self._resident = OrderedDict()
+        # Bytes of the distinct trees resident user models hold and the global model doesn't
+        self._bytes = 0
+        # Resident user models holding each tree, by fingerprint
+        self._refs = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._global = None
+        self._global_trees = frozenset()
+        self._quanta = parse_quanta(config.PREDICTION_CACHE_QUANTA)
+
+    def _path(self, user, *parts):
+        """root/user/parts, or None if it resolves (through '..' or symlinks) outside the user's directory."""
+        base = os.path.realpath(os.path.join(self.root, user))
+        if os.path.dirname(base) != os.path.realpath(self.root):
+            return None
+        path = os.path.realpath(os.path.join(base, *parts))
+        return path if os.path.commonpath([base, path]) == base else None
+
+    def _pointer(self, user):
+        path = self._path(user, 'ACTIVE')
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def share_global(self, model):
+        """Pool the global model's trees, so user models grown from it reuse them. Cheap to repeat."""
+        if self._global is not model:
+            trees = frozenset(self.pool.intern(model))
+            with self._lock:
+                self._global_trees = trees
+                self._bytes = sum(size for key, size in self._sizes.items() if key not in trees)
+            self._global = model
+
+    def _hold(self, entry):
+        """Count entry's trees as resident. Called with the lock held."""
+        for key, size in entry.trees.items():
+            count = self._refs.get(key, 0)
+            if count == 0:
+                self._sizes[key] = size
+                if key not in self._global_trees:
+                    self._bytes += size
+            self._refs[key] = count + 1
+
+    def _release(self, entry):
+        """Uncount entry's trees; the ones no other resident model holds are freed. Called with the lock held."""
+        for key in entry.trees:
+            count = self._refs[key] - 1
+            if count:
+                self._refs[key] = count
+                continue
+            del self._refs[key]
+            size = self._sizes.pop(key)
+            if key not in self._global_trees:
+                self._bytes -= size
+
+    def _own_bytes(self, entry):
+        """Bytes that evicting entry would free. Called with the lock held."""
+        return sum(size for key, size in entry.trees.items()
+                   if self._refs.get(key) == 1 and key not in self._global_trees)
+
+    def get(self, user):
+        """The user's resident model, loading it if needed, or None to use the global model."""
+        if not user or not USER_ID.match(user):
+            return None
+        with self._lock:
+            entry = self._resident.get(user)
+            if entry is not None:
+                self._resident.move_to_end(user)
+        if entry is not None and time.monotonic() - entry.checked_at < config.MODEL_RELOAD_INTERVAL:
+            metrics.cache_hit('user_models')
+            return entry
+
+        version = self._pointer(user)
+        if entry is not None and entry.version == version:
+            entry.checked_at = time.monotonic()
+            metrics.cache_hit('user_models')
+            return entry
+        if version is None:
+            # No personal model (any more)
+            if entry is not None:
+                self._evict(user)
+            return None
+        metrics.cache_miss('user_models')
+        return self._load(user, version)
+
+    def _load(self, user, version):
+        # One thread loads a given user; others wait for it rather than loading the same file
+        with self._lock:
+            lock = self._loading.setdefault(user, threading.Lock())
+        try:
+            with lock:
+                return self._load_locked(user, version)
+        finally:
+            with self._lock:
+                self._loading.pop(user, None)
+
+    def _load_locked(self, user, version):
+        with self._lock:
+            entry = self._resident.get(user)
+        if entry is not None and entry.version == version:
+            return entry
+        path = self._path(user, version, 'model.pkl')
+        if path is None:
+            log.warning("Model version %r of %s is outside USER_MODELS_DIR, serving the global model", version, user)
+            return None
+        try:
+            model = check_model(joblib.load(path))
+        except Exception as e:
+            log.error("Loading the model of %s failed, serving the global model: %s", user, e)
+            return None
+        cache = PredictionCache(self.cache_size, self._quanta, name='user_prediction') if self.cache_size else None
+        entry = UserModel(model, version, self.pool.intern(model), cache)
+        with self._lock:
+            old = self._resident.pop(user, None)
+            if old is not None:
+                self._release(old)
+            self._resident[user] = entry
+            self._hold(entry)
+            self.loads += 1
+            # Least recently used out until the budget fits, but never the model just loaded
+            while self._bytes > self.budget and len(self._resident) > 1:
+                _, evicted = self._resident.popitem(last=False)
+                self._release(evicted)
+                self.evictions += 1
+            resident = len(self._resident)
+            own = self._own_bytes(entry)
+        log.info("Loaded model %s for %s", version, user, extra={"fields": {"own_bytes": own, "resident": resident}})
+        return entry
+
+    def _evict(self, user):
+        with self._lock:
+            entry = self._resident.pop(user, None)
+            if entry is not None:
+                self._release(entry)
+
+    def size(self):
+        with self._lock:
+            return {"bytes": self._bytes, "items": len(self._resident)}
+
+    def status(self):
+        with self._lock:
+            resident = {user: {"version": entry.version, "own_bytes": self._own_bytes(entry)}
+                        for user, entry in self._resident.items()}
+            used = self._bytes
+        return {
+            "budget_bytes": self.budget,
+            "used_bytes": used,
+            "resident": resident,
+            "pooled_trees": len(self.pool),
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+
+def from_config():
+    """Per-user serving, or None when USER_MODELS_DIR isn't set."""
+    if not config.USER_MODELS_DIR:
+        return None
+    return UserModels(config.USER_MODELS_DIR, int(config.USER_MODELS_BUDGET_MB * 2**20))
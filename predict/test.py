@@ -1,11 +1,17 @@
+import os
+import sys
+
 import joblib
-import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from predict.features import check_model, from_mapping, transform_one
 
 # Load the trained model
-model = joblib.load("procrastination_model.pkl")
+model = check_model(joblib.load("procrastination_model.pkl"))
 
-# Example: create a single test input
-example = pd.DataFrame([{
+# Example: create a single test input, as the model sees it
+example = transform_one(from_mapping({
     'Hour': 9,
     'Minute': 30,
     'Day of week': 1,
@@ -21,7 +27,7 @@ example = pd.DataFrame([{
     'Tempo': 80,
     'Energy': 0.3,
     'Minutes_Into_Day': 570
-}])
+}))
 
 # Make a prediction
 prediction = model.predict(example)
@@ -1,50 +1,208 @@
-import pandas as pd
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 import joblib
 
-def main():
-    productivity_data = pd.read_csv('productivity_data_enhanced.csv')
-
-    feature_columns = [
-        'Hour',
-        'Minute',
-        'Day of week',
-        'Keystrokes per min',
-        'Mouse moves per min',
-        'Mouse clicks per min',
-        'Productivity of Active Chrome Tabs',
-        'Total Minutes of Events Before',
-        'Total Minutes of Events After',
-        'Total Minutes to Next Event',
-        'Spotify',
-        'Danceability',
-        'Tempo',
-        'Energy',
-        'Minutes_Into_Day'
-    ]
-    
-    X = productivity_data[feature_columns].copy()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from predict import ingest
+from predict.features import FEATURE_COLUMNS, transform
+
+feature_columns = FEATURE_COLUMNS
+
+# The model train_model.py has always shipped
+DEFAULT_PARAMS = {'n_estimators': 100, 'max_depth': 10, 'min_samples_split': 5}
+
+# --search candidates: every combination is cross-validated
+SEARCH_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [6, 10, 16, None],
+    'min_samples_split': [2, 5, 10],
+}
+
+
+def load_data(path):
+    # Read in chunks with compact dtypes, then cleaned into the float64 rows the model is served
+    productivity_data = ingest.read_compact(path)
+
+    X = transform(productivity_data)
     y = productivity_data['Focus']
+    return X, y
 
-    # Handle -1 values (when Spotify is off)
-    X['Danceability'] = X['Danceability'].replace(-1, 0)
-    X['Tempo'] = X['Tempo'].replace(-1, 0)
-    X['Energy'] = X['Energy'].replace(-1, 0)
 
-    model = Pipeline([
+def build_model(params, random_state=42, n_jobs=None):
+    return Pipeline([
     ('scaler', StandardScaler()),
-    ('model', RandomForestClassifier(
-        n_estimators=100, max_depth=10, min_samples_split=5, random_state=42))
+    ('model', RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **params))
     ])
-    
+
+
+def cached_folds(X, y, n_splits, seed, cache_dir):
+    """
+    Stratified fold indices, stored on disk under a hash of the data, so every candidate and
+    every rerun on the same data is scored on identical splits.
+    """
+    digest = hashlib.sha1(X.tobytes())
+    digest.update(y.to_numpy().tobytes())
+    key = f"folds-{digest.hexdigest()[:16]}-{n_splits}-{seed}.npz"
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(path):
+        cached = np.load(path)
+        return [(cached[f"train{i}"], cached[f"test{i}"]) for i in range(n_splits)]
+
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed).split(X, y))
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, **{f"train{i}": train for i, (train, _) in enumerate(folds)},
+             **{f"test{i}": test for i, (_, test) in enumerate(folds)})
+    return folds
+
+
+# Set once per worker process by _init_worker, so the data isn't pickled for every candidate
+_worker_data = {}
+
+
+def _init_worker(X, y, folds):
+    _worker_data.update(X=X, y=y, folds=folds)
+
+
+def inference_latency_ms(model, row, repeats=50):
+    """Median latency of one single-row predict_proba, the way predict.py calls it."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def evaluate(params):
+    """Cross-validate one candidate. Runs in a worker process."""
+    X, y, folds = _worker_data['X'], _worker_data['y'], _worker_data['folds']
+    accuracies, aucs = [], []
+    fit_seconds = 0.0
+    model = None
+    for train, test in folds:
+        model = build_model(params, n_jobs=1)
+        start = time.perf_counter()
+        model.fit(X[train], y.iloc[train])
+        fit_seconds += time.perf_counter() - start
+        proba = model.predict_proba(X[test])[:, 1]
+        accuracies.append(accuracy_score(y.iloc[test], proba >= 0.5))
+        aucs.append(roc_auc_score(y.iloc[test], proba))
+
+    return {
+        'params': params,
+        'accuracy': float(np.mean(accuracies)),
+        'accuracy_std': float(np.std(accuracies)),
+        'roc_auc': float(np.mean(aucs)),
+        'model_kb': len(pickle.dumps(model)) / 1024,
+        'latency_ms': inference_latency_ms(model, X[:1]),
+        'fit_seconds': fit_seconds / len(folds)
+    }
+
+
+def search(X, y, args):
+    """Cross-validate every SEARCH_GRID candidate across a process pool. Returns results, best first."""
+    folds = cached_folds(X, y, args.folds, args.seed, args.cache_dir)
+    names = list(SEARCH_GRID)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*SEARCH_GRID.values())]
+    print(f"Cross-validating {len(candidates)} candidates x {args.folds} folds on {args.workers or os.cpu_count()} processes")
+
+    with ProcessPoolExecutor(max_workers=args.workers or None, initializer=_init_worker,
+                             initargs=(X, y, folds)) as pool:
+        results = list(pool.map(evaluate, candidates))
+
+    eligible = [r for r in results
+                if (not args.max_latency_ms or r['latency_ms'] <= args.max_latency_ms)
+                and (not args.max_size_kb or r['model_kb'] <= args.max_size_kb)]
+    if not eligible:
+        raise SystemExit("No candidate meets --max-latency-ms/--max-size-kb")
+    # Most accurate first; among equally accurate candidates, the smaller model
+    eligible.sort(key=lambda r: (-round(r['accuracy'], 4), r['model_kb']))
+    return eligible, results
+
+
+def print_results(results):
+    print(f"\n{'n_estimators':>12}{'max_depth':>10}{'min_split':>10}{'accuracy':>10}{'± std':>8}"
+          f"{'auc':>8}{'size KB':>10}{'infer ms':>10}{'fit s':>8}")
+    for r in sorted(results, key=lambda r: -r['accuracy']):
+        p = r['params']
+        print(f"{p['n_estimators']:>12}{str(p['max_depth']):>10}{p['min_samples_split']:>10}{r['accuracy']:>10.4f}"
+              f"{r['accuracy_std']:>8.4f}{r['roc_auc']:>8.4f}{r['model_kb']:>10.0f}{r['latency_ms']:>10.2f}"
+              f"{r['fit_seconds']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the procrastination model')
+    parser.add_argument('--data', default='productivity_data_enhanced.csv')
+    parser.add_argument('--output', default='procrastination_model.pkl')
+    parser.add_argument('--search', action='store_true',
+                        help='Cross-validated hyperparameter search instead of the default parameters')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=0, help='Search processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--holdout', type=float, default=0.2, help='Share held out to score the chosen model')
+    parser.add_argument('--max-latency-ms', type=float, help='Only consider candidates at most this slow')
+    parser.add_argument('--max-size-kb', type=float, help='Only consider candidates at most this big')
+    parser.add_argument('--cache-dir', default='.cv_cache', help='Where fold splits are cached')
+    parser.add_argument('--chunksize', type=int,
+                        help='Train out of core, this many rows at a time (see predict/ingest.py)')
+    args = parser.parse_args()
+
+    if args.chunksize:
+        # Data too big for memory: grow the default forest chunk by chunk instead
+        trees_per_chunk = max(1, DEFAULT_PARAMS['n_estimators'] * args.chunksize // max(1, ingest.count_rows(args.data)))
+        params = {k: v for k, v in DEFAULT_PARAMS.items() if k != 'n_estimators'}
+        joblib.dump(ingest.train_incremental(args.data, args.chunksize, trees_per_chunk, params), args.output)
+        return
+
+    X, y = load_data(args.data)
+
+    if not args.search:
+        model = build_model(DEFAULT_PARAMS)
+        model.fit(X, y)
+
+        # Save trained model
+        joblib.dump(model, args.output)
+        return
+
+    # Search on one part, then score the winner on data no candidate was chosen with
+    X_search, X_holdout, y_search, y_holdout = train_test_split(
+        X, y, test_size=args.holdout, stratify=y, random_state=args.seed)
+    ranked, results = search(X_search, y_search.reset_index(drop=True), args)
+    print_results(results)
+
+    best = ranked[0]
+    model = build_model(best['params'])
+    model.fit(X_search, y_search)
+    proba = model.predict_proba(X_holdout)[:, 1]
+    best['holdout_accuracy'] = float(accuracy_score(y_holdout, proba >= 0.5))
+    best['holdout_roc_auc'] = float(roc_auc_score(y_holdout, proba))
+    print(f"\nBest: {best['params']} (CV accuracy {best['accuracy']:.4f}, "
+          f"holdout accuracy {best['holdout_accuracy']:.4f}, AUC {best['holdout_roc_auc']:.4f})")
+
+    # The shipped model learns from everything
+    model = build_model(best['params'])
     model.fit(X, y)
+    joblib.dump(model, args.output)
 
-    # Save trained model
-    joblib.dump(model, 'procrastination_model.pkl')
+    metrics_path = os.path.splitext(args.output)[0] + '.metrics.json'
+    with open(metrics_path, 'w') as f:
+        json.dump({'best': best, 'candidates': results, 'folds': args.folds, 'rows': len(X)}, f, indent=2)
+    print(f"Saved {args.output} and {metrics_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,84 @@
+# Compact binary encoding of feature vectors and predictions, with JSON as the fallback
+"""
+A feature vector is 64 bytes instead of ~500 of JSON:
+
+    offset  size  field
+    0       2     magic b'PC'
+    2       1     schema version (predict.features.SCHEMA_VERSION)
+    3       1     kind: 1 = features, 2 = prediction
+    4       60    15 little-endian float32, in FEATURE_COLUMNS order
+
+A prediction is the same 4-byte header followed by one float32 probability.
+
+Both are sent with Content-Type: application/x-procrasticycle. A client asks for a binary
+prediction with that type in Accept; anything else gets JSON as before. Requests with any
+other content type are read as JSON, so older clients keep working.
+"""
+import json
+import struct
+
+from predict.features import FEATURE_COLUMNS, SCHEMA_VERSION, FeatureError, check, from_mapping
+
+CONTENT_TYPE = 'application/x-procrasticycle'
+MAGIC = b'PC'
+FEATURES = 1
+PREDICTION = 2
+
+_header = struct.Struct('<2sBB')
+_features = struct.Struct(f'<2sBB{len(FEATURE_COLUMNS)}f')
+_prediction = struct.Struct('<2sBBf')
+
+
+class WireError(FeatureError):
+    pass
+
+
+def _unpack(layout, kind, body):
+    if len(body) != layout.size:
+        raise WireError(f"Expected {layout.size} bytes, got {len(body)}")
+    magic, version, found, *values = layout.unpack(body)
+    if magic != MAGIC:
+        raise WireError("Not a ProcrastiCycle message")
+    if version != SCHEMA_VERSION:
+        raise WireError(f"Schema version {version} is not supported, expected {SCHEMA_VERSION}")
+    if found != kind:
+        raise WireError(f"Expected message kind {kind}, got {found}")
+    return values
+
+
+def encode_features(vector):
+    return _features.pack(MAGIC, SCHEMA_VERSION, FEATURES, *vector)
+
+
+def decode_features(body):
+    return check(_unpack(_features, FEATURES, body))
+
+
+def encode_prediction(probability):
+    return _prediction.pack(MAGIC, SCHEMA_VERSION, PREDICTION, probability)
+
+
+def decode_prediction(body):
+    return _unpack(_prediction, PREDICTION, body)[0]
+
+
+def is_binary(request):
+    return request.mimetype == CONTENT_TYPE
+
+
+def wants_binary(request):
+    return CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def read_features(request):
+    """Feature vector from a Flask request in either format. Raises FeatureError."""
+    if is_binary(request):
+        return decode_features(request.get_data(cache=False))
+    return from_mapping(request.get_json(silent=True))
+
+
+def read_prediction(content, default=0.5):
+    """Probability from a /predict response body, binary or JSON."""
+    if content[:len(MAGIC)] == MAGIC:
+        return decode_prediction(content)
+    return json.loads(content).get('prediction', default)
@@ -0,0 +1,66 @@
+# Bounded thread-pool fan-out for handlers that call several independent upstreams
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import config
+from observability.log import get_logger
+
+log = get_logger('fanout')
+
+# Shared by every request so concurrent handlers can't spawn unbounded threads
+_executor = ThreadPoolExecutor(max_workers=config.FANOUT_WORKERS, thread_name_prefix='fanout')
+
+
+def fan_out(calls, defaults=None):
+    """
+    Run independent upstream calls concurrently and collect their results.
+
+    calls maps a name to (function, timeout_seconds). Every call starts at once, so the handler
+    waits for the slowest call (capped by its timeout), not for the sum of all of them.
+    A call that raises or misses its deadline is logged and gets defaults.get(name) instead.
+    A call that overruns keeps running in the background, but nothing waits for it.
+
+    Returns {name: result}.
+    """
+    defaults = defaults or {}
+    start = time.monotonic()
+    futures = {name: (_executor.submit(function), timeout) for name, (function, timeout) in calls.items()}
+
+    results = {}
+    # Collect in deadline order so each wait only covers time not already spent
+    for name, (future, timeout) in sorted(futures.items(), key=lambda item: item[1][1]):
+        remaining = max(0.0, start + timeout - time.monotonic())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except TimeoutError:
+            future.cancel()
+            log.warning("%s timed out after %ss", name, timeout)
+            results[name] = defaults.get(name)
+        except Exception as e:
+            log.error("%s failed: %s", name, e)
+            results[name] = defaults.get(name)
+    return results
+
+
+def with_timeout(function, timeout, default=None, name='call'):
+    """Run one blocking upstream call with a deadline, returning default if it fails or overruns."""
+    return fan_out({name: (function, timeout)}, defaults={name: default})[name]
+
+
+def submit(function):
+    """Start one upstream call on the shared pool and return its Future, for callers that share it."""
+    return _executor.submit(function)
+
+
+def wait(future, timeout, default=None, name='call'):
+    """
+    A submitted call's result, or default if it fails or isn't done within timeout. The call
+    isn't cancelled when this gives up: other callers may be waiting for the same future.
+    """
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        log.warning("%s timed out after %ss", name, timeout)
+    except Exception as e:
+        log.error("%s failed: %s", name, e)
+    return default
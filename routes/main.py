@@ -4,47 +4,46 @@ import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import datetime
+import logging
+import re
+import threading
 import webbrowser
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+from flask import Blueprint, Flask, current_app, jsonify, request
+import config
 from spotify import auth
 from GC.auth import calendarAuth
 from GC.client import calendarClient
 import requests
-import google.generativeai as genai
+import upstreams
+from history.app import bp as history_bp, history
+from observability import memory, metrics, profiling
+from observability.admin import init_cors
+from observability.app import bp as metrics_bp
+from observability.log import get_logger
+from predict import wire
+from predict.features import FeatureError, transform_one
+from routes.fanout import fan_out, submit, wait
+from templates.dashboard import bp as dashboard_bp
 from trackers.keyboard_mouse import tracker
 
-FEATURE_COLUMNS = [
-    'Hour',
-    'Minute',
-    'Day of week',
-    'Keystrokes per min',
-    'Mouse moves per min',
-    'Mouse clicks per min',
-    'Productivity of Active Chrome Tabs',
-    'Total Minutes of Events Before',
-    'Total Minutes of Events After',
-    'Total Minutes to Next Event',
-    'Spotify',
-    'Danceability',
-    'Tempo',
-    'Energy',
-    'Minutes_Into_Day'
-]
-
-app = Flask(__name__)
-CORS(app)
+bp = Blueprint('main', __name__)
+log = get_logger('gateway')
 
 auth_storage = {}
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+config.configure_gemini()
+
+# Offline Spotify needs no OAuth round trip, so start out "logged in"
+if upstreams.is_offline('spotify'):
+    auth_storage['token'] = 'offline-token'
+    auth_storage['ready'] = True
 
 def analyze_tabs_with_gemini(urls: list) -> float:
     """
     Analyze productivity of tab URLs using Gemini.
     Returns average score between 0 and 1.
     """
-    if not os.getenv("GOOGLE_API_KEY"):
-        print("⚠️ No Gemini API key, returning default score")
+    if not config.GOOGLE_API_KEY and not upstreams.is_offline('gemini'):
+        log.warning("No Gemini API key, returning default score")
         return 0.5
     
     try:
@@ -64,7 +63,7 @@ Scoring:
 Return ONLY a single number between 0.0 and 1.0, nothing else.
 Example: 0.73"""
 
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = upstreams.gemini_model('gemini-2.5-flash')
         response = model.generate_content(prompt)
         
         # Extract the number
@@ -79,22 +78,21 @@ Example: 0.73"""
             if numbers:
                 score = float(numbers[0])
             else:
-                print(f"⚠️ Could not parse score from: {response_text}")
+                log.warning("Could not parse score from: %r", response_text)
                 return 0.5
         
         # Ensure it's within bounds
         score = max(0.0, min(1.0, score))
         
-        print(f"✅ Productivity score: {score}")
+        log.debug("Productivity score: %s", score)
         return score
         
     except Exception as e:
-        print(f"❌ Gemini error: {e}")
-        time.sleep(5)
+        log.error("Gemini error: %s", e)
         return 0.5
 
 
-@app.route('/open_spotify', methods=['GET'])
+@bp.route('/open_spotify', methods=['GET'])
 def start_auth():
     auth_url = auth.get_auth_url()
     webbrowser.open(auth_url)
@@ -102,7 +100,7 @@ def start_auth():
     return jsonify({"message": "Opened Spotify auth URL", "url": auth_url})
 
 
-@app.route('/callback', methods=['GET'])
+@bp.route('/callback', methods=['GET'])
 def callback():
     code = request.args.get('code')
     error = request.args.get('error')
@@ -130,31 +128,32 @@ def callback():
         auth_storage['ready'] = True
         
         try:
-            # Get currently playing
-            print("\n--- Currently Playing ---")
-            currently_playing = auth.get_currently_playing(token)
-            
+            # Currently playing and the queue are independent: fetch them together
+            spotify = fan_out({
+                "currently_playing": (lambda: auth.get_currently_playing(token), config.SPOTIFY_TIMEOUT),
+                "queue": (lambda: auth.get_current_queue(token), config.SPOTIFY_TIMEOUT)
+            })
+            currently_playing = spotify["currently_playing"]
+            queue = spotify["queue"]
+
             if currently_playing and "item" in currently_playing:
                 track = currently_playing["item"]
-                print(f"Track: {track['name']}")
-                print(f"Artist: {track['artists'][0]['name']}")
-                print(f"ID: {track['id']}")
-                
+                log.info("Currently playing", extra={"fields": {
+                    "track": track['name'], "artist": track['artists'][0]['name'], "track_id": track['id']
+                }})
             else:
-                print("No track currently playing")
-            
-            # Get queue
-            print("\n--- Queue ---")
-            queue = auth.get_current_queue(token)
+                log.info("No track currently playing")
+
             if queue and "queue" in queue:
-                print(f"Number of tracks in queue: {len(queue['queue'])}")
-                for i, track in enumerate(queue["queue"][:10], 1):  # Show first 10
-                    print(f"{i}. {track['name']} - {track['artists'][0]['name']}")
+                fields = {"queue_length": len(queue['queue'])}
+                if log.isEnabledFor(logging.DEBUG):
+                    fields["next"] = [f"{t['name']} - {t['artists'][0]['name']}" for t in queue["queue"][:10]]
+                log.info("Spotify queue", extra={"fields": fields})
             else:
-                print("No queue data available")
-                
+                log.info("No queue data available")
+
         except Exception as e:
-            print(f"\n❌ Error calling Spotify functions: {e}")
+            log.error("Error calling Spotify functions: %s", e)
         
         return """
         <html>
@@ -169,7 +168,7 @@ def callback():
 
 
     
-@app.route('/get_track_info', methods=['GET'])
+@bp.route('/get_track_info', methods=['GET'])
 def get_track_info():
     """
     API endpoint to check if Spotify is authorized and get current track info.
@@ -188,11 +187,8 @@ def get_track_info():
         if currently_playing and "item" in currently_playing:
             track = currently_playing["item"]
             
-            # Get AI-generated audio features
-            music_features = auth.analyze_track_with_gemini(
-                track['name'], 
-                track['artists'][0]['name']
-            )
+            # Get AI-generated audio features (shares the cache with /get_music_features)
+            music_features = get_track_features(track)
             
             # Return track info and features
             return jsonify({
@@ -214,7 +210,7 @@ def get_track_info():
             }), 200
             
     except Exception as e:
-        print(f"Error in get_track_info: {e}")
+        log.error("Error in get_track_info: %s", e)
         return jsonify({
             "error": str(e),
             "authenticated": False
@@ -223,10 +219,55 @@ def get_track_info():
 
 last_analyzed_track = {"id": None, "features": None, "timestamp": 0}
 
-@app.route('/get_music_features', methods=['GET'])
-def get_music_features():
+# The Gemini call in flight per track id: every request for the track waits on the same one
+_track_analyses = {}
+_track_analyses_lock = threading.Lock()
+
+def _analyze_track(track):
+    """Gemini's features for track, cached as soon as they arrive, whether or not anyone still waits."""
     global last_analyzed_track
-    
+    features = auth.analyze_track_with_gemini(track["name"], track["artists"][0]["name"])
+    if features is not None:
+        last_analyzed_track = {
+            "id": track["id"],
+            "features": features,
+            "timestamp": time.time()
+        }
+    return features
+
+def _analysis_done(track_id, future):
+    with _track_analyses_lock:
+        if _track_analyses.get(track_id) is future:
+            del _track_analyses[track_id]
+
+def get_track_features(track):
+    """
+    Gemini audio features for a track, cached until the track changes or 30 minutes pass.
+    Requests wait at most GEMINI_TIMEOUT seconds, and get None if Gemini fails or takes longer.
+    There is one Gemini call per track at a time, and its result is cached whenever it arrives,
+    so polling a slow track doesn't pile up calls on the fan-out pool.
+    """
+    # 🔹 Only call Gemini if track changed or cache expired
+    if (last_analyzed_track["id"] == track["id"] and
+        time.time() - last_analyzed_track["timestamp"] <= 1800):  # 30 min cache
+        log.debug("Using cached Gemini features for %s", track['name'])
+        metrics.cache_hit('track_features')
+        return last_analyzed_track["features"]
+    metrics.cache_miss('track_features')
+
+    with _track_analyses_lock:
+        future = _track_analyses.get(track["id"])
+        started = future is None
+        if started:
+            log.info("New track detected, analyzing with Gemini: %s", track['name'])
+            future = _track_analyses[track["id"]] = submit(lambda: _analyze_track(track))
+    if started:
+        # Outside the lock: a call that has already finished runs the callback right here
+        future.add_done_callback(lambda done, track_id=track["id"]: _analysis_done(track_id, done))
+    return wait(future, config.GEMINI_TIMEOUT, name="gemini")
+
+@bp.route('/get_music_features', methods=['GET'])
+def get_music_features():
     if 'token' not in auth_storage:
         return jsonify({"error": "Not authenticated"}), 401
 
@@ -237,21 +278,10 @@ def get_music_features():
         return jsonify({"success": False, "error": "No track currently playing"}), 404
 
     track = currently_playing["item"]
-    track_id = track["id"]
-
-    # 🔹 Only call Gemini if track changed or cache expired
-    if (last_analyzed_track["id"] != track_id or 
-        time.time() - last_analyzed_track["timestamp"] > 1800):  # 30 min cache
-        print(f"🎵 New track detected, analyzing with Gemini: {track['name']}")
-        features = auth.analyze_track_with_gemini(track["name"], track["artists"][0]["name"])
-        last_analyzed_track = {
-            "id": track_id,
-            "features": features,
-            "timestamp": time.time()
-        }
-    else:
-        print(f"♻️ Using cached Gemini features for {track['name']}")
-        features = last_analyzed_track["features"]
+    features = get_track_features(track)
+    if history is not None and features:
+        history.record('music', danceability=features.get('danceability'), tempo=features.get('tempo'),
+                       energy=features.get('energy'))
 
     return jsonify({
         "success": True,
@@ -261,7 +291,7 @@ def get_music_features():
     }), 200
 
     
-@app.route('/get_active_tabs', methods=['POST'])
+@bp.route('/get_active_tabs', methods=['POST'])
 def get_active_tabs():
     """Analyze tab productivity"""
     try:
@@ -275,12 +305,12 @@ def get_active_tabs():
         if not urls:
             return jsonify({'success': False, 'error': 'No valid URLs'}), 400
         
-        print(f"\n📊 Analyzing {len(urls)} tabs...")
-        
         # Get score from Gemini
         score = analyze_tabs_with_gemini(urls)
-        
-        print(f"   Score: {score} ({(score * 100):.0f}% productive)\n")
+
+        log.info("Tabs analyzed", extra={"fields": {"urls_count": len(urls), "score": score}})
+        if history is not None:
+            history.record('tabs', score=score, urls=len(urls))
         
         return jsonify({
             'success': True,
@@ -290,10 +320,15 @@ def get_active_tabs():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        log.error("Error in get_active_tabs: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
     
-@app.route('/check_calendar_auth', methods=['GET'])
+# What a calendar call that failed or missed its deadline looks like: the client's own error shape
+CALENDAR_TIMEOUT_DEFAULTS = {
+    name: {"error": "Calendar request timed out"} for name in ("today", "next_event", "day_analysis")
+}
+
+@bp.route('/check_calendar_auth', methods=['GET'])
 def check_calendar_auth():
     """
     Frontend endpoint: checks if Google Calendar is authenticated.
@@ -320,7 +355,7 @@ def check_calendar_auth():
             }), 401
 
     except Exception as e:
-        print(f"❌ Error checking calendar auth: {e}")
+        log.error("Error checking calendar auth: %s", e)
         return jsonify({
             "authenticated": False,
             "error": str(e)
@@ -332,7 +367,12 @@ def check_calendar_auth():
 calendar_auth = calendarAuth()
 calendar_client = calendarClient()
 
-@app.route('/open_calendar', methods = ['GET'])
+# What this module keeps in memory, for /admin/memory
+memory.register('gateway.auth_storage', lambda: auth_storage)
+memory.register('gemini.track_features', lambda: last_analyzed_track)
+memory.register('calendar.client', lambda: [calendar_client.calendar_ids, calendar_client._resolved_ids])
+
+@bp.route('/open_calendar', methods = ['GET'])
 def start_calendar_auth():
     result = calendar_auth.get_auth_url()
 
@@ -347,7 +387,7 @@ def start_calendar_auth():
         "url": result['auth_url']
     })
 
-@app.route('/calendar/callback', methods = ['GET'])
+@bp.route('/calendar/callback', methods = ['GET'])
 def calendar_callback():
     #Get full callback  URL
     authorization_response = request.url
@@ -377,27 +417,28 @@ def calendar_callback():
         auth_storage['calendar_ready'] = True
 
         try:
-            print("\n📅 --- Google Calendar Events ---")
-
-            #Get new event
-            next_event_result = calendar_client.get_next_event()
+            calendar = fan_out({
+                "next_event": (calendar_client.get_next_event, config.CALENDAR_TIMEOUT),
+                "today": (calendar_client.get_todays_events, config.CALENDAR_TIMEOUT)
+            }, defaults=CALENDAR_TIMEOUT_DEFAULTS)
+            next_event_result = calendar["next_event"]
+            today_result = calendar["today"]
 
             if next_event_result.get("event"):
-                event = next_event_result["event"]
-                minutes = next_event_result.get("minutes_until")
-                print(f"Next event: {event['summary']}")
-                print(f"Starts in: {minutes} minutes")
+                log.info("Next event", extra={"fields": {
+                    "summary": next_event_result["event"]["summary"],
+                    "minutes_until": next_event_result.get("minutes_until")
+                }})
             else:
-                print("No upcoming events")
-            
-            # Get today's events
-            today_result = calendar_client.get_todays_events()
+                log.info("No upcoming events")
+
             if today_result.get("status") == "success":
-                print(f"Events today: {today_result['count']}")
-                for ev in today_result['events'][:5]:  # Show first 5
-                    print(f"  • {ev['summary']} at {ev['start']}")
+                fields = {"count": today_result['count']}
+                if log.isEnabledFor(logging.DEBUG):
+                    fields["first"] = [f"{ev['summary']} at {ev['start']}" for ev in today_result['events'][:5]]
+                log.info("Events today", extra={"fields": fields})
         except Exception as e:
-            print(f"❌ Error with Calendar: {e}")
+            log.error("Error with Calendar: %s", e)
         
         return """
         <html>
@@ -417,30 +458,36 @@ def calendar_callback():
         </html>
         """, 400   
 
-@app.route('/get_calendar_analysis', methods=['GET'])
+@bp.route('/get_calendar_analysis', methods=['GET'])
 def get_calendar_analysis():
     """Get calendar schedule analysis for procrastination detection"""
     if not calendar_client.is_authenticated():
         return jsonify({"error": "Not authenticated"}), 401
     
+    # ?busy_only=1 uses the free/busy query: cheaper, but no event count or breakdown
+    busy_only = request.args.get('busy_only', '').lower() in ('1', 'true', 'yes')
+
     try:
-        # Get day schedule analysis
-        day_analysis = calendar_client.get_day_schedule_analysis()
-        
+        # Day schedule analysis and next event, fetched concurrently
+        calendar = fan_out({
+            "day_analysis": (calendar_client.get_busy_analysis if busy_only
+                             else calendar_client.get_day_schedule_analysis, config.CALENDAR_TIMEOUT),
+            "next_event": (calendar_client.get_next_event, config.CALENDAR_TIMEOUT)
+        }, defaults=CALENDAR_TIMEOUT_DEFAULTS)
+        day_analysis = calendar["day_analysis"]
+        next_event = calendar["next_event"]
+
         if day_analysis.get("status") == "success":
-            # Get next event
-            next_event = calendar_client.get_next_event()
-            
             # Build response
             response = {
                 "success": True,
                 "date": day_analysis['date'],
                 "schedule": {
-                    "total_events": day_analysis['total_events'],
+                    "total_events": day_analysis.get('total_events'),
                     "total_hours": day_analysis['total_hours'],
                     "busy_percentage": day_analysis['busy_percentage'],
                     "free_hours": day_analysis['free_time_hours'],
-                    "breakdown": day_analysis['breakdown']
+                    "breakdown": day_analysis.get('breakdown')
                 }
             }
             
@@ -462,14 +509,14 @@ def get_calendar_analysis():
             }), 500
             
     except Exception as e:
-        print(f"Error in get_calendar_analysis: {e}")
+        log.error("Error in get_calendar_analysis: %s", e)
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
-@app.route('/get_next_event', methods=['GET'])
+@bp.route('/get_next_event', methods=['GET'])
 def get_next_event_route():
     """Get only the next upcoming event"""
     if not calendar_client.is_authenticated():
@@ -498,14 +545,14 @@ def get_next_event_route():
             }), 404
             
     except Exception as e:
-        print(f"Error in get_next_event: {e}")
+        log.error("Error in get_next_event: %s", e)
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
-@app.route('/get_today_schedule', methods=['GET'])
+@bp.route('/get_today_schedule', methods=['GET'])
 def get_today_schedule():
     """Get simplified today's schedule"""
     if not calendar_client.is_authenticated():
@@ -534,14 +581,49 @@ def get_today_schedule():
             }), 500
             
     except Exception as e:
-        print(f"Error in get_today_schedule: {e}")
+        log.error("Error in get_today_schedule: %s", e)
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
-@app.route('/check_calendar_status', methods=['GET'])
+@bp.route('/get_calendars', methods=['GET'])
+def get_calendars():
+    """List the user's calendars and which ones are being aggregated"""
+    if not calendar_client.is_authenticated():
+        return jsonify({"error": "Not authenticated"}), 401
+
+    result = calendar_client.list_calendars()
+    if "error" in result:
+        return jsonify({"success": False, "error": result["error"]}), 500
+
+    return jsonify({
+        "success": True,
+        "calendars": result["calendars"],
+        "active": result["active"]
+    }), 200
+
+
+@bp.route('/select_calendars', methods=['POST'])
+def select_calendars():
+    """Choose the calendars to aggregate: a list of IDs, "selected" or "all" """
+    data = request.get_json() or {}
+    calendar_ids = data.get('calendar_ids')
+
+    if calendar_ids not in ('selected', 'all') and not (
+        isinstance(calendar_ids, list) and calendar_ids and all(isinstance(c, str) and c for c in calendar_ids)
+    ):
+        return jsonify({
+            "success": False,
+            "error": 'calendar_ids must be a non-empty list of IDs, "selected" or "all"'
+        }), 400
+
+    calendar_client.set_calendars(calendar_ids)
+    return jsonify({"success": True, "calendar_ids": calendar_ids}), 200
+
+
+@bp.route('/check_calendar_status', methods=['GET'])
 def check_calendar_status():
     """Check if calendar is connected (like checking Spotify auth)"""
     is_connected = calendar_client.is_authenticated()
@@ -552,27 +634,26 @@ def check_calendar_status():
         "message": "Calendar connected" if is_connected else "Calendar not connected"
     }), 200    
 
-@app.route('/get_calendar_events', methods=['GET'])
-@app.route('/get_calendar_events', methods=['GET'])
+@bp.route('/get_calendar_events', methods=['GET'])
 def get_calendar_events():
-    print("\n📅 [DEBUG] /get_calendar_events endpoint called")
-
     if not calendar_client.is_authenticated():
-        print("❌ Calendar not authenticated")
+        log.warning("Calendar not authenticated")
         return jsonify({
             "status": "error",
             "error": "Google Calendar not authenticated"
         }), 401
     
     try:
-        print("📅 Fetching today's events...")
-        today_result = calendar_client.get_todays_events()
-        print("📅 Fetching next event...")
-        next_event_result = calendar_client.get_next_event()
-
-        print("📅 Results fetched from client")
+        calendar = fan_out({
+            "today": (calendar_client.get_todays_events, config.CALENDAR_TIMEOUT),
+            "next_event": (calendar_client.get_next_event, config.CALENDAR_TIMEOUT)
+        }, defaults=CALENDAR_TIMEOUT_DEFAULTS)
+        today_result = calendar["today"]
+        next_event_result = calendar["next_event"]
 
         if today_result.get("status") == "success":
+            if history is not None:
+                history.record_events(today_result["events"])
             response = {
                 "status": "success",
                 "count": today_result["count"],
@@ -582,102 +663,129 @@ def get_calendar_events():
             if next_event_result.get("event"):
                 response["next_event"] = next_event_result["event"]
                 response["minutes_until"] = next_event_result.get("minutes_until")
-                print(f"✅ Found next event: {response['next_event']['summary']}")
+                log.debug("Found next event: %s", response['next_event']['summary'])
             else:
                 response["next_event"] = None
-                print("ℹ️ No upcoming events found")
+                log.debug("No upcoming events found")
 
             return jsonify(response), 200
         else:
-            print("⚠️ Failed to fetch events")
+            log.warning("Failed to fetch events: %s", today_result.get("error"))
             return jsonify({
                 "status": "error",
                 "error": "Failed to fetch events"
             }), 500
 
     except Exception as e:
-        print(f"❌ Exception in /get_calendar_events: {e}")
+        log.error("Exception in /get_calendar_events: %s", e)
         return jsonify({
             "status": "error",
             "error": str(e)
         }), 500
     
-@app.route('/get_procrastination_prediction', methods=['POST'])
+@bp.route('/get_procrastination_prediction', methods=['POST'])
 def get_procrastination_prediction():
     """
     Receives all collected data (music, tabs, calendar, activity)
     and forwards to ML model for procrastination prediction.
     """
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = FEATURE_COLUMNS
-        
-        print(f"\n🤖 Received prediction request")
-        print(f"   Features: {list(data.keys())}")
-        
-        # Forward to predict.py ML service
+        # JSON features or a binary vector (predict/wire.py), validated before anything is forwarded
         try:
-            ml_response = requests.post(
-                'http://127.0.0.1:5001/predict',
-                json=data,
-                timeout=5
-            )
-            
-            if ml_response.status_code == 200:
-                ml_data = ml_response.json()
-                prediction = ml_data.get('prediction', 0.5)
-                
-                print(f"✅ ML Prediction: {prediction:.2f}")
-                print(f"   Procrastination probability: {(prediction * 100):.0f}%\n")
-                
-                return jsonify({
-                    'success': True,
-                    'prediction': prediction,
-                    'procrastinating': prediction > 0.7,  # Threshold
-                    'timestamp': datetime.datetime.now().isoformat()
-                }), 200
+            vector = wire.read_features(request)
+        except FeatureError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        # Cleaned like the training data, so what is forwarded, scored and recorded is the model's input
+        vector = transform_one(vector)[0].tolist()
+
+        # Personal model if predict.py has one for this user, the global model otherwise
+        user = request.headers.get('X-User-Id')
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Received prediction request", extra={"fields": {"binary": wire.is_binary(request), "user": user}})
+
+        try:
+            # Served by server.py alongside predict.py: call the model directly instead of over localhost
+            local_predict = current_app.config.get('ML_PREDICT')
+            if local_predict is not None and upstreams.mode('ml') == 'live':
+                with metrics.upstream_call('ml', 'in_process'):
+                    prediction = local_predict(vector, user)
             else:
-                print(f"❌ ML service error: {ml_response.status_code}")
-                return jsonify({
-                    'success': False,
-                    'error': 'ML prediction service error'
-                }), 500
+                # Forward to predict.py ML service as a 64-byte vector. Recorded cassettes store
+                # text bodies, so only a live service is asked for a binary answer
+                headers = {
+                    'Content-Type': wire.CONTENT_TYPE,
+                    'Accept': wire.CONTENT_TYPE if upstreams.mode('ml') == 'live' else 'application/json'
+                }
+                if user:
+                    headers['X-User-Id'] = user
+                ml_response = upstreams.http('ml').post(
+                    config.ML_SERVICE_URL,
+                    data=wire.encode_features(vector),
+                    headers=headers,
+                    timeout=5
+                )
+
+                if ml_response.status_code != 200:
+                    log.error("ML service error: %s", ml_response.status_code)
+                    return jsonify({
+                        'success': False,
+                        'error': 'ML prediction service error'
+                    }), 500
+
+                prediction = wire.read_prediction(ml_response.content)
+
+            log.info("Prediction", extra={"fields": {"probability": round(prediction, 4)}})
+            if history is not None:
+                history.record('prediction', probability=prediction, procrastinating=prediction > 0.7,
+                               features=vector)
+
+            return jsonify({
+                'success': True,
+                'prediction': prediction,
+                'procrastinating': prediction > 0.7,  # Threshold
+                'timestamp': datetime.datetime.now().isoformat()
+            }), 200
                 
         except requests.exceptions.ConnectionError:
-            print("❌ Cannot connect to ML service at http://127.0.0.1:5000")
-            print("   Make sure predict.py is running!")
+            log.error("Cannot connect to ML service at %s: make sure predict.py is running, "
+                      "or run everything with server.py", config.ML_SERVICE_URL)
             return jsonify({
                 'success': False,
                 'error': 'ML service not available',
-                'hint': 'Start predict.py on port 5000'
+                'hint': 'Start predict.py on port 5001 or run server.py'
             }), 503
             
         except Exception as e:
-            print(f"❌ Error calling ML service: {e}")
+            log.error("Error calling ML service: %s", e)
             return jsonify({
                 'success': False,
                 'error': str(e)
             }), 500
             
     except Exception as e:
-        print(f"❌ Error in prediction endpoint: {e}")
+        log.error("Error in prediction endpoint: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
     
-@app.route('/api/activity', methods=['GET'])
+@bp.route('/api/activity', methods=['GET'])
 def get_activity():
     """API endpoint to get current activity stats"""
     stats = tracker.get_stats()
+    if history is not None and tracker.running:
+        history.record('activity', keystrokes=stats['keystrokes_per_minute'],
+                       mouse_moves=stats['mouse_moves_per_minute'], mouse_clicks=stats['mouse_clicks_per_minute'])
     stats['timestamp'] = datetime.datetime.now().isoformat()
     stats['is_running'] = tracker.running
     return jsonify(stats)
 
 
-@app.route('/api/start_activity', methods=['POST'])
+@bp.route('/api/start_activity', methods=['POST'])
 def start_activity_tracking():
     """Start activity tracking when session starts"""
     try:
@@ -700,7 +808,7 @@ def start_activity_tracking():
         }), 500
 
 
-@app.route('/api/stop_activity', methods=['POST'])
+@bp.route('/api/stop_activity', methods=['POST'])
 def stop_activity_tracking():
     """Stop activity tracking when session ends"""
     try:
@@ -722,6 +830,17 @@ def stop_activity_tracking():
             "message": f"Error: {str(e)}"
         }), 500
 
+# Standalone gateway. server.py serves this blueprint together with the tracker, prediction and tab services.
+app = Flask(__name__)
+init_cors(app)
+app.register_blueprint(bp)
+app.register_blueprint(history_bp)
+app.register_blueprint(dashboard_bp)
+metrics.init_app(app)
+profiling.init_app(app)
+memory.init_app(app)
+app.register_blueprint(metrics_bp)
+
 if __name__ == '__main__':
     print("Starting Flask server on http://127.0.0.1:8888")
     app.run(host='127.0.0.1', port=8888, debug=True)
\ No newline at end of file
@@ -2,12 +2,52 @@ from flask import Flask, render_template, request
 from waitress import serve
 import os
 
-app = Flask(__name__)
+import config
+
 
-@app.route('/')
-@app.route('/index')
 def index():
     return render_template('index.html')
 
+
+def create_app():
+    """
+    One app for everything that used to run as four processes: the gateway (routes/main.py),
+    the activity tracker API (trackers/app.py), the prediction service (predict/predict.py) and
+    the tab scorer (tabs/app.py). They share one tracker, one Gemini configuration and their
+    caches in memory, and the gateway calls the model directly instead of over localhost.
+    """
+    from routes.main import bp as main_bp
+    from trackers.app import bp as tracker_bp
+    from predict.predict import bp as predict_bp, predict_vector
+    from tabs.app import bp as tabs_bp
+    from history.app import bp as history_bp
+    from templates.dashboard import bp as dashboard_bp
+    from observability import memory, metrics, profiling
+    from observability.admin import init_cors
+    from observability.app import bp as observability_bp
+
+    app = Flask(__name__)
+    init_cors(app)
+
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/index', 'index', index)
+
+    # The gateway goes first so its /api/activity wins over the tracker API's identical route
+    app.register_blueprint(main_bp)
+    app.register_blueprint(tracker_bp)
+    app.register_blueprint(predict_bp)
+    app.register_blueprint(tabs_bp)
+    app.register_blueprint(history_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(observability_bp)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    memory.init_app(app)
+
+    app.config['ML_PREDICT'] = predict_vector
+    return app
+
+
 if __name__ == '__main__':
-    serve(app, host="0.0.0.0", port = 8000)
\ No newline at end of file
+    print(f"Starting ProcrastiCycle on http://{config.HOST}:{config.PORT} ({config.WAITRESS_THREADS} threads)")
+    serve(create_app(), host=config.HOST, port=config.PORT, threads=config.WAITRESS_THREADS)
@@ -1,16 +1,17 @@
-import time
 from dotenv import load_dotenv
 import os
 import base64
-from requests import post, get
 from urllib.parse import urlencode
 import json
 import webbrowser
 import google.generativeai as genai
+import config
+import upstreams
+from observability.log import get_logger
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+config.configure_gemini()
 
 client_id = os.getenv("SPOTIFY_CLIENT_ID")
 client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
@@ -19,6 +20,8 @@ redirect_uri = "http://127.0.0.1:8888/callback"
 # Define what permissions you're requesting
 scopes = "user-read-playback-state user-read-currently-playing user-read-email"
 
+log = get_logger('spotify')
+
 
 def analyze_track_with_gemini(track_name, artist_name):
     """Use Gemini to analyze track characteristics"""
@@ -34,7 +37,7 @@ Return ONLY a valid JSON object with these exact keys, no other text or explanat
 {{"energy": 0.0, "danceability": 0.0, "tempo": 120}}"""
 
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = upstreams.gemini_model('gemini-2.5-flash')
         response = model.generate_content(prompt)
         
         # Extract JSON from response
@@ -51,9 +54,8 @@ Return ONLY a valid JSON object with these exact keys, no other text or explanat
         audio_features = json.loads(response_text)
         return audio_features
     except Exception as e:
-        print(f"Error analyzing with Gemini: {e}")
-        print(f"Response was: {response.text if 'response' in locals() else 'No response'}")
-        time.sleep(60)
+        log.warning("Error analyzing %r with Gemini: %s", track_name, e)
+        log.debug("Gemini response was: %r", response.text if 'response' in locals() else None)
         return None
     
 def list_available_models():
@@ -89,13 +91,13 @@ def get_token_from_code(auth_code):
         "code": auth_code,
         "redirect_uri": redirect_uri    
     }
-    result = post(url, headers= headers, data= data)
+    result = upstreams.http('spotify').post(url, headers= headers, data= data)
     json_result = json.loads(result.content)
     
     if "access_token" in json_result:
         return json_result["access_token"]
     else:
-        print("Error:", json_result)
+        log.error("Spotify token exchange failed: %s", json_result.get("error", json_result))
         return None
 
 def get_auth_header(token):
@@ -104,36 +106,40 @@ def get_auth_header(token):
 def get_current_queue(token):
     url = "https://api.spotify.com/v1/me/player/queue"
     headers = get_auth_header(token)
-    result = get(url, headers = headers)
+    result = upstreams.http('spotify').get(url, headers = headers)
     
     if result.status_code == 200:
         json_result = json.loads(result.content)
         return json_result
+    elif result.status_code == 204:
+        log.debug("Nothing playing on Spotify (%s)", url)
+        return None
     else:
-        print(f"Error {result.status_code}: {result.content}")
+        log.warning("Spotify %s returned %s: %s", url, result.status_code, result.content[:200])
         return None
     
 def get_currently_playing(token):
     url = "https://api.spotify.com/v1/me/player/currently-playing"
     headers = get_auth_header(token)
-    result = get(url, headers=headers)
+    result = upstreams.http('spotify').get(url, headers=headers)
 
     if result.status_code == 200:
         json_result = json.loads(result.content)
         return json_result
+    elif result.status_code == 204:
+        log.debug("Nothing playing on Spotify (%s)", url)
+        return None
     else:
-        print(f"Error {result.status_code}: {result.content}")
+        log.warning("Spotify %s returned %s: %s", url, result.status_code, result.content[:200])
         return None
     
 def get_client_token():
-    import requests, base64
-
     auth_url = "https://accounts.spotify.com/api/token"
     auth_header = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
     headers = {"Authorization": f"Basic {auth_header}"}
     data = {"grant_type": "client_credentials"}
 
-    result = requests.post(auth_url, headers=headers, data=data)
+    result = upstreams.http('spotify').post(auth_url, headers=headers, data=data)
     token = result.json().get("access_token")
     return token
 
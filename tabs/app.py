@@ -1,15 +1,21 @@
-from flask import Flask, jsonify, request
-import google.generativeai as genai
-import json
+import sys
 import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Blueprint, Flask, jsonify, request
+import json
 import re
+import config
+import upstreams
+from observability.log import get_logger
 
-app = Flask(__name__)
+bp = Blueprint('tabs', __name__)
+log = get_logger('tabs')
 
 # Configure Gemini API
-GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEMINI_API_KEY = config.GOOGLE_API_KEY
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    config.configure_gemini()
 
 def get_average_score(urls: list) -> float:
     """
@@ -17,7 +23,7 @@ def get_average_score(urls: list) -> float:
     Returns a float between 0 and 1.
     """
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = upstreams.gemini_model('gemini-2.5-flash')
         
         # Format URLs as a numbered list
         urls_text = "\n".join([f"{i+1}. {url}" for i, url in enumerate(urls)])
@@ -52,17 +58,17 @@ Respond with ONLY the average score as a number between 0 and 1 (e.g., 0.73).
         return score
     
     except Exception as e:
-        print(f"Error: {e}")
+        log.error("Gemini error scoring tabs: %s", e)
         return 0.5
 
-@app.route('/analyze-tabs', methods=['POST'])
+@bp.route('/analyze-tabs', methods=['POST'])
 def analyze_tabs():
     """
     Expects JSON with 'urls' array.
     Returns the average score as a float.
     """
     try:
-        if not GEMINI_API_KEY:
+        if not GEMINI_API_KEY and not upstreams.is_offline('gemini'):
             return jsonify({'error': 'API key not configured'}), 500
         
         data = request.get_json()
@@ -89,5 +95,9 @@ def analyze_tabs():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Standalone tab scorer. server.py serves this blueprint with the gateway, so /analyze-tabs is on :8888 too.
+app = Flask(__name__)
+app.register_blueprint(bp)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,85 @@
+# Dashboard API: procrastination by hour and weekday, focus streaks, activity rates and tab trends
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functools import wraps
+
+from flask import Blueprint, jsonify, request
+
+from history.app import analytics, time_range
+from history.store import DAY, HistoryError, SERIES
+
+bp = Blueprint('dashboard', __name__)
+
+# Range when the request doesn't give one
+DEFAULT_DAYS = 30
+
+METRICS = tuple(f"{series}.{field}" for series, fields in SERIES.items() for field in fields)
+
+
+def _range():
+    return time_range(DEFAULT_DAYS * DAY)
+
+
+def _error(message, status):
+    return jsonify({"success": False, "error": message}), status
+
+
+def _analytics_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if analytics is None:
+            return _error("No history: set HISTORY_DB", 404)
+        try:
+            return view(*args, **kwargs)
+        except (HistoryError, ValueError) as e:
+            return _error(str(e), 400)
+    return wrapped
+
+
+@bp.route('/api/dashboard', methods=['GET'])
+@_analytics_required
+def get_dashboard():
+    """
+    Every dashboard section for ?start= to ?end= (epoch seconds or ISO 8601, default the
+    last 30 days), read from aggregates kept by history/analytics.py.
+    """
+    start, end = _range()
+    return jsonify({"success": True, **analytics.dashboard(start, end)})
+
+
+@bp.route('/api/dashboard/procrastination', methods=['GET'])
+@_analytics_required
+def get_procrastination():
+    """Mean per weekday and hour; ?metric= any series.field, default prediction.probability"""
+    metric = request.args.get('metric', 'prediction.probability')
+    if metric not in METRICS:
+        return _error(f"Unknown metric {metric!r}; one of {', '.join(METRICS)}", 400)
+    start, end = _range()
+    return jsonify({"success": True, **analytics.hour_of_week(start, end, metric)})
+
+
+@bp.route('/api/dashboard/streaks', methods=['GET'])
+@_analytics_required
+def get_streaks():
+    """Longest focus streaks (?limit=, default 10), streaks per day and the current one"""
+    start, end = _range()
+    limit = int(request.args.get('limit', 10))
+    return jsonify({"success": True, **analytics.streaks(start, end, limit)})
+
+
+@bp.route('/api/dashboard/activity', methods=['GET'])
+@_analytics_required
+def get_activity_distribution():
+    """Histogram, mean, p50 and p90 of keystrokes, mouse moves and clicks per minute"""
+    start, end = _range()
+    return jsonify({"success": True, **analytics.activity(start, end)})
+
+
+@bp.route('/api/dashboard/tabs', methods=['GET'])
+@_analytics_required
+def get_tab_trend():
+    """Tab productivity per day with a trailing 7-day mean, and per hour of day"""
+    start, end = _range()
+    return jsonify({"success": True, **analytics.tabs(start, end)})
@@ -0,0 +1,3 @@
+from .keyboard_mouse import ActivityTracker, tracker
+
+__all__ = ['ActivityTracker', 'tracker']
\ No newline at end of file
@@ -1,13 +1,16 @@
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Blueprint, Flask, jsonify, request
 import time
+from observability.admin import init_cors
 from trackers import tracker
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for Chrome extension
+bp = Blueprint('tracker', __name__)
 
 
-@app.route('/api/activity', methods=['GET'])
+@bp.route('/api/activity', methods=['GET'])
 def get_activity():
     """API endpoint to get current activity stats"""
     stats = tracker.get_stats()
@@ -17,7 +20,7 @@ def get_activity():
     return jsonify(stats)
 
 
-@app.route('/api/status', methods=['GET'])
+@bp.route('/api/status', methods=['GET'])
 def get_status():
     """API endpoint to check if tracker is running"""
     return jsonify({
@@ -26,7 +29,7 @@ def get_status():
     })
 
 
-@app.route('/api/start', methods=['POST'])
+@bp.route('/api/start', methods=['POST'])
 def start_tracking():
     """API endpoint to start tracking (called when Start button is clicked)"""
     try:
@@ -57,7 +60,7 @@ def start_tracking():
         }), 500
 
 
-@app.route('/api/stop', methods=['POST'])
+@bp.route('/api/stop', methods=['POST'])
 def stop_tracking():
     """API endpoint to stop tracking (called when Stop/End button is clicked)"""
     try:
@@ -81,7 +84,7 @@ def stop_tracking():
         }), 500
 
 
-@app.route('/api/reset', methods=['POST'])
+@bp.route('/api/reset', methods=['POST'])
 def reset_stats():
     """API endpoint to reset all stats"""
     tracker.reset()
@@ -91,6 +94,13 @@ def reset_stats():
     })
 
 
+# Standalone tracker API. server.py serves this blueprint next to the gateway, sharing the same tracker
+# (there the gateway's /api/activity answers first; it returns the same counts).
+app = Flask(__name__)
+init_cors(app)  # Chrome extension
+app.register_blueprint(bp)
+
+
 if __name__ == "__main__":
     print("Starting Flask API server...")
     print("API will be available at http://localhost:5000")
@@ -1,15 +1,28 @@
 from collections import deque
 import datetime
-from pynput import keyboard, mouse
+import logging
+import os
+import sys
 from threading import Thread, Lock
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from observability.log import get_logger
+
+log = get_logger('tracker')
+# Per-keystroke records: DEBUG only, and sampled
+key_log = get_logger('tracker.keys', sample_every=config.KEY_PRESS_LOG_EVERY)
+
 
 class ActivityTracker:
     def __init__ (self):
         self.keystroke_times = deque()
         self.mouse_move_times = deque()
         self.mouse_click_times = deque()
+        # Events seen since start, never trimmed: read by /metrics
+        self.event_totals = {"key_press": 0, "mouse_move": 0, "mouse_click": 0}
 
         self.lock = Lock()
         self.running = False
@@ -22,16 +35,21 @@ class ActivityTracker:
     def _on_key_press(self, key):
         with self.lock:
             self.keystroke_times.append(time.time())
-            print(f"🔑 Key pressed! Total: {len(self.keystroke_times)}")
+            self.event_totals["key_press"] += 1
+            total = len(self.keystroke_times)
+        if key_log.isEnabledFor(logging.DEBUG):
+            key_log.debug("Key pressed", extra={"fields": {"window_total": total}})
 
     def _on_mouse_move(self,x , y):
         with self.lock:
             self.mouse_move_times.append(time.time())
+            self.event_totals["mouse_move"] += 1
 
     def _on_mouse_click(self, x, y, button, pressed):
         if pressed:
             with self.lock:
                 self.mouse_click_times.append(time.time())
+                self.event_totals["mouse_click"] += 1
 
     def _clean_old_events(self):
         current_time = time.time()
@@ -60,9 +78,12 @@ class ActivityTracker:
         
     def start(self):
         if self.running:
-            print("Tracker already runnning")
+            log.info("Tracker already running")
             return
         
+        # Imported here so the tracker (and anything importing it) loads without an input backend
+        from pynput import keyboard, mouse
+
         self.running = True
 
         # Start keyboard listener
@@ -78,7 +99,7 @@ class ActivityTracker:
         )
         self.mouse_listener.start()
 
-        print("Activity tracker started")
+        log.info("Activity tracker started")
 
     def stop(self):
         if not self.running:
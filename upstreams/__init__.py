@@ -0,0 +1,129 @@
+# Pluggable upstream layer: every external service the gateway talks to is created here
+"""
+Each upstream (spotify, calendar, gemini, ml) runs in one of four modes, chosen with
+UPSTREAM_<NAME>_MODE or UPSTREAM_MODE for all of them:
+
+  live    the real service (default)
+  fake    deterministic in-process fakes
+  record  the real service, with every response saved to $UPSTREAM_CASSETTE_DIR/<name>.json
+  replay  recorded responses only, no network
+
+fake and replay add latency and failures from UPSTREAM_[<NAME>_]LATENCY_MS (lognormal median),
+_LATENCY_SIGMA, _ERROR_RATE and _SEED. See upstreams.base.UpstreamProfile.
+
+Every client handed out here is wrapped by upstreams.metered, so calls show up in /metrics
+whatever the mode.
+"""
+import os
+import threading
+
+from .base import Cassette, UpstreamError, UpstreamProfile
+from .metered import MeteredGeminiModel, MeteredHTTP, MeteredResource
+
+MODES = ('live', 'fake', 'record', 'replay')
+UPSTREAMS = ('spotify', 'calendar', 'gemini', 'ml')
+
+_lock = threading.Lock()
+_profiles = {}
+_cassettes = {}
+_http_clients = {}
+
+
+def mode(name):
+    value = os.getenv(f"UPSTREAM_{name.upper()}_MODE", os.getenv('UPSTREAM_MODE', 'live')).lower()
+    if value not in MODES:
+        raise ValueError(f"Unknown upstream mode {value!r} for {name}, expected one of {MODES}")
+    return value
+
+
+def is_offline(name):
+    """True when the upstream needs neither network nor credentials."""
+    return mode(name) in ('fake', 'replay')
+
+
+def profile(name):
+    with _lock:
+        if name not in _profiles:
+            _profiles[name] = UpstreamProfile.from_env(name)
+        return _profiles[name]
+
+
+def cassette(name):
+    with _lock:
+        if name not in _cassettes:
+            directory = os.getenv('UPSTREAM_CASSETTE_DIR', 'cassettes')
+            _cassettes[name] = Cassette(os.path.join(directory, f"{name}.json"))
+        return _cassettes[name]
+
+
+def http(name):
+    """requests-style client (get/post) for an HTTP upstream: 'spotify' or 'ml'."""
+    current = mode(name)
+    key = (name, current)
+    client = _http_clients.get(key)
+    if client is not None:
+        return client
+
+    from .transport import FakeHTTP, LiveHTTP, RecordingHTTP, ReplayHTTP
+
+    if current == 'live':
+        client = LiveHTTP(name)
+    elif current == 'record':
+        client = RecordingHTTP(name, cassette(name))
+    elif current == 'replay':
+        client = ReplayHTTP(name, cassette(name), profile(name))
+    else:
+        from .fakes import ml_handler, spotify_handler
+        handlers = {'spotify': spotify_handler, 'ml': ml_handler}
+        client = FakeHTTP(name, handlers[name], profile(name))
+
+    with _lock:
+        return _http_clients.setdefault(key, MeteredHTTP(client))
+
+
+def gemini_model(model_name):
+    """A genai.GenerativeModel, or its fake/recorded stand-in."""
+    return MeteredGeminiModel(_gemini_model(model_name))
+
+
+def _gemini_model(model_name):
+    current = mode('gemini')
+    if current == 'fake':
+        from .fakes import FakeGeminiModel
+        return FakeGeminiModel(model_name, profile('gemini'))
+    if current == 'replay':
+        from .recording import ReplayGeminiModel
+        return ReplayGeminiModel(model_name, cassette('gemini'), profile('gemini'))
+
+    import google.generativeai as genai
+    model = genai.GenerativeModel(model_name)
+    if current == 'record':
+        from .recording import RecordingGeminiModel
+        return RecordingGeminiModel(model, model_name, cassette('gemini'))
+    return model
+
+
+def calendar_service(creds):
+    """The Calendar v3 service. creds is ignored (and may be None) in fake and replay modes."""
+    return MeteredResource(_calendar_service(creds))
+
+
+def _calendar_service(creds):
+    current = mode('calendar')
+    if current == 'fake':
+        from .fakes import FakeCalendarService
+        return FakeCalendarService(profile('calendar'))
+    if current == 'replay':
+        from .recording import ReplayResource
+        return ReplayResource(cassette('calendar'), profile('calendar'))
+
+    from googleapiclient.discovery import build
+    service = build('calendar', 'v3', credentials=creds)
+    if current == 'record':
+        from .recording import RecordingResource
+        return RecordingResource(service, cassette('calendar'))
+    return service
+
+
+__all__ = ['MODES', 'UPSTREAMS', 'UpstreamError', 'UpstreamProfile', 'mode', 'is_offline', 'profile',
+           'cassette', 'http', 'gemini_model', 'calendar_service']
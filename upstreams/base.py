@@ -0,0 +1,94 @@
+# Latency/error profiles and the cassette store shared by the fake and record/replay upstreams
+import json
+import math
+import os
+import random
+import threading
+import time
+
+
+class UpstreamError(Exception):
+    """Raised by an offline upstream when a failure is injected or a replay has no recording."""
+
+
+class UpstreamProfile:
+    """
+    Latency and error distribution for one offline upstream.
+
+    Latency is lognormal around latency_ms (the median) with spread sigma, which gives the long
+    tail real APIs have. error_rate is the fraction of calls that fail. Everything is drawn from
+    a seeded RNG, so a run can be repeated exactly.
+    """
+
+    def __init__(self, latency_ms=0.0, sigma=0.5, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name):
+        """Read UPSTREAM_<NAME>_LATENCY_MS / _LATENCY_SIGMA / _ERROR_RATE, falling back to UPSTREAM_*."""
+        def setting(key, default):
+            value = os.getenv(f"UPSTREAM_{name.upper()}_{key}", os.getenv(f"UPSTREAM_{key}"))
+            return float(value) if value not in (None, '') else default
+
+        return cls(
+            latency_ms=setting('LATENCY_MS', 0.0),
+            sigma=setting('LATENCY_SIGMA', 0.5),
+            error_rate=setting('ERROR_RATE', 0.0),
+            seed=int(setting('SEED', 0)) + sum(map(ord, name))
+        )
+
+    def sample(self):
+        """Draw (delay_seconds, should_fail) for one call."""
+        with self._lock:
+            delay = 0.0
+            if self.latency_ms > 0:
+                delay = self._rng.lognormvariate(math.log(self.latency_ms), self.sigma) / 1000
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        return delay, fail
+
+    def apply(self):
+        """Sleep for one sampled latency and return True if this call should fail."""
+        delay, fail = self.sample()
+        if delay:
+            time.sleep(delay)
+        return fail
+
+
+class Cassette:
+    """
+    Recorded upstream responses on disk, one JSON file per upstream: {key: [response, ...]}.
+
+    A key can hold several responses (currently-playing changes over time). Replays cycle through
+    them in recorded order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._cursor = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def record(self, key, response):
+        with self.lock:
+            self.entries.setdefault(key, []).append(response)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def replay(self, key):
+        with self.lock:
+            responses = self.entries.get(key)
+            if not responses:
+                raise UpstreamError(f"No recording for {key!r} in {self.path}")
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return responses[index % len(responses)]
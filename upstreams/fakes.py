@@ -0,0 +1,332 @@
+# In-process fakes for Spotify, Google Calendar, Gemini and the ML service
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
+
+from .base import UpstreamError
+
+# ---------------------------------------------------------------------------
+# Spotify
+# ---------------------------------------------------------------------------
+
+FAKE_TRACKS = [
+    ("4uLU6hMCjMI75M1A2tKUQC", "Never Gonna Give You Up", "Rick Astley", "Whenever You Need Somebody"),
+    ("3n3Ppam7vgaVa1iaRUc9Lp", "Mr. Brightside", "The Killers", "Hot Fuss"),
+    ("0VjIjW4GlUZAMYd2vXMi3b", "Blinding Lights", "The Weeknd", "After Hours"),
+    ("5ghIJDpPoe3CfHMGu71E6T", "Smells Like Teen Spirit", "Nirvana", "Nevermind"),
+    ("2takcwOaAZWiXQijPHIx7B", "Time", "Hans Zimmer", "Inception"),
+    ("7qiZfU4dY1lWllzX7mPBI3", "Shape of You", "Ed Sheeran", "Divide"),
+    ("1mea3bSkSGXuIRvnydlB5b", "Viva La Vida", "Coldplay", "Viva La Vida or Death and All His Friends"),
+    ("6habFhsOp2NvshLv26DqMb", "Clair de Lune", "Claude Debussy", "Suite bergamasque"),
+]
+# Simulated song length: the "currently playing" track changes this often
+FAKE_TRACK_SECONDS = 180
+
+
+def _fake_track(index):
+    track_id, name, artist, album = FAKE_TRACKS[index % len(FAKE_TRACKS)]
+    return {
+        "id": track_id,
+        "name": name,
+        "artists": [{"name": artist}],
+        "album": {"name": album},
+        "duration_ms": FAKE_TRACK_SECONDS * 1000
+    }
+
+
+def spotify_handler(method, url, kwargs):
+    """Answers the Spotify accounts and Web API calls made by spotify/auth.py."""
+    if url.endswith('/api/token'):
+        return 200, {"access_token": "offline-token", "token_type": "Bearer", "expires_in": 3600}
+
+    now = time.time()
+    index = int(now // FAKE_TRACK_SECONDS)
+    if url.endswith('/me/player/currently-playing'):
+        return 200, {
+            "is_playing": True,
+            "progress_ms": int(now % FAKE_TRACK_SECONDS * 1000),
+            "item": _fake_track(index)
+        }
+    if url.endswith('/me/player/queue'):
+        return 200, {
+            "currently_playing": _fake_track(index),
+            "queue": [_fake_track(index + i) for i in range(1, 11)]
+        }
+    return 404, {"error": {"status": 404, "message": f"Fake Spotify does not serve {url}"}}
+
+
+# ---------------------------------------------------------------------------
+# ML prediction service
+# ---------------------------------------------------------------------------
+
+def ml_handler(method, url, kwargs):
+    """Stands in for predict.py: a cheap deterministic score from tab productivity and activity."""
+    if not url.endswith('/predict'):
+        return 404, {"error": f"Fake ML service does not serve {url}"}
+
+    if kwargs.get('data'):
+        from predict.features import to_mapping
+        from predict.wire import decode_features
+        features = to_mapping(decode_features(kwargs['data']))
+    else:
+        features = kwargs.get('json') or {}
+    tabs = float(features.get('Productivity of Active Chrome Tabs', 0.5))
+    keys = min(float(features.get('Keystrokes per min', 0)) / 100, 1.0)
+    clicks = min(float(features.get('Mouse clicks per min', 0)) / 30, 1.0)
+    prediction = max(0.0, min(1.0, 1.0 - 0.6 * tabs - 0.2 * keys - 0.2 * clicks))
+    return 200, {"prediction": prediction}
+
+
+# ---------------------------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------------------------
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Mimics genai.GenerativeModel.generate_content for the two prompts we send. The answer is
+    derived from a hash of the prompt, so the same song or tab list always scores the same.
+    """
+
+    def __init__(self, model_name, profile):
+        self.model_name = model_name
+        self.profile = profile
+
+    def generate_content(self, prompt):
+        if self.profile.apply():
+            raise UpstreamError("Injected Gemini failure")
+
+        digest = hashlib.sha1(prompt.encode('utf-8')).digest()
+        if '"energy"' in prompt:
+            text = json.dumps({
+                "energy": round(digest[0] / 255, 2),
+                "danceability": round(digest[1] / 255, 2),
+                "tempo": 60 + digest[2] % 141
+            })
+        else:
+            text = f"{digest[0] / 255:.2f}"
+        return FakeGeminiResponse(text)
+
+
+# ---------------------------------------------------------------------------
+# Google Calendar
+# ---------------------------------------------------------------------------
+
+FAKE_CALENDARS = [
+    {"id": "primary", "summary": "Me", "primary": True, "selected": True},
+    {"id": "team@group.calendar.google.com", "summary": "Team", "selected": True},
+    {"id": "personal@group.calendar.google.com", "summary": "Personal", "selected": False},
+]
+FAKE_SUMMARIES = ["Team sync", "1:1", "Design review", "Deadline: report", "Lunch", "Focus block", "Standup"]
+
+
+def _format_time(dt):
+    return dt.isoformat().replace('+00:00', 'Z')
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _apply_fields(payload, fields):
+    """Support the 'items(a,b,c)' partial-response masks GC.client sends."""
+    if not fields or not fields.startswith('items(') or not fields.endswith(')'):
+        return payload
+    keep = fields[len('items('):-1].split(',')
+    return {"items": [{key: item[key] for key in keep if key in item} for item in payload.get('items', [])]}
+
+
+def fake_event(calendar_id, day, index, rng):
+    """One full event resource, shaped like the real API's (descriptions, attendees, conference data)."""
+    start = day + timedelta(hours=8, minutes=rng.randrange(0, 10 * 60, 15))
+    end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+    event_id = f"{calendar_id.split('@')[0]}{day:%Y%m%d}{index:03d}"
+    return {
+        "kind": "calendar#event",
+        "etag": f"\"{rng.randrange(10**15)}\"",
+        "id": event_id,
+        "status": "confirmed",
+        "htmlLink": f"https://www.google.com/calendar/event?eid={event_id}",
+        "created": "2025-01-06T09:12:44.000Z",
+        "updated": "2025-02-11T16:40:02.118Z",
+        "summary": rng.choice(FAKE_SUMMARIES),
+        "description": "Agenda:\n" + "\n".join(f"- item {i}: " + "lorem ipsum dolor sit amet " * 3 for i in range(6)),
+        "location": "Meeting room 4B / https://meet.google.com/abc-defg-hij",
+        "creator": {"email": "organiser@example.com", "self": False},
+        "organizer": {"email": "organiser@example.com", "displayName": "Organiser"},
+        "start": {"dateTime": _format_time(start), "timeZone": "UTC"},
+        "end": {"dateTime": _format_time(end), "timeZone": "UTC"},
+        "iCalUID": f"{event_id}@google.com",
+        "sequence": 2,
+        "attendees": [
+            {"email": f"person{i}@example.com", "displayName": f"Person {i}", "responseStatus": "accepted"}
+            for i in range(rng.randint(2, 12))
+        ],
+        "hangoutLink": "https://meet.google.com/abc-defg-hij",
+        "conferenceData": {
+            "entryPoints": [
+                {"entryPointType": "video", "uri": "https://meet.google.com/abc-defg-hij"},
+                {"entryPointType": "phone", "uri": "tel:+44-20-3957-1234", "pin": "123456789"}
+            ],
+            "conferenceSolution": {"key": {"type": "hangoutsMeet"}, "name": "Google Meet"}
+        },
+        "reminders": {"useDefault": True},
+        "eventType": "default"
+    }
+
+
+class _FakeRequest:
+    """An HttpRequest stand-in: execute() parses a pre-serialised JSON body with JsonModel, like the real client."""
+
+    def __init__(self, body, profile, uri):
+        self.body = body
+        self.profile = profile
+        self.uri = uri
+
+    def execute(self):
+        if self.profile.apply():
+            raise HttpError(httplib2.Response({'status': 503, 'reason': 'Injected failure'}),
+                            b'{"error": {"code": 503, "message": "Injected calendar failure"}}', uri=self.uri)
+        return JsonModel().deserialize(self.body)
+
+
+class SerialBatch:
+    """A batch that executes its requests one after another, for services with no batch endpoint."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None, callback=None):
+        self.requests.append((request_id, request, callback or self.callback))
+
+    def execute(self):
+        for request_id, request, callback in self.requests:
+            try:
+                response = request.execute()
+            except Exception as e:
+                callback(request_id, None, e)
+            else:
+                callback(request_id, response, None)
+
+
+class _FakeEvents:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, calendarId, timeMin=None, timeMax=None, maxResults=None, fields=None, **params):
+        def build():
+            start = _parse_time(timeMin) if timeMin else datetime.now(timezone.utc)
+            end = _parse_time(timeMax) if timeMax else start + timedelta(days=2)
+            items = self.service.events_between(calendarId, start, end)
+            if maxResults:
+                items = items[:maxResults]
+            return _apply_fields({"kind": "calendar#events", "items": items}, fields)
+
+        body = self.service.body(('events', calendarId, timeMin, timeMax, maxResults, fields), build)
+        return _FakeRequest(body, self.service.profile, f"fake://calendar/{calendarId}/events")
+
+
+class _FakeCalendarList:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, **params):
+        body = self.service.body(('calendarList',), lambda: {"items": self.service.calendars})
+        return _FakeRequest(body, self.service.profile, "fake://calendar/calendarList")
+
+
+class _FakeFreeBusy:
+    def __init__(self, service):
+        self.service = service
+
+    def query(self, body):
+        def build():
+            start, end = _parse_time(body["timeMin"]), _parse_time(body["timeMax"])
+            calendars = {
+                item["id"]: {"busy": [{"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+                                      for e in self.service.events_between(item["id"], start, end)]}
+                for item in body["items"]
+            }
+            return {"kind": "calendar#freeBusy", "timeMin": body["timeMin"], "timeMax": body["timeMax"],
+                    "calendars": calendars}
+
+        key = ('freeBusy', body["timeMin"], body["timeMax"], tuple(item["id"] for item in body["items"]))
+        return _FakeRequest(self.service.body(key, build), self.service.profile, "fake://calendar/freeBusy")
+
+
+class FakeCalendarService:
+    """
+    Enough of the Calendar v3 service for GC.client: events().list, calendarList().list,
+    freebusy().query and batches. Each calendar gets a deterministic set of events every day.
+    """
+
+    # Days of events kept per calendar, least recently used out: a soak run simulates ever more
+    # days, and any day is generated again identically when asked for
+    CACHE_DAYS = 4
+
+    def __init__(self, profile, calendars=None, events_per_day=6):
+        self.profile = profile
+        self.calendars = calendars or FAKE_CALENDARS
+        self.events_per_day = events_per_day
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._bodies = {}
+
+    def events_for_day(self, calendar_id, day):
+        key = (calendar_id, day.date())
+        with self._cache_lock:
+            events = self._cache.get(key)
+            if events is not None:
+                self._cache.move_to_end(key)
+                return events
+        rng = random.Random(f"{calendar_id}:{day.date().isoformat()}")
+        events = [fake_event(calendar_id, day, i, rng) for i in range(self.events_per_day)]
+        with self._cache_lock:
+            self._cache[key] = events
+            while len(self._cache) > self.CACHE_DAYS * max(1, len(self.calendars)):
+                self._cache.popitem(last=False)
+        return events
+
+    def events_between(self, calendar_id, start, end):
+        """Events overlapping [start, end), sorted by start time."""
+        items = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end:
+            items.extend(e for e in self.events_for_day(calendar_id, day)
+                         if _parse_time(e['end']['dateTime']) > start and _parse_time(e['start']['dateTime']) < end)
+            day += timedelta(days=1)
+        return sorted(items, key=lambda e: e['start']['dateTime'])
+
+    def body(self, key, build):
+        """Serialised response for a request, cached so fake-side JSON encoding stays out of measurements."""
+        body = self._bodies.get(key)
+        if body is None:
+            if len(self._bodies) > 512:
+                self._bodies.clear()
+            body = self._bodies[key] = json.dumps(build()).encode('utf-8')
+        return body
+
+    def events(self):
+        return _FakeEvents(self)
+
+    def calendarList(self):
+        return _FakeCalendarList(self)
+
+    def freebusy(self):
+        return _FakeFreeBusy(self)
+
+    def new_batch_http_request(self, callback=None):
+        return SerialBatch(callback)
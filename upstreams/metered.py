@@ -0,0 +1,89 @@
+# Latency and error metrics for every upstream client, whatever its mode
+from urllib.parse import urlsplit
+
+from observability import metrics
+
+
+class MeteredHTTP:
+    """Wraps an HTTP client from upstreams.transport. Operations are URL paths, so query strings don't split series."""
+
+    def __init__(self, client):
+        self.client = client
+        self.name = client.name
+
+    def request(self, method, url, **kwargs):
+        operation = f"{method} {urlsplit(url).path}"
+        with metrics.upstream_call(self.name, operation) as call:
+            response = self.client.request(method, url, **kwargs)
+            # Error statuses are failures too, not just exceptions
+            call.ok = response.status_code < 400
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+class MeteredGeminiModel:
+    def __init__(self, model):
+        self.model = model
+
+    def generate_content(self, *args, **kwargs):
+        with metrics.upstream_call('gemini', 'generate_content'):
+            return self.model.generate_content(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class MeteredRequest:
+    def __init__(self, request, operation):
+        self.request = request
+        self.operation = operation
+
+    def execute(self, *args, **kwargs):
+        with metrics.upstream_call('calendar', self.operation):
+            return self.request.execute(*args, **kwargs)
+
+
+class MeteredBatch:
+    """Times the batch round trip as a whole; sub-requests are handed to the wrapped batch unwrapped."""
+
+    def __init__(self, batch):
+        self.batch = batch
+
+    def add(self, request, request_id=None, callback=None):
+        if isinstance(request, MeteredRequest):
+            request = request.request
+        self.batch.add(request, request_id=request_id, callback=callback)
+
+    def execute(self, *args, **kwargs):
+        with metrics.upstream_call('calendar', 'batch'):
+            return self.batch.execute(*args, **kwargs)
+
+
+class MeteredResource:
+    """Proxies a Calendar service (live, recording, replay or fake) and times every execute()."""
+
+    def __init__(self, resource, path=()):
+        self._resource = resource
+        self._path = path
+
+    def new_batch_http_request(self, callback=None):
+        return MeteredBatch(self._resource.new_batch_http_request(callback=callback))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = getattr(self._resource, name)
+        path = self._path + (name,)
+
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return MeteredRequest(result, '.'.join(path))
+            return MeteredResource(result, path)
+
+        return call
@@ -0,0 +1,148 @@
+# Record-and-replay wrappers for the googleapiclient Calendar service and Gemini models
+import hashlib
+import json
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from .base import UpstreamError
+from .fakes import SerialBatch
+
+# Query parameters that change on every call; leaving them out of keys lets "today" replay tomorrow
+VOLATILE_PARAMS = ('timeMin', 'timeMax')
+
+
+def _request_key(path, kwargs):
+    """Key a chained API call such as events.list(calendarId=..., maxResults=1), minus volatile params."""
+    params = {}
+    for name, value in kwargs.items():
+        if name in VOLATILE_PARAMS:
+            continue
+        if isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k not in VOLATILE_PARAMS}
+        params[name] = value
+    return f"{'.'.join(path)} {json.dumps(params, sort_keys=True)}"
+
+
+class RecordingRequest:
+    def __init__(self, request, key, cassette):
+        self.request = request
+        self.key = key
+        self.cassette = cassette
+
+    def execute(self, *args, **kwargs):
+        response = self.request.execute(*args, **kwargs)
+        self.cassette.record(self.key, response)
+        return response
+
+
+class RecordingBatch:
+    """Forwards to a real batch and records each successful sub-response under its request's key."""
+
+    def __init__(self, batch, cassette, callback=None):
+        self.batch = batch
+        self.cassette = cassette
+        self.callback = callback
+
+    def add(self, request, request_id=None, callback=None):
+        callback = callback or self.callback
+
+        def record(request_id, response, exception):
+            if exception is None:
+                self.cassette.record(request.key, response)
+            if callback:
+                callback(request_id, response, exception)
+
+        self.batch.add(request.request, request_id=request_id, callback=record)
+
+    def execute(self, *args, **kwargs):
+        return self.batch.execute(*args, **kwargs)
+
+
+class RecordingResource:
+    """
+    Proxies a googleapiclient resource. Calls are forwarded unchanged, and every execute()
+    result is written to the cassette.
+    """
+
+    def __init__(self, resource, cassette, path=()):
+        self._resource = resource
+        self._cassette = cassette
+        self._path = path
+
+    def new_batch_http_request(self, callback=None):
+        return RecordingBatch(self._resource.new_batch_http_request(), self._cassette, callback)
+
+    def __getattr__(self, name):
+        method = getattr(self._resource, name)
+        path = self._path + (name,)
+
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return RecordingRequest(result, _request_key(path, kwargs), self._cassette)
+            return RecordingResource(result, self._cassette, path)
+
+        return call
+
+
+class ReplayResource:
+    """Answers the same chained calls from a cassette, applying the upstream's latency/error profile."""
+
+    def __init__(self, cassette, profile, path=(), kwargs=None):
+        self._cassette = cassette
+        self._profile = profile
+        self._path = path
+        self._kwargs = kwargs or {}
+
+    def new_batch_http_request(self, callback=None):
+        return SerialBatch(callback)
+
+    def execute(self, *args, **kwargs):
+        key = _request_key(self._path, self._kwargs)
+        if self._profile.apply():
+            raise HttpError(httplib2.Response({'status': 503, 'reason': 'Injected failure'}),
+                            b'{"error": {"code": 503, "message": "Injected calendar failure"}}', uri=key)
+        return self._cassette.replay(key)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return ReplayResource(self._cassette, self._profile, self._path + (name,), kwargs)
+
+        return call
+
+
+class _RecordedGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _prompt_key(model_name, prompt):
+    return f"{model_name} {hashlib.sha1(prompt.encode('utf-8')).hexdigest()}"
+
+
+class RecordingGeminiModel:
+    def __init__(self, model, model_name, cassette):
+        self.model = model
+        self.model_name = model_name
+        self.cassette = cassette
+
+    def generate_content(self, prompt, *args, **kwargs):
+        response = self.model.generate_content(prompt, *args, **kwargs)
+        self.cassette.record(_prompt_key(self.model_name, prompt), {"text": response.text})
+        return response
+
+
+class ReplayGeminiModel:
+    def __init__(self, model_name, cassette, profile):
+        self.model_name = model_name
+        self.cassette = cassette
+        self.profile = profile
+
+    def generate_content(self, prompt, *args, **kwargs):
+        if self.profile.apply():
+            raise UpstreamError("Injected Gemini failure")
+        return _RecordedGeminiResponse(self.cassette.replay(_prompt_key(self.model_name, prompt))["text"])
@@ -0,0 +1,94 @@
+# requests-style clients for HTTP upstreams (Spotify, the ML service): live, recording, replay and fake
+import json
+
+import requests
+
+from .base import UpstreamError
+
+
+class HTTPResponse:
+    """The slice of requests.Response the callers use: status_code, content, text and json()."""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content if isinstance(content, bytes) else content.encode('utf-8')
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class LiveHTTP:
+    """Plain requests calls. Every other client mirrors this get/post interface."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def request(self, method, url, **kwargs):
+        return requests.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+class RecordingHTTP(LiveHTTP):
+    """
+    Calls the real upstream and stores every response in a cassette.
+
+    Responses are keyed by method and URL only. Bodies change every minute (features, auth
+    codes), so replays hand back the responses for a URL in the order they were recorded.
+    Headers are never stored, so tokens stay out of cassettes.
+    """
+
+    def __init__(self, name, cassette):
+        super().__init__(name)
+        self.cassette = cassette
+
+    def request(self, method, url, **kwargs):
+        response = super().request(method, url, **kwargs)
+        self.cassette.record(f"{method} {url}", {
+            "status_code": response.status_code,
+            "body": response.content.decode('utf-8', errors='replace')
+        })
+        return response
+
+
+class ReplayHTTP(LiveHTTP):
+    """Serves recorded responses, with the upstream's latency/error profile on top."""
+
+    def __init__(self, name, cassette, profile):
+        super().__init__(name)
+        self.cassette = cassette
+        self.profile = profile
+
+    def request(self, method, url, **kwargs):
+        if self.profile.apply():
+            return HTTPResponse(503, json.dumps({"error": f"Injected {self.name} failure"}))
+        recorded = self.cassette.replay(f"{method} {url}")
+        return HTTPResponse(recorded["status_code"], recorded["body"])
+
+
+class FakeHTTP(LiveHTTP):
+    """
+    In-process fake. handler(method, url, kwargs) returns (status_code, body) for each call,
+    where body is a dict (sent as JSON) or a string.
+    """
+
+    def __init__(self, name, handler, profile):
+        super().__init__(name)
+        self.handler = handler
+        self.profile = profile
+
+    def request(self, method, url, **kwargs):
+        if self.profile.apply():
+            return HTTPResponse(503, json.dumps({"error": f"Injected {self.name} failure"}))
+        status_code, body = self.handler(method, url, kwargs)
+        if body is None:
+            raise UpstreamError(f"Fake {self.name} has no handler for {method} {url}")
+        return HTTPResponse(status_code, body if isinstance(body, str) else json.dumps(body))